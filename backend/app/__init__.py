@@ -4,45 +4,181 @@ app/__init__.py
 Application factory for Semantic Tiles.
 """
 
+import gc
 import os
-from flask import Flask
+import time
+import logging
+from contextlib import contextmanager
+from flask import Flask, Response, g, request
 from flask_cors import CORS
 from dotenv import load_dotenv
+from app.core import metrics
+from app.core.profiler import RequestProfiler
 
+logger = logging.getLogger(__name__)
+
+_dotenv_start = time.perf_counter()
 load_dotenv()
+DOTENV_SECONDS = time.perf_counter() - _dotenv_start
+
+STARTUP_SECONDS = metrics.registry.gauge(
+    'app_startup_seconds', 'Time spent in each application startup phase', ['phase'])
+
+@contextmanager
+def _startup_phase(timings, name):
+    """Record how long a startup phase takes."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
 
 def create_app(env):
     """Create and configure the Flask application."""
+    timings = {'dotenv': DOTENV_SECONDS}
+    started = time.perf_counter()
+    
     app = Flask(__name__, 
                 template_folder='templates',
                 static_folder='static')
     # Allow requests from local development and the Netlify deployment
-    CORS(app, resources={r"/*": {"origins": [
-        "http://localhost:3000", 
-        "http://127.0.0.1:3000",
-        "https://genuine-fudge-049c1d.netlify.app",
-        "https://semantic-tiles3.netlify.app",
-        "https://magical-sunshine-fa66db.netlify.app"
-    ]}})
+    with _startup_phase(timings, 'cors'):
+        CORS(app, resources={r"/*": {"origins": [
+            "http://localhost:3000", 
+            "http://127.0.0.1:3000",
+            "https://genuine-fudge-049c1d.netlify.app",
+            "https://semantic-tiles3.netlify.app",
+            "https://magical-sunshine-fa66db.netlify.app"
+        ]}})
     
     # Configuration
     app.config.update(
         SECRET_KEY=os.getenv('SECRET_KEY', 'dev-key-change-in-production'),
         UPLOAD_FOLDER=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads'),
         MAX_CONTENT_LENGTH=16 * 1024 * 1024,  # 16MB max file size
-        TEMPLATES_AUTO_RELOAD=True if env == 'development' else False
+        TEMPLATES_AUTO_RELOAD=True if env == 'development' else False,
+        METRICS_TIMING_HEADERS=os.getenv('METRICS_TIMING_HEADERS', 'false').lower() == 'true',
+        METRICS_TOKEN=os.getenv('METRICS_TOKEN'),
+        STARTUP_PRELOAD=os.getenv('STARTUP_PRELOAD', 'false').lower() == 'true',
+        TENANT_MEMORY_BUDGET_MB=float(os.getenv('TENANT_MEMORY_BUDGET_MB', 512)),
+        TENANT_MAX_LOADED=int(os.getenv('TENANT_MAX_LOADED', 0)),
+        TENANTS_ALLOWED=os.getenv('TENANTS_ALLOWED'),
+        TENANTS_OPEN=os.getenv('TENANTS_OPEN', 'false').lower() == 'true',
+        TENANT_BUDGET_INTERVAL=float(os.getenv('TENANT_BUDGET_INTERVAL', 5)),
+        CLUSTER_MAX_FANOUT=int(os.getenv('CLUSTER_MAX_FANOUT', 12)),
+        CLUSTER_AUTO=os.getenv('CLUSTER_AUTO', 'false').lower() == 'true',
+        DUPLICATE_POLICY=os.getenv('DUPLICATE_POLICY', 'flag').lower(),
+        DUPLICATE_SCOPE=os.getenv('DUPLICATE_SCOPE', 'siblings').lower(),
+        DUPLICATE_THRESHOLD=float(os.getenv('DUPLICATE_THRESHOLD', 0.92)),
+        MAP_MAX_CELLS=int(os.getenv('MAP_MAX_CELLS', 5000)),
+        CHANGES_BUFFER_SIZE=int(os.getenv('CHANGES_BUFFER_SIZE', 1024)),
+        CHANGES_STREAM_SECONDS=float(os.getenv('CHANGES_STREAM_SECONDS', 300)),
+        EMBEDDING_MIGRATION_RATE=float(os.getenv('EMBEDDING_MIGRATION_RATE', 5)),
+        TEXT_INDEX_MERGE_FACTOR=int(os.getenv('TEXT_INDEX_MERGE_FACTOR', 8)),
+        SEARCH_HYBRID_WEIGHT=float(os.getenv('SEARCH_HYBRID_WEIGHT', 0.5)),
+        RELATED_GRAPH_K=int(os.getenv('RELATED_GRAPH_K', 16)),
+        LLM_WORKERS=int(os.getenv('LLM_WORKERS', 8)),
+        LLM_QUEUE_SIZE=int(os.getenv('LLM_QUEUE_SIZE', 32)),
+        LLM_MAX_WAITING=int(os.getenv('LLM_MAX_WAITING', 4)),
+        LLM_TENANT_MAX_PENDING=int(os.getenv('LLM_TENANT_MAX_PENDING', 16)),
+        LLM_WAIT_TIMEOUT=float(os.getenv('LLM_WAIT_TIMEOUT', 60)),
+        LLM_JOB_TTL=float(os.getenv('LLM_JOB_TTL', 600))
     )
     
     # Import and register blueprints
-    from app.api.routes import api_bp
-    app.register_blueprint(api_bp, url_prefix='/api')
+    with _startup_phase(timings, 'blueprints'):
+        from app.api.routes import api_bp
+        app.register_blueprint(api_bp, url_prefix='/api')
+        # Same routes scoped to a tenant by URL, as an alternative to the X-Tenant-ID header
+        app.register_blueprint(api_bp, url_prefix='/api/t/<tenant_id>', name='tenant_api')
     
     # Default route
     @app.route('/')
     def index():
         return app.send_static_file('index.html')
     
+    register_instrumentation(app)
+    
+    # Opt-in profiling of slow requests, stored outside the upload folder that
+    # /api/documents serves, so profiles are only reachable through /api/profiles
+    RequestProfiler(
+        os.getenv('PROFILER_DIR') or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'profiles'),
+        enabled=os.getenv('PROFILER_ENABLED', 'false').lower() == 'true',
+        threshold_ms=float(os.getenv('PROFILER_THRESHOLD_MS', 1000)),
+        sample_rate=float(os.getenv('PROFILER_SAMPLE_RATE', 1.0)),
+        max_files=int(os.getenv('PROFILER_MAX_FILES', 50)),
+        debug_token=os.getenv('PROFILER_DEBUG_TOKEN')
+    ).init_app(app)
+    
     # Ensure upload directory exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    if app.config['STARTUP_PRELOAD']:
+        preload_shared_state(app, timings)
+    
+    timings['total'] = time.perf_counter() - started + DOTENV_SECONDS
+    app.config['STARTUP_TIMINGS'] = timings
+    for phase, seconds in timings.items():
+        STARTUP_SECONDS.set(seconds, phase=phase)
+    logger.info("Startup timings: " + ", ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in timings.items()))
+    
     return app
+
+def preload_shared_state(app, timings):
+    """
+    Load the default tenant's domain snapshot, embedding store and the tokenizer before workers fork.
+    
+    With gunicorn --preload this runs once in the master process, and workers
+    share the loaded state copy-on-write instead of each loading it at boot.
+    """
+    from app.api import routes
+    from app.core.prompts import COMPLETION_MODEL, load_encoding
+    
+    with app.app_context():
+        with _startup_phase(timings, 'preload_store'):
+            routes.get_domain_store()
+        with _startup_phase(timings, 'preload_processor'):
+            routes.get_semantic_processor()
+        # Load the completion tokenizer now, not in the first document query
+        with _startup_phase(timings, 'preload_tokenizer'):
+            load_encoding(COMPLETION_MODEL)
+    
+    # Keep preloaded objects out of later collections, so the collector does
+    # not write to (and un-share) their pages in every worker
+    gc.freeze()
+
+REQUEST_LATENCY = metrics.registry.histogram(
+    'http_request_duration_seconds', 'API request latency', ['method', 'route', 'status'])
+
+def register_instrumentation(app):
+    """Record per-route latency and expose all metrics at /metrics."""
+    
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.request_spans_token = metrics.start_request_spans()
+    
+    @app.after_request
+    def record_request_latency(response):
+        start = g.pop('request_start', None)
+        token = g.pop('request_spans_token', None)
+        if start is None:
+            return response
+        
+        elapsed = time.perf_counter() - start
+        spans = metrics.end_request_spans(token)
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(elapsed, method=request.method, route=route, status=response.status_code)
+        
+        if app.config['METRICS_TIMING_HEADERS']:
+            timings = [f"total;dur={elapsed * 1000:.1f}"]
+            timings.extend(f"{name};dur={seconds * 1000:.1f}" for name, seconds in spans.items())
+            response.headers['Server-Timing'] = ", ".join(timings)
+        return response
+    
+    @app.route('/metrics')
+    def metrics_endpoint():
+        token = app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f"Bearer {token}":
+            return Response("Unauthorized\n", status=401, mimetype='text/plain')
+        return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
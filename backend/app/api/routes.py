@@ -6,45 +6,354 @@ API routes for the Semantic Tiles application.
 
 import os
 import uuid
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
-from flask import Blueprint, jsonify, request, current_app, send_file
+from flask import Blueprint, Response, jsonify, request, current_app, send_file, g, stream_with_context, url_for
 from werkzeug.utils import secure_filename
-from app.core.domain_model import DomainStore
-from app.core.semantic_processor import SemanticProcessor
+from app.core.extractors import EXTENSION_TYPES, registry as extractor_registry
+from app.core.tenancy import DEFAULT_TENANT, TenantRegistry, UnknownTenantError
+from app.core.admission import JobStore, Saturated, WorkPool
+from app.core.pagination import (DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, DOMAIN_ORDERS, DOCUMENT_ORDERS,
+                                 ProximityCache, paginate)
 
 # Create blueprint
 api_bp = Blueprint('api', __name__)
 
-# Setup domain store
-domain_store = None
-semantic_processor = None
+# Header selecting the tenant; the /api/t/<tenant_id>/ URL prefix takes precedence
+TENANT_HEADER = 'X-Tenant-ID'
+
+# Setup tenant registry; each tenant has its own domain store and semantic processor
+tenant_registry = None
+
+def get_tenant_registry():
+    """Get or initialize the tenant registry."""
+    global tenant_registry
+    if (tenant_registry is None):
+        allowed = current_app.config.get('TENANTS_ALLOWED')
+        tenant_registry = TenantRegistry(
+            current_app.config['UPLOAD_FOLDER'],
+            memory_budget=int(current_app.config.get('TENANT_MEMORY_BUDGET_MB', 512) * 1024 ** 2),
+            max_tenants=current_app.config.get('TENANT_MAX_LOADED', 0),
+            allowed=[tenant.strip() for tenant in allowed.split(',') if tenant.strip()] if allowed else None,
+            open_tenants=current_app.config.get('TENANTS_OPEN', False),
+            budget_interval=current_app.config.get('TENANT_BUDGET_INTERVAL', 5.0)
+        )
+    return tenant_registry
+
+def get_tenant_id():
+    """Get the tenant of the current request."""
+    return g.get('tenant_id', DEFAULT_TENANT)
+
+def get_upload_folder():
+    """Get the upload folder of the current tenant."""
+    return get_tenant_registry().root(get_tenant_id())
+
+def resolve_document_path(document_path):
+    """
+    Get the full path of one of the current tenant's documents.
+    
+    Args:
+        document_path: Document path relative to the tenant's upload folder
+        
+    Returns:
+        Full path, or None if the path leads outside the tenant's documents
+        directory (e.g. to its data files, or to another tenant)
+    """
+    documents_dir = os.path.realpath(os.path.join(get_upload_folder(), 'documents'))
+    full_path = os.path.realpath(os.path.join(get_upload_folder(), document_path))
+    if os.path.commonpath([documents_dir, full_path]) != documents_dir or full_path == documents_dir:
+        return None
+    return full_path
 
 def get_domain_store():
-    """Get or initialize domain store."""
-    global domain_store
-    if (domain_store is None):
-        storage_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'data')
-        os.makedirs(storage_dir, exist_ok=True)
-        domain_store = DomainStore(storage_dir)
-    return domain_store
+    """Get or initialize the current tenant's domain store."""
+    return get_tenant_registry().get_store(get_tenant_id())
 
 def get_semantic_processor():
-    """Get or initialize semantic processor."""
-    global semantic_processor
-    if (semantic_processor is None):
-        semantic_processor = SemanticProcessor(current_app.config['UPLOAD_FOLDER'])
-    return semantic_processor
+    """Get or initialize the current tenant's semantic processor."""
+    processor = get_tenant_registry().get_processor(get_tenant_id())
+    migration = get_embedding_migration()
+    if processor.pending_migration:
+        # A migration was running when the knowledge base was last loaded
+        migration.resume()
+    else:
+        migration.sync()
+    return processor
+
+def get_embedding_migration():
+    """Get or initialize the current tenant's embedding migration service."""
+    def create(tenant):
+        from app.core.embedding_migration import EmbeddingMigration
+        return EmbeddingMigration(get_domain_store(), get_tenant_registry().get_processor(get_tenant_id()),
+                                  rate=current_app.config['EMBEDDING_MIGRATION_RATE'])
+    return get_tenant_registry().get_service(get_tenant_id(), 'embedding_migration', create)
+
+def get_duplicate_detector():
+    """Get or initialize the current tenant's duplicate detector."""
+    def create(tenant):
+        # Deferred: pulls in numpy on first use
+        from app.core.duplicates import DuplicateDetector
+        return DuplicateDetector(get_domain_store(), get_semantic_processor(),
+                                 threshold=current_app.config['DUPLICATE_THRESHOLD'],
+                                 scope=current_app.config['DUPLICATE_SCOPE'])
+    return get_tenant_registry().get_service(get_tenant_id(), 'duplicates', create)
+
+def get_voronoi_cache():
+    """Get or initialize the current tenant's Voronoi cell cache."""
+    def create(tenant):
+        # Deferred: pulls in numpy on first use
+        from app.core.voronoi import VoronoiCache
+        return VoronoiCache()
+    return get_tenant_registry().get_service(get_tenant_id(), 'voronoi', create)
+
+def get_tile_map():
+    """Get or initialize the current tenant's whole-tree tile map."""
+    def create(tenant):
+        # Deferred: pulls in numpy on first use
+        from app.core.tile_map import TileMap
+        return TileMap(get_domain_store(), max_cells=current_app.config['MAP_MAX_CELLS'])
+    return get_tenant_registry().get_service(get_tenant_id(), 'tile_map', create)
+
+def get_text_index():
+    """Get or initialize the current tenant's BM25 index of document passages."""
+    def create(tenant):
+        # Deferred: pulls in numpy on first use
+        from app.core.text_index import TextIndex
+        return TextIndex(os.path.join(tenant.root, 'data', 'text_index'), get_domain_store(),
+                         get_semantic_processor(), merge_factor=current_app.config['TEXT_INDEX_MERGE_FACTOR'])
+    return get_tenant_registry().get_service(get_tenant_id(), 'text_index', create)
+
+def get_related_graph():
+    """Get or initialize the current tenant's graph of related domains and documents."""
+    def create(tenant):
+        # Deferred: pulls in numpy on first use
+        from app.core.related import RelatedGraph
+        return RelatedGraph(os.path.join(tenant.root, 'data', 'related_graph.npz'), get_domain_store(),
+                            get_semantic_processor(), k=current_app.config['RELATED_GRAPH_K'])
+    return get_tenant_registry().get_service(get_tenant_id(), 'related', create)
+
+def get_proximity_cache():
+    """Get or initialize the current tenant's cache of levels ordered by semantic proximity."""
+    return get_tenant_registry().get_service(get_tenant_id(), 'proximity', lambda tenant: ProximityCache())
+
+def page_params(orders, default_order):
+    """
+    Read the pagination parameters of a listing request.
+    
+    Args:
+        orders: Accepted values of `order`
+        default_order: Order used when none is given
+    
+    Returns:
+        Tuple of (order, limit, cursor, descending)
+    
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    order = request.args.get('order', default_order)
+    if order not in orders:
+        raise ValueError(f"order must be one of {', '.join(orders)}")
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    direction = request.args.get('direction', 'asc')
+    if direction not in ('asc', 'desc'):
+        raise ValueError("direction must be asc or desc")
+    return order, limit, request.args.get('cursor') or None, direction == 'desc'
+
+def proximity_page(parent_id, pivot_id, limit, cursor, descending):
+    """
+    Get one page of a level ordered by semantic distance to a pivot domain.
+    
+    The order is computed once per level and pivot, and reused until the
+    level, the pivot's level or the embedding namespace changes.
+    
+    Returns:
+        Dictionary with domains, distances, nextCursor and total, or None if the pivot does not exist
+    """
+    domain_store = get_domain_store()
+    pivot = domain_store.domains.get(pivot_id)
+    if pivot is None:
+        return None
+    semantic_processor = get_semantic_processor()
+    version = (domain_store.level_version(parent_id), domain_store.level_version(pivot.parent_id),
+               pivot.name, pivot.description, semantic_processor.embedding_namespace)
+    
+    def build():
+        domains = domain_store.get_domains(parent_id)
+        if not domains:
+            return []
+        pivot_item = {"name": pivot.name, "description": pivot.description}
+        vectors = semantic_processor.get_item_embeddings([pivot_item] + domains)
+        distances = 1.0 - vectors[1:] @ vectors[0]
+        return [(round(max(0.0, float(distance)), 6), domain["id"]) for domain, distance in zip(domains, distances)]
+    
+    view = get_proximity_cache().get(parent_id, pivot_id, version, build)
+    keys, next_cursor = paginate(view, 'proximity', limit, cursor, descending)
+    domains = [domain_store.get_domain(key[-1]) for key in keys]
+    return {
+        "domains": [domain for domain in domains if domain is not None],
+        "distances": {key[-1]: key[0] for key in keys},
+        "nextCursor": next_cursor,
+        "total": len(view)
+    }
+
+def get_change_broker():
+    """Get or initialize the current tenant's change event broker."""
+    def create(tenant):
+        from app.core.changes import ChangeBroker
+        return ChangeBroker(get_domain_store(), capacity=current_app.config['CHANGES_BUFFER_SIZE'])
+    return get_tenant_registry().get_service(get_tenant_id(), 'changes', create)
+
+def duplicate_scope(value):
+    """Validate a requested duplicate scope; None selects the configured default."""
+    from app.core.duplicates import SCOPES
+    if value is not None and value not in SCOPES:
+        raise ValueError(f"duplicateScope must be one of {', '.join(SCOPES)}")
+    return value
+
+# Pool running provider completions off the request threads, and its jobs
+llm_pool = None
+job_store = None
+_llm_pool_lock = threading.Lock()
+
+def get_llm_pool():
+    """Get or initialize the pool that runs completions for /summary and /query."""
+    global llm_pool, job_store
+    if (llm_pool is None):
+        with _llm_pool_lock:
+            if llm_pool is None:
+                job_store = JobStore(ttl=current_app.config.get('LLM_JOB_TTL', 600))
+                llm_pool = WorkPool(
+                    'llm',
+                    workers=current_app.config.get('LLM_WORKERS', 8),
+                    queue_size=current_app.config.get('LLM_QUEUE_SIZE', 32),
+                    max_waiting=current_app.config.get('LLM_MAX_WAITING', 4),
+                    max_per_owner=current_app.config.get('LLM_TENANT_MAX_PENDING', 16)
+                )
+    return llm_pool
+
+def get_job_store():
+    """Get or initialize the store of background completion jobs."""
+    get_llm_pool()
+    return job_store
+
+def get_jobs_folder():
+    """Get the folder the current tenant's jobs are shared through by all server processes."""
+    return os.path.join(get_upload_folder(), 'data', 'jobs')
+
+def wants_async():
+    """Whether the client asked for a job to poll instead of waiting for the result."""
+    prefer = request.headers.get('Prefer', '')
+    return ('respond-async' in prefer.replace(' ', '').split(',')
+            or request.args.get('async', 'false').lower() == 'true')
+
+def job_response(job, status=202):
+    """Describe a job, with its URL in the Location header."""
+    values = {"tenant_id": get_tenant_id()} if request.blueprint == 'tenant_api' else {}
+    location = url_for(f"{request.blueprint}.get_job", job_id=job.id, **values)
+    return jsonify(job.to_dict()), status, {"Location": location, "Preference-Applied": "respond-async"}
+
+def run_llm_task(kind, fn):
+    """
+    Run a completion on the LLM pool instead of the request thread.
+    
+    Clients sending `Prefer: respond-async` (or ?async=true) get a 202 with
+    a job to poll at once. Others wait for the result, in one of a few
+    waiting slots, so slow completions never occupy more than LLM_MAX_WAITING
+    server threads; after LLM_WAIT_TIMEOUT they get the 202 instead.
+    
+    Args:
+        kind: Job kind, 'summary' or 'query'
+        fn: Function returning the response body
+        
+    Returns:
+        Flask response: the result, a 202 with the job, or a 429 or 503 with
+        Retry-After when the pool cannot admit the task
+    """
+    pool = get_llm_pool()
+    jobs = get_job_store()
+    tenant_id = get_tenant_id()
+    registry = get_tenant_registry()
+    # Keep the tenant loaded until the job is done, not just the request
+    tenant = registry.acquire(tenant_id)
+    submitted = False
+    
+    def task():
+        try:
+            return fn()
+        finally:
+            registry.release(tenant)
+    
+    def submit():
+        nonlocal submitted
+        job = jobs.submit(pool, kind, tenant_id, task, directory=get_jobs_folder())
+        submitted = True
+        return job
+    
+    try:
+        if wants_async():
+            return job_response(submit())
+        with pool.waiting():
+            job = submit()
+            try:
+                return jsonify(job.future.result(timeout=current_app.config.get('LLM_WAIT_TIMEOUT', 60)))
+            except FutureTimeoutError:
+                return job_response(job)
+    except Saturated as e:
+        # One knowledge base over its share is throttled; a full pool is an overload
+        status = 429 if e.reason == 'owner' else 503
+        return jsonify({"error": str(e), "reason": e.reason}), status, {"Retry-After": str(e.retry_after)}
+    finally:
+        if not submitted:
+            registry.release(tenant)
+
+@api_bp.url_value_preprocessor
+def pull_tenant_id(endpoint, values):
+    """Take the tenant out of /api/t/<tenant_id>/ URLs before views are called."""
+    g.tenant_path_id = values.pop('tenant_id', None) if values else None
+
+@api_bp.before_request
+def bind_tenant():
+    """Resolve the request's tenant and mark it in use."""
+    try:
+        requested = g.pop('tenant_path_id', None) or request.headers.get(TENANT_HEADER)
+        tenant_id = get_tenant_registry().validate(requested)
+    except UnknownTenantError as e:
+        return jsonify({"error": str(e)}), 404
+    g.tenant_id = tenant_id
+    g.tenant = get_tenant_registry().acquire(tenant_id)
+
+@api_bp.teardown_request
+def release_tenant(exc):
+    """Release the request's tenant, evicting idle tenants when over budget."""
+    tenant = g.pop('tenant', None)
+    if tenant is not None:
+        get_tenant_registry().release(tenant)
 
 @api_bp.route('/domains', methods=['GET'])
 def get_domains():
     """Get domains at a specific level."""
     try:
         parent_id = request.args.get('parentId')
+        width = request.args.get('width', 800, type=float)
+        height = request.args.get('height', 600, type=float)
+        
+        # Paging parameters switch to one sorted page of the level
+        if any(name in request.args for name in ('limit', 'cursor', 'order')):
+            return get_domains_page(parent_id)
         
         # Get domains
         domain_store = get_domain_store()
         domains = domain_store.get_domains(parent_id)
         
+        # Voronoi cells of the stored positions, clipped to the client's canvas;
+        # None until every domain of the level has been laid out
+        cells = None
+        if domains and width > 0 and height > 0:
+            cells = get_voronoi_cache().get_cells(parent_id, domains, (0.0, 0.0, width, height))
+        
         # Compute semantic distances if needed
         if domains and len(domains) > 1:
             semantic_processor = get_semantic_processor()
@@ -57,27 +366,70 @@ def get_domains():
             
             return jsonify({
                 "domains": domains,
-                "semanticDistances": formatted_distances
+                "semanticDistances": formatted_distances,
+                "cells": cells
             })
         
-        return jsonify({"domains": domains, "semanticDistances": {}})
-        
+        return jsonify({"domains": domains, "semanticDistances": {}, "cells": cells})
+    
     except Exception as e:
         current_app.logger.error(f"Error getting domains: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def get_domains_page(parent_id):
+    """Respond with one sorted page of a level, with the distances between its domains."""
+    try:
+        order, limit, cursor, descending = page_params(DOMAIN_ORDERS, 'name')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    domain_store = get_domain_store()
+    if parent_id is not None and parent_id not in domain_store.domains:
+        return jsonify({"error": f"Domain with ID {parent_id} not found"}), 404
+    try:
+        if order == 'proximity':
+            pivot_id = request.args.get('pivot')
+            if not pivot_id:
+                return jsonify({"error": "pivot is required for order=proximity"}), 400
+            page = proximity_page(parent_id, pivot_id, limit, cursor, descending)
+            if page is None:
+                return jsonify({"error": f"Pivot domain {pivot_id} not found"}), 404
+        else:
+            page = domain_store.get_domains_page(parent_id, order, limit, cursor, descending)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Distances within the page; Voronoi cells need the whole level
+    distances = {}
+    if len(page["domains"]) > 1:
+        distances = get_semantic_processor().compute_distances(page["domains"])
+    page["semanticDistances"] = {f"{k[0]}|{k[1]}": v for k, v in distances.items()}
+    page["cells"] = None
+    return jsonify(page)
+
 @api_bp.route('/domains/<domain_id>', methods=['GET'])
 def get_domain(domain_id):
-    """Get a single domain by ID."""
+    """Get a single domain by ID, optionally with only the first page of its documents."""
     try:
         domain_store = get_domain_store()
-        domain = domain_store.get_domain(domain_id)
+        documents_limit = request.args.get('documentsLimit', type=int)
+        if documents_limit is None:
+            domain = domain_store.get_domain(domain_id)
+        else:
+            if documents_limit < 0 or documents_limit > MAX_PAGE_SIZE:
+                return jsonify({"error": f"documentsLimit must be between 0 and {MAX_PAGE_SIZE}"}), 400
+            domain = domain_store.get_domain(domain_id, include_documents=False)
+            if domain:
+                page = domain_store.get_documents_page(domain_id, 'dateAdded', max(documents_limit, 1))
+                domain["documents"] = page["documents"][:documents_limit]
+                domain["documentCount"] = page["total"]
+                domain["documentsNextCursor"] = page["nextCursor"] if documents_limit else None
         
         if domain:
             return jsonify(domain)
         else:
             return jsonify({"error": "Domain not found"}), 404
-            
+    
     except Exception as e:
         current_app.logger.error(f"Error getting domain: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -94,18 +446,68 @@ def add_domain():
         if not name:
             return jsonify({"error": "Name is required"}), 400
         
+        # Look for near-duplicates unless the client insists
+        policy = current_app.config['DUPLICATE_POLICY']
+        duplicates = []
+        if policy != 'off' and not data.get('force'):
+            try:
+                scope = duplicate_scope(data.get('duplicateScope'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            duplicates = get_duplicate_detector().find_domain_duplicates(name, description, parent_id, scope)
+            if duplicates and policy == 'reject':
+                return jsonify({"error": "Similar domains already exist", "duplicates": duplicates}), 409
+        
         domain_store = get_domain_store()
         domain = domain_store.add_domain(name, parent_id, description)
+        if domain and policy != 'off':
+            get_duplicate_detector().index_domain(domain)
+        
+        if domain and current_app.config.get('CLUSTER_AUTO'):
+            # Keep the level under the target fan-out as domains arrive
+            from app.core.clustering import LevelOrganizer
+            organizer = LevelOrganizer(domain_store, get_semantic_processor(),
+                                       current_app.config['CLUSTER_MAX_FANOUT'])
+            if organizer.place_new_domain(domain["id"]):
+                domain = domain_store.get_domain(domain["id"])
         
         if domain:
+            if duplicates:
+                domain["duplicates"] = duplicates
             return jsonify(domain)
         else:
             return jsonify({"error": "Failed to add domain"}), 500
-            
+    
     except Exception as e:
         current_app.logger.error(f"Error adding domain: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@api_bp.route('/domains/cluster', methods=['POST'])
+def cluster_domains():
+    """Propose, or apply, intermediate groups that keep a level under a target fan-out."""
+    try:
+        data = request.json or {}
+        parent_id = data.get('parentId')
+        max_fanout = int(data.get('maxFanout', current_app.config['CLUSTER_MAX_FANOUT']))
+        
+        if max_fanout < 2:
+            return jsonify({"error": "maxFanout must be at least 2"}), 400
+        
+        domain_store = get_domain_store()
+        if parent_id is not None and not domain_store.get_domain(parent_id):
+            return jsonify({"error": f"Domain with ID {parent_id} not found"}), 404
+        
+        # Deferred: pulls in numpy on first use
+        from app.core.clustering import LevelOrganizer
+        organizer = LevelOrganizer(domain_store, get_semantic_processor(), max_fanout)
+        if data.get('apply'):
+            return jsonify(organizer.apply(parent_id))
+        return jsonify(organizer.propose(parent_id))
+    
+    except Exception as e:
+        current_app.logger.error(f"Error clustering domains: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @api_bp.route('/domains/<domain_id>', methods=['PUT'])
 def update_domain(domain_id):
     """Update a domain."""
@@ -122,11 +524,15 @@ def update_domain(domain_id):
         domain_store = get_domain_store()
         domain = domain_store.update_domain(domain_id, updates)
         
+        if domain and ('name' in updates or 'description' in updates) \
+                and current_app.config['DUPLICATE_POLICY'] != 'off':
+            get_duplicate_detector().index_domain(domain)
+        
         if domain:
             return jsonify(domain)
         else:
             return jsonify({"error": "Domain not found"}), 404
-            
+    
     except Exception as e:
         current_app.logger.error(f"Error updating domain: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -142,11 +548,37 @@ def delete_domain(domain_id):
             return jsonify({"success": True})
         else:
             return jsonify({"error": "Domain not found"}), 404
-            
+    
     except Exception as e:
         current_app.logger.error(f"Error deleting domain: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@api_bp.route('/domains/<domain_id>/merge', methods=['POST'])
+def merge_domain(domain_id):
+    """Merge a domain, e.g. a detected duplicate, into another domain."""
+    try:
+        data = request.json or {}
+        target_id = data.get('targetId')
+        
+        if not target_id:
+            return jsonify({"error": "targetId is required"}), 400
+        
+        domain_store = get_domain_store()
+        for required_id in (domain_id, target_id):
+            if not domain_store.get_domain(required_id):
+                return jsonify({"error": f"Domain with ID {required_id} not found"}), 404
+        
+        merged = domain_store.merge_domains(domain_id, target_id)
+        
+        if merged:
+            return jsonify(merged)
+        else:
+            return jsonify({"error": "Cannot merge a domain into itself or its own subtree"}), 400
+    
+    except Exception as e:
+        current_app.logger.error(f"Error merging domains: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @api_bp.route('/domains/<domain_id>/path', methods=['GET'])
 def get_domain_path(domain_id):
     """Get the path from root to a domain."""
@@ -155,11 +587,61 @@ def get_domain_path(domain_id):
         path = domain_store.get_domain_path(domain_id)
         
         return jsonify({"path": path})
-            
+    
     except Exception as e:
         current_app.logger.error(f"Error getting domain path: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@api_bp.route('/domains/<domain_id>/related', methods=['GET'])
+def get_related_domains(domain_id):
+    """Get the domains and documents most related to a domain, anywhere in the tree."""
+    try:
+        limit = min(max(request.args.get('k', 10, type=int), 1), 100)
+        kind = request.args.get('kind', 'all')
+        subtree = request.args.get('subtree')
+        exclude_subtree = request.args.get('excludeSubtree')
+        
+        if kind not in ('all', 'domain', 'document'):
+            return jsonify({"error": "kind must be all, domain or document"}), 400
+        domain_store = get_domain_store()
+        if domain_id not in domain_store.domains:
+            return jsonify({"error": "Domain not found"}), 404
+        for name, root_id in (('subtree', subtree), ('excludeSubtree', exclude_subtree)):
+            if root_id is not None and root_id not in domain_store.domains:
+                return jsonify({"error": f"{name} domain not found"}), 400
+        
+        graph = get_related_graph()
+        result = graph.related(domain_id, limit, None if kind == 'all' else kind, subtree, exclude_subtree)
+        if result is None:
+            # The first graph is still being built in the background
+            return jsonify({"status": graph.status()}), 202
+        related, source = result
+        return jsonify({"id": domain_id, "related": related, "source": source})
+    
+    except Exception as e:
+        current_app.logger.error(f"Error getting related domains: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/related/status', methods=['GET'])
+def get_related_status():
+    """Describe the graph of related domains and documents."""
+    try:
+        return jsonify(get_related_graph().status())
+    except Exception as e:
+        current_app.logger.error(f"Error getting related graph status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/related/rebuild', methods=['POST'])
+def rebuild_related():
+    """Rebuild the graph of related domains and documents from scratch."""
+    try:
+        graph = get_related_graph()
+        graph.rebuild()
+        return jsonify({"status": graph.status()}), 202
+    except Exception as e:
+        current_app.logger.error(f"Error rebuilding related graph: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @api_bp.route('/domains/<domain_id>/documents', methods=['POST'])
 def add_document(domain_id):
     """Upload and add a document to a domain."""
@@ -168,33 +650,39 @@ def add_document(domain_id):
         
         if 'file' not in request.files:
             return jsonify({"error": "No file provided"}), 400
-            
+        
         file = request.files['file']
         
         if file.filename == '':
             return jsonify({"error": "No file selected"}), 400
-            
+        
         if not domain_id:
             return jsonify({"error": "Domain ID is required"}), 400
-            
+        
         # Check if domain exists
         domain_store = get_domain_store()
         domain = domain_store.get_domain(domain_id)
         if not domain:
             return jsonify({"error": f"Domain with ID {domain_id} not found"}), 404
-            
+        
         # Save the file
         filename = secure_filename(file.filename)
         file_ext = os.path.splitext(filename)[1].lower()
         
-        # Validate file type (optional)
-        allowed_extensions = ['.pdf', '.doc', '.docx', '.txt']
-        if file_ext.lower() not in allowed_extensions:
+        # Validate file type against the formats we can extract text from
+        if file_ext.lower() not in EXTENSION_TYPES:
             return jsonify({"error": f"File type {file_ext} not supported. Please upload a PDF, DOC, DOCX, or TXT file."}), 400
         
+        policy = current_app.config['DUPLICATE_POLICY']
+        check_duplicates = policy != 'off' and request.form.get('force', 'false').lower() != 'true'
+        try:
+            scope = duplicate_scope(request.form.get('duplicateScope')) if check_duplicates else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         # Create a unique filename
         unique_filename = f"{uuid.uuid4()}{file_ext}"
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'documents', unique_filename)
+        file_path = os.path.join(get_upload_folder(), 'documents', unique_filename)
         
         # Ensure the directory exists
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
@@ -205,26 +693,41 @@ def add_document(domain_id):
         saved_file_exists = os.path.exists(file_path)
         if not saved_file_exists:
             return jsonify({"error": "Failed to save file"}), 500
-            
+        
         # Add document to domain
         document = {
             "name": filename,
             "path": os.path.join('documents', unique_filename),
-            "type": file.content_type,
+            "type": extractor_registry.detect_type(file_path) or file.content_type,
             "dateAdded": datetime.now().isoformat(),
             "description": description
         }
         
+        # Look for near-duplicate documents before adding this one
+        duplicates = []
+        vector = None
+        if check_duplicates:
+            vector, duplicates = get_duplicate_detector().find_document_duplicates(document["path"], domain_id, scope)
+            if duplicates and policy == 'reject':
+                os.remove(file_path)
+                return jsonify({"error": "Similar documents already exist", "duplicates": duplicates}), 409
+        
+        # The keyword index picks the document up from the store's change events
+        get_text_index()
         result = domain_store.add_document(domain_id, document)
         
         if result:
+            if policy != 'off':
+                get_duplicate_detector().index_document(result, vector)
+            if duplicates:
+                result["duplicates"] = duplicates
             return jsonify(result)
         else:
             # Clean up file if document not added
             if saved_file_exists:
                 os.remove(file_path)
             return jsonify({"error": "Failed to add document to domain"}), 500
-            
+    
     except Exception as e:
         current_app.logger.error(f"Error adding document: {str(e)}")
         # Clean up file if exception occurs
@@ -235,6 +738,24 @@ def add_document(domain_id):
             current_app.logger.error(f"Error cleaning up file after exception: {str(cleanup_error)}")
         return jsonify({"error": str(e)}), 500
 
+@api_bp.route('/domains/<domain_id>/documents', methods=['GET'])
+def list_documents(domain_id):
+    """Get one sorted page of a domain's documents."""
+    try:
+        try:
+            order, limit, cursor, descending = page_params(DOCUMENT_ORDERS, 'dateAdded')
+            page = get_domain_store().get_documents_page(domain_id, order, limit, cursor, descending)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if page is None:
+            return jsonify({"error": f"Domain with ID {domain_id} not found"}), 404
+        return jsonify(page)
+    
+    except Exception as e:
+        current_app.logger.error(f"Error listing documents: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @api_bp.route('/domains/<domain_id>/documents/<document_id>', methods=['DELETE'])
 def remove_document(domain_id, document_id):
     """Remove a document from a domain."""
@@ -242,28 +763,22 @@ def remove_document(domain_id, document_id):
         domain_store = get_domain_store()
         
         # Get the document info first so we can delete the file
-        domain = domain_store.get_domain(domain_id)
-        document = None
-        
-        if domain and "documents" in domain:
-            for doc in domain["documents"]:
-                if doc.get("id") == document_id:
-                    document = doc
-                    break
+        document = domain_store.get_document(document_id, domain_id)
         
         success = domain_store.remove_document(domain_id, document_id)
         
         if success and document:
             # Delete the file if it exists
             if "path" in document:
-                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], document["path"])
+                file_path = os.path.join(get_upload_folder(), document["path"])
                 if os.path.exists(file_path):
                     os.remove(file_path)
+                get_semantic_processor().answer_cache.invalidate(document["path"])
             
             return jsonify({"success": True})
         else:
             return jsonify({"error": "Document not found"}), 404
-            
+    
     except Exception as e:
         current_app.logger.error(f"Error removing document: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -272,9 +787,9 @@ def remove_document(domain_id, document_id):
 def get_document(document_path):
     """Serve a document file."""
     try:
-        full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], document_path)
+        full_path = resolve_document_path(document_path)
         
-        if not os.path.exists(full_path):
+        if full_path is None or not os.path.isfile(full_path):
             return jsonify({"error": "Document not found"}), 404
         
         # Check if the file is a PDF and set the correct mimetype
@@ -292,7 +807,7 @@ def get_document(document_path):
             as_attachment=False,
             download_name=os.path.basename(document_path)
         )
-            
+    
     except Exception as e:
         current_app.logger.error(f"Error serving document: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -301,15 +816,34 @@ def get_document(document_path):
 def get_document_summary(document_path):
     """Get a summary of a document."""
     try:
-        semantic_processor = get_semantic_processor()
-        summary = semantic_processor.get_document_summary(document_path)
+        full_path = resolve_document_path(document_path)
+        if full_path is None or not os.path.isfile(full_path):
+            return jsonify({"error": "Document not found"}), 404
         
-        return jsonify({"summary": summary})
-            
+        semantic_processor = get_semantic_processor()
+        return run_llm_task('summary', lambda: {"summary": semantic_processor.get_document_summary(document_path)})
+    
     except Exception as e:
         current_app.logger.error(f"Error getting document summary: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@api_bp.route('/documents/<path:document_path>/extraction', methods=['GET'])
+def get_document_extraction(document_path):
+    """Get the text extraction report of a document, including skipped pages."""
+    try:
+        full_path = resolve_document_path(document_path)
+        if full_path is None or not os.path.isfile(full_path):
+            return jsonify({"error": "Document not found"}), 404
+        
+        semantic_processor = get_semantic_processor()
+        report = semantic_processor.get_extraction_report(document_path)
+        
+        return jsonify(report)
+    
+    except Exception as e:
+        current_app.logger.error(f"Error getting extraction report: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @api_bp.route('/documents/<path:document_path>/query', methods=['POST'])
 def query_document(document_path):
     """Process a query about a document."""
@@ -321,23 +855,113 @@ def query_document(document_path):
             return jsonify({"error": "Query is required"}), 400
         
         # Validate document path
-        full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], document_path)
-        if not os.path.exists(full_path):
+        full_path = resolve_document_path(document_path)
+        if full_path is None or not os.path.isfile(full_path):
             return jsonify({"error": "Document not found"}), 404
-            
+        
         # Validate query length
         if len(query) > 1000:  # Set a reasonable limit
             return jsonify({"error": "Query too long (maximum 1000 characters)"}), 400
-            
-        semantic_processor = get_semantic_processor()
-        response = semantic_processor.process_document_query(document_path, query)
         
-        return jsonify({"response": response})
-            
+        # Answer from the passages matching the query rather than the document's
+        # beginning; they are only looked up when the answer is not cached
+        passages = None
+        document = get_domain_store().find_document_by_path(document_path)
+        if document is not None:
+            text_index = get_text_index()
+            passages = lambda max_chars: text_index.best_passages(document.id, query, max_chars=max_chars)
+        
+        semantic_processor = get_semantic_processor()
+        cached = semantic_processor.cached_document_answer(document_path, query)
+        if cached is not None:
+            return jsonify({"response": cached})
+        return run_llm_task('query', lambda: {
+            "response": semantic_processor.process_document_query(document_path, query, passages)
+        })
+    
     except Exception as e:
         current_app.logger.error(f"Error querying document: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status, and once done the result, of a summary or query job."""
+    try:
+        job = get_job_store().get(job_id, get_tenant_id(), directory=get_jobs_folder())
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        current_app.logger.error(f"Error getting job: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/search', methods=['GET'])
+def search_documents():
+    """Search documents by keywords (BM25), meaning (embeddings) or both."""
+    try:
+        query = request.args.get('q', '').strip()
+        mode = request.args.get('mode', 'hybrid')
+        limit = min(max(request.args.get('k', 10, type=int), 1), 100)
+        domain_id = request.args.get('domainId')
+        
+        if not query:
+            return jsonify({"error": "Query is required"}), 400
+        if len(query) > 1000:
+            return jsonify({"error": "Query too long (maximum 1000 characters)"}), 400
+        if mode not in ('hybrid', 'bm25', 'vector'):
+            return jsonify({"error": "mode must be hybrid, bm25 or vector"}), 400
+        
+        domain_store = get_domain_store()
+        allowed = None
+        if domain_id:
+            if domain_store.get_domain(domain_id) is None:
+                return jsonify({"error": f"Domain with ID {domain_id} not found"}), 404
+            allowed = [document_id for subtree_id in domain_store.get_subtree_ids(domain_id)
+                       for document_id in domain_store.domains[subtree_id].documents]
+        
+        # Score more candidates than returned, so that fusion can reorder them
+        lexical = {}
+        if mode != 'vector':
+            lexical = get_text_index().score_documents(query, limit * 5, allowed)
+        semantic = {}
+        if mode != 'bm25':
+            vector = get_semantic_processor().get_query_embedding(query)
+            semantic = dict(get_duplicate_detector().search_documents(vector, limit * 5, allowed))
+        
+        from app.core.text_index import hybrid_rank
+        weight = {'bm25': 0.0, 'vector': 1.0}.get(mode, current_app.config['SEARCH_HYBRID_WEIGHT'])
+        ranked = hybrid_rank({key: value[0] for key, value in lexical.items()}, semantic, weight)
+        
+        results = []
+        for document_id, score, bm25, similarity in ranked:
+            document = domain_store.document_index.get(document_id)
+            if document is None:
+                continue
+            result = {"id": document.id, "name": document.name, "path": document.path,
+                      "domainId": document.domain_id, "score": round(score, 4),
+                      "bm25": bm25, "similarity": round(similarity, 4)}
+            if document_id in lexical:
+                passage = lexical[document_id][1]
+                result["passage"] = {"start": passage["start"], "end": passage["end"]}
+            results.append(result)
+            if len(results) == limit:
+                break
+        
+        return jsonify({"query": query, "mode": mode, "results": results})
+    
+    except Exception as e:
+        current_app.logger.error(f"Error searching documents: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/search/status', methods=['GET'])
+def get_search_status():
+    """Describe the keyword index."""
+    try:
+        return jsonify(get_text_index().status())
+    except Exception as e:
+        current_app.logger.error(f"Error getting search status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @api_bp.route('/domains/positions', methods=['POST'])
 def update_domain_positions():
     """Update domain positions."""
@@ -352,7 +976,132 @@ def update_domain_positions():
             return jsonify({"success": True})
         else:
             return jsonify({"error": "Failed to update positions"}), 500
-            
+    
     except Exception as e:
         current_app.logger.error(f"Error updating domain positions: {str(e)}")
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/changes', methods=['GET'])
+def get_changes():
+    """Get the change events after a cursor, optionally waiting for new ones."""
+    try:
+        broker = get_change_broker()
+        cursor = request.args.get('since')
+        wait = min(max(request.args.get('wait', 0, type=float), 0), 30)
+        
+        events, reset = broker.since(cursor)
+        if cursor and not reset and not events and wait > 0:
+            events = broker.wait(broker.parse_cursor(cursor), wait)
+        
+        revision = events[-1]["revision"] if events else broker.revision
+        return jsonify({
+            "cursor": broker.cursor(revision),
+            "reset": reset,
+            "events": events
+        })
+    
+    except Exception as e:
+        current_app.logger.error(f"Error getting changes: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/changes/stream', methods=['GET'])
+def stream_changes():
+    """Stream change events as server-sent events."""
+    try:
+        broker = get_change_broker()
+        # EventSource sends the last received id when it reconnects
+        cursor = request.headers.get('Last-Event-ID') or request.args.get('since')
+        stream = broker.stream(cursor, duration=current_app.config['CHANGES_STREAM_SECONDS'])
+        return Response(stream_with_context(stream), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
+    except Exception as e:
+        current_app.logger.error(f"Error streaming changes: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/map/viewport', methods=['GET'])
+def get_map_viewport():
+    """Get the whole-tree map tiles visible in a viewport."""
+    try:
+        tile_map = get_tile_map()
+        world = tile_map.world
+        bbox = tuple(request.args.get(name, default, type=float)
+                     for name, default in zip(('x0', 'y0', 'x1', 'y1'), world))
+        zoom = request.args.get('zoom', 0, type=int)
+        limit = request.args.get('limit', None, type=int)
+        
+        if bbox[2] <= bbox[0] or bbox[3] <= bbox[1]:
+            return jsonify({"error": "Viewport must have x1 > x0 and y1 > y0"}), 400
+        
+        viewport = tile_map.viewport(bbox, zoom, limit)
+        if viewport is None:
+            # The first layout is still being built in the background
+            return jsonify({"status": tile_map.status()}), 202
+        return jsonify(viewport)
+    
+    except Exception as e:
+        current_app.logger.error(f"Error getting map viewport: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/map/status', methods=['GET'])
+def get_map_status():
+    """Describe the whole-tree map build."""
+    try:
+        return jsonify(get_tile_map().status())
+    except Exception as e:
+        current_app.logger.error(f"Error getting map status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/map/rebuild', methods=['POST'])
+def rebuild_map():
+    """Start laying out the whole-tree map again."""
+    try:
+        tile_map = get_tile_map()
+        started = tile_map.rebuild()
+        return jsonify({"started": started, "status": tile_map.status()}), 202
+    except Exception as e:
+        current_app.logger.error(f"Error rebuilding map: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/embeddings/migration', methods=['GET'])
+def get_embedding_migration_status():
+    """Describe the active embedding namespace and the latest migration."""
+    try:
+        get_semantic_processor()
+        return jsonify(get_embedding_migration().status())
+    except Exception as e:
+        current_app.logger.error(f"Error getting embedding migration: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/embeddings/migration', methods=['POST'])
+def start_embedding_migration():
+    """Start re-embedding the knowledge base into another namespace."""
+    try:
+        processor = get_semantic_processor()
+        data = request.get_json(silent=True) or {}
+        model = data.get('model') or processor.target_model
+        dimension = data.get('dimension') or processor.target_dimension
+        if not isinstance(model, str) or not isinstance(dimension, int) or dimension <= 0:
+            return jsonify({"error": "model must be a string and dimension a positive integer"}), 400
+        
+        try:
+            status = get_embedding_migration().start(model, dimension)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
+        return jsonify(status), 202
+    
+    except Exception as e:
+        current_app.logger.error(f"Error starting embedding migration: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/embeddings/migration', methods=['DELETE'])
+def cancel_embedding_migration():
+    """Stop the running embedding migration and discard its progress."""
+    try:
+        get_semantic_processor()
+        return jsonify(get_embedding_migration().cancel())
+    except Exception as e:
+        current_app.logger.error(f"Error cancelling embedding migration: {str(e)}")
+        return jsonify({"error": str(e)}), 500
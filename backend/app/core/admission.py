@@ -0,0 +1,380 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/admission.py
+"""
+app/core/admission.py
+Bounded worker pool with admission control for slow, I/O-bound requests.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+from app.core import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+POOL_PENDING = metrics.registry.gauge(
+    'work_pool_pending', 'Tasks queued or running in a work pool', ['pool'])
+POOL_WAITING = metrics.registry.gauge(
+    'work_pool_waiting_requests', 'Request threads waiting for a work pool task', ['pool'])
+POOL_QUEUE_WAIT = metrics.registry.histogram(
+    'work_pool_queue_wait_seconds', 'Time tasks spend queued before a worker runs them', ['pool'])
+POOL_RUN = metrics.registry.histogram(
+    'work_pool_task_duration_seconds', 'Time workers spend running tasks', ['pool', 'kind'])
+POOL_REJECTIONS = metrics.registry.counter(
+    'work_pool_rejections_total', 'Tasks refused because a work pool was saturated', ['pool', 'reason'])
+
+
+class Saturated(Exception):
+    """Raised when a work pool cannot admit more work."""
+
+    def __init__(self, message: str, reason: str, retry_after: int):
+        """
+        Initialize the error.
+
+        Args:
+            message: Description of the limit that was reached
+            reason: 'queue' (the pool is full), 'owner' (the owner's share of it
+                is used up) or 'waiting' (too many requests wait for results)
+            retry_after: Suggested number of seconds before retrying
+        """
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class WorkPool:
+    """
+    A fixed number of worker threads with a bounded queue in front of them.
+
+    Slow tasks (provider completions) run here instead of on the threads
+    serving requests, so a burst of them cannot take every server thread
+    from cheap reads. Admission is decided up front: a task is refused with
+    Saturated when the queue is full or its owner already has its share of
+    it, and at most max_waiting request threads may block on results at once.
+    """
+
+    def __init__(self, name: str, workers: int = 8, queue_size: int = 32,
+                 max_waiting: int = 4, max_per_owner: int = 0):
+        """
+        Initialize the pool.
+
+        Args:
+            name: Pool name, used in metrics and thread names
+            workers: Number of tasks run at once
+            queue_size: Number of tasks waiting for a worker beyond those running
+            max_waiting: Number of request threads allowed to block on results
+            max_per_owner: Tasks one owner (a tenant) may have queued or
+                running, or 0 for no per-owner limit
+        """
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.max_waiting = max(0, max_waiting)
+        self.max_per_owner = max(0, max_per_owner)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f'{name}-pool')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pending_by_owner: Dict[str, int] = {}
+        self._waiting = 0
+        # Moving average of task durations, for Retry-After estimates
+        self._average_duration = 1.0
+
+    @property
+    def capacity(self) -> int:
+        """Number of tasks that can be queued or running at once."""
+        return self.workers + self.queue_size
+
+    def submit(self, fn: Callable[..., Any], *args, owner: str = "", kind: str = "", **kwargs) -> Future:
+        """
+        Queue a task, if the pool admits it.
+
+        Args:
+            fn: Function to run on a worker
+            owner: Who the task is run for, limited to max_per_owner tasks
+            kind: Task kind, used in metrics
+
+        Returns:
+            Future of the task's result
+
+        Raises:
+            Saturated: If the pool or the owner's share of it is full
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                POOL_REJECTIONS.inc(pool=self.name, reason='queue')
+                raise Saturated(f"The {self.name} queue is full", 'queue', self._retry_after())
+            owned = self._pending_by_owner.get(owner, 0)
+            if self.max_per_owner and owned >= self.max_per_owner:
+                POOL_REJECTIONS.inc(pool=self.name, reason='owner')
+                raise Saturated(f"Too many {self.name} tasks in progress for this knowledge base",
+                                'owner', self._retry_after())
+            self._pending += 1
+            self._pending_by_owner[owner] = owned + 1
+            POOL_PENDING.set(self._pending, pool=self.name)
+
+        try:
+            return self._executor.submit(self._run, fn, args, kwargs, owner, kind, time.perf_counter())
+        except RuntimeError:
+            # The pool was shut down
+            self._finish(owner)
+            raise
+
+    @contextmanager
+    def waiting(self) -> Iterator[None]:
+        """
+        Hold one of the slots of request threads blocking on results.
+
+        Raises:
+            Saturated: If every slot is taken
+        """
+        with self._lock:
+            if self._waiting >= self.max_waiting:
+                POOL_REJECTIONS.inc(pool=self.name, reason='waiting')
+                raise Saturated(f"Too many requests are waiting for the {self.name} pool",
+                                'waiting', self._retry_after())
+            self._waiting += 1
+            POOL_WAITING.set(self._waiting, pool=self.name)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                POOL_WAITING.set(self._waiting, pool=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        """Describe the pool's limits and load."""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queueSize": self.queue_size,
+                "maxWaiting": self.max_waiting,
+                "maxPerOwner": self.max_per_owner,
+                "pending": self._pending,
+                "waiting": self._waiting,
+                "averageTaskSeconds": round(self._average_duration, 3),
+            }
+
+    def shutdown(self, wait: bool = False):
+        """Stop the workers, dropping queued tasks."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, fn: Callable[..., Any], args: tuple, kwargs: dict, owner: str, kind: str, queued: float) -> Any:
+        started = time.perf_counter()
+        POOL_QUEUE_WAIT.observe(started - queued, pool=self.name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - started
+            POOL_RUN.observe(duration, pool=self.name, kind=kind)
+            with self._lock:
+                self._average_duration += 0.2 * (duration - self._average_duration)
+            self._finish(owner)
+
+    def _finish(self, owner: str):
+        with self._lock:
+            self._pending -= 1
+            remaining = self._pending_by_owner.get(owner, 1) - 1
+            if remaining > 0:
+                self._pending_by_owner[owner] = remaining
+            else:
+                self._pending_by_owner.pop(owner, None)
+            POOL_PENDING.set(self._pending, pool=self.name)
+
+    def _retry_after(self) -> int:
+        # Time for the workers to drain the current queue; called with the lock held
+        return max(1, math.ceil(self._pending / self.workers * self._average_duration))
+
+
+class Job:
+    """
+    A task run in the background, polled for by its id.
+
+    With a directory, the job's state is also written to <directory>/<id>.json
+    whenever it changes, so any server process can answer polls for it. Each
+    write describes the job as it is when written, under the job's lock, so
+    the last write is always the current state whichever thread makes it.
+    """
+
+    def __init__(self, kind: str, owner: str, directory: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.directory = directory
+        self.future: Optional[Future] = None
+        self.created = time.time()
+        self.started = False
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def run(self, fn: Callable[[], Any]) -> Any:
+        """Run the task on a worker, recording that it started."""
+        self.started = True
+        self.save()
+        return fn()
+
+    def attach(self, future: Future):
+        """Follow the task's future, recording its outcome when it finishes."""
+        self.future = future
+        # A worker that already started the task has written a newer state
+        if not self.started:
+            self.save()
+        future.add_done_callback(self._set_finished)
+
+    def _set_finished(self, future: Future):
+        self.finished = time.time()
+        self.save()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Describe the job.
+
+        Returns:
+            Dictionary with the id, kind and status ('queued', 'running',
+            'done' or 'failed'), plus the result or error once finished
+        """
+        job = {"id": self.id, "kind": self.kind, "createdAt": self.created}
+        future = self.future
+        if future is None or not future.done():
+            job["status"] = "running" if self.started or (future is not None and future.running()) else "queued"
+            return job
+        job["finishedAt"] = self.finished
+        error = None if future.cancelled() else future.exception()
+        if future.cancelled() or error is not None:
+            job["status"] = "failed"
+            job["error"] = "Cancelled" if future.cancelled() else str(error)
+        else:
+            job["status"] = "done"
+            job["result"] = future.result()
+        return job
+
+    def save(self):
+        """Write the job's state to its directory, atomically replacing the file."""
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{self.id}.json")
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with self._lock:
+                with open(temp_path, 'w') as f:
+                    json.dump(self.to_dict(), f)
+                os.replace(temp_path, path)
+        except Exception as e:
+            logger.error(f"Error saving job {self.id}: {str(e)}")
+
+
+class JobStore:
+    """
+    Jobs by id. Finished jobs are kept for ttl seconds so clients can fetch
+    their result, and the oldest are dropped beyond max_jobs.
+
+    Jobs given a directory are also kept there as JSON files, so a poll
+    reaching another server process than the one running the job (e.g.
+    another gunicorn worker) still finds it.
+    """
+
+    def __init__(self, ttl: float = 600, max_jobs: int = 10000):
+        """
+        Initialize the store.
+
+        Args:
+            ttl: Seconds a finished job is kept
+            max_jobs: Number of jobs kept in memory, oldest dropped first
+        """
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def submit(self, pool: WorkPool, kind: str, owner: str, fn: Callable[[], Any],
+               directory: Optional[str] = None) -> Job:
+        """
+        Run a task on a pool as a job.
+
+        Args:
+            pool: Pool running the task
+            kind: Task kind, e.g. 'summary' or 'query'
+            owner: Who may fetch the job, e.g. its tenant
+            fn: Function computing the job's JSON-serializable result
+            directory: Optional directory the job's state is written to
+
+        Returns:
+            The new job
+
+        Raises:
+            Saturated: If the pool does not admit the task
+        """
+        job = Job(kind, owner, directory)
+        job.attach(pool.submit(job.run, fn, owner=owner, kind=kind))
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        if directory:
+            self._prune_directory(directory)
+        return job
+
+    def get(self, job_id: str, owner: str, directory: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Describe a job.
+
+        Args:
+            job_id: Job id
+            owner: Owner the job must belong to
+            directory: Directory the owner's jobs are written to, searched
+                for jobs run by other processes
+
+        Returns:
+            The job's description, or None if unknown, expired or owned by someone else
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict() if job.owner == owner else None
+        if not directory or not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(os.path.join(directory, f"{job_id}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading job {job_id}: {str(e)}")
+            return None
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        while len(self._jobs) >= self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    def _prune_directory(self, directory: str):
+        # Job files are last written when the job finishes; files of jobs
+        # whose process died stop changing too, and expire the same way
+        cutoff = time.time() - self.ttl
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.json') and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error pruning jobs in {directory}: {str(e)}")
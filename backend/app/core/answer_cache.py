@@ -0,0 +1,286 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/answer_cache.py
+"""
+app/core/answer_cache.py
+Cache of document query answers, keyed by document content and question.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import numpy as np
+from app.core import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_LOOKUPS = metrics.registry.counter(
+    'semantic_answer_cache_lookups_total', 'Document query answer cache lookups', ['result'])
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a question so that trivially different spellings share an entry.
+
+    Args:
+        query: User question
+
+    Returns:
+        Case-folded question without punctuation and with single spaces
+    """
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", query.casefold())).strip()
+
+
+class AnswerCache:
+    """
+    Answers to document queries, keyed by the digest of the document's
+    content and the normalized question.
+
+    A question that misses exactly can still be answered by a cached
+    paraphrase: the embeddings of the document's cached questions are
+    compared with the new one's, and the closest answer is reused when the
+    cosine similarity reaches the threshold. Entries are keyed by content,
+    so a changed document misses; its old entries are dropped as soon as
+    the new content is seen.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 1024, threshold: float = 0.95):
+        """
+        Initialize the cache.
+
+        Args:
+            path: JSON file the entries are persisted to, or None to keep them in memory only
+            max_entries: Number of answers kept, least recently used dropped first
+            threshold: Cosine similarity at or above which a cached question counts as a paraphrase
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # (digest, normalized query) -> entry
+        self._entries: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+        # Question embeddings, kept in memory only: key -> (namespace, vector)
+        self._vectors: Dict[Tuple[str, str], Tuple[str, np.ndarray]] = {}
+        # Content digests memoized by full path: path -> (mtime, size, digest)
+        self._digests: Dict[str, Tuple[float, int, str]] = {}
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def memory_usage(self) -> int:
+        """Approximate memory held by the cache, in bytes."""
+        with self._lock:
+            text_bytes = sum(len(entry["query"]) + len(entry["answer"]) + 200 for entry in self._entries.values())
+            return text_bytes + sum(vector.nbytes for _, vector in self._vectors.values())
+
+    def document_digest(self, full_path: str) -> Optional[str]:
+        """
+        Get the digest of a document's content, rehashing only when the file changed.
+
+        Args:
+            full_path: Path to the document
+
+        Returns:
+            SHA-256 hex digest, or None if the file cannot be read
+        """
+        try:
+            stat = os.stat(full_path)
+            memo = self._digests.get(full_path)
+            if memo is not None and memo[:2] == (stat.st_mtime, stat.st_size):
+                return memo[2]
+            digest = hashlib.sha256()
+            with open(full_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            self._digests[full_path] = (stat.st_mtime, stat.st_size, digest.hexdigest())
+            return digest.hexdigest()
+        except OSError as e:
+            logger.error(f"Error hashing document {full_path}: {str(e)}")
+            return None
+
+    def get(self, digest: str, query: str, embed: Optional[Callable[[str], Optional[np.ndarray]]] = None,
+            namespace: str = "") -> Optional[Tuple[str, str]]:
+        """
+        Look up the answer to a question about a document.
+
+        Args:
+            digest: Content digest of the document
+            query: User question
+            embed: Embeds a question, returning None when no reliable
+                embedding is available; without it only exact matches are found
+            namespace: Embedding namespace of the vectors embed returns
+
+        Returns:
+            Tuple of (answer, "exact" or "semantic"), or None on a miss
+        """
+        key = (digest, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                ANSWER_CACHE_LOOKUPS.inc(result="exact")
+                return entry["answer"], "exact"
+            candidates = [(other, entry["query"]) for other, entry in self._entries.items() if other[0] == digest]
+
+        # Only documents with cached answers pay for the question's embedding
+        if embed is None or not candidates:
+            ANSWER_CACHE_LOOKUPS.inc(result="miss")
+            return None
+        vector = embed(query)
+        if vector is None:
+            ANSWER_CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+        best_key, best_similarity = None, self.threshold
+        for other, other_query in candidates:
+            other_vector = self._vector(other, other_query, embed, namespace)
+            if other_vector is None or len(other_vector) != len(vector):
+                continue
+            norm = float(np.linalg.norm(vector) * np.linalg.norm(other_vector))
+            similarity = float(np.dot(vector, other_vector)) / norm if norm else 0.0
+            if similarity >= best_similarity:
+                best_key, best_similarity = other, similarity
+
+        with self._lock:
+            entry = self._entries.get(best_key) if best_key is not None else None
+            if entry is None:
+                ANSWER_CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self._entries.move_to_end(best_key)
+            ANSWER_CACHE_LOOKUPS.inc(result="semantic")
+            logger.info(f"Reusing the answer to {entry['query']!r} (similarity {best_similarity:.3f})")
+            return entry["answer"], "semantic"
+
+    def peek(self, digest: str, query: str) -> Optional[str]:
+        """
+        Look up the answer to exactly this question, without embedding anything.
+
+        Args:
+            digest: Content digest of the document
+            query: User question
+
+        Returns:
+            Cached answer, or None (a paraphrase may still match with get())
+        """
+        key = (digest, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            ANSWER_CACHE_LOOKUPS.inc(result="exact")
+            return entry["answer"]
+
+    def put(self, digest: str, document_path: str, query: str, answer: str,
+            vector: Optional[np.ndarray] = None, namespace: str = ""):
+        """
+        Cache the answer to a question about a document.
+
+        Answers cached for an older content of the same document are dropped.
+
+        Args:
+            digest: Content digest of the document
+            document_path: Path of the document, relative to the upload folder
+            query: User question
+            answer: Answer to cache
+            vector: Optional embedding of the question
+            namespace: Embedding namespace of the vector
+        """
+        key = (digest, normalize_query(query))
+        with self._lock:
+            for stale in [other for other, entry in self._entries.items()
+                          if entry["path"] == document_path and other[0] != digest]:
+                self._drop(stale)
+            self._entries[key] = {"path": document_path, "query": query, "answer": answer, "created": time.time()}
+            self._entries.move_to_end(key)
+            if vector is not None:
+                self._vectors[key] = (namespace, vector)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+        self.save()
+
+    def invalidate(self, document_path: str) -> int:
+        """
+        Drop every answer cached for a document.
+
+        Args:
+            document_path: Path of the document, relative to the upload folder
+
+        Returns:
+            Number of answers dropped
+        """
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["path"] == document_path]
+            for key in stale:
+                self._drop(key)
+        if stale:
+            self.save()
+        return len(stale)
+
+    def clear(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+        self.save()
+
+    def save(self) -> bool:
+        """
+        Persist the entries, atomically replacing the file.
+
+        Returns:
+            Whether the entries were written
+        """
+        if not self.path:
+            return False
+        try:
+            with self._lock:
+                entries = [[digest, query, entry] for (digest, query), entry in self._entries.items()]
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(temp_path, self.path)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving answer cache: {str(e)}")
+            return False
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                for digest, query, entry in json.load(f)[-self.max_entries:]:
+                    self._entries[(digest, query)] = entry
+            logger.info(f"Loaded {len(self._entries)} cached answers from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading answer cache: {str(e)}")
+            self._entries.clear()
+
+    def _vector(self, key: Tuple[str, str], query: str, embed: Callable[[str], Optional[np.ndarray]],
+                namespace: str) -> Optional[np.ndarray]:
+        # Vectors are not persisted, and go stale when the embedding model changes
+        cached = self._vectors.get(key)
+        if cached is not None and cached[0] == namespace:
+            return cached[1]
+        vector = embed(query)
+        if vector is not None:
+            with self._lock:
+                if key in self._entries:
+                    self._vectors[key] = (namespace, vector)
+        return vector
+
+    def _drop(self, key: Tuple[str, str]):
+        self._entries.pop(key, None)
+        self._vectors.pop(key, None)
@@ -0,0 +1,181 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/changes.py
+"""
+app/core/changes.py
+In-process broker of domain store change events, with replay from a revision.
+"""
+
+import json
+import time
+import uuid
+import threading
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.domain_model import DomainStore
+from app.core import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHANGE_EVENTS = metrics.registry.counter(
+    'change_events_total', 'Change events published by domain stores')
+CHANGE_SUBSCRIBERS = metrics.registry.gauge(
+    'change_subscribers', 'Open change feed streams')
+
+
+class ChangeBroker:
+    """
+    Keeps the most recent change events of one domain store and wakes up
+    the clients waiting for new ones.
+
+    Events carry the store revision they were made at. Clients resume with
+    a cursor "<epoch>:<revision>"; the epoch identifies this broker, so a
+    cursor from before a restart or an eviction is recognized as unusable,
+    as is one older than the buffered events. Such clients get a reset and
+    reload what they show.
+    """
+
+    def __init__(self, store: DomainStore, capacity: int = 1024):
+        """
+        Initialize the broker and subscribe it to a store.
+
+        Args:
+            store: Domain store whose mutations are published
+            capacity: Number of recent events kept for replay
+        """
+        self.store = store
+        self.epoch = uuid.uuid4().hex[:12]
+        self._events: deque = deque(maxlen=capacity)
+        # Revision of the newest event dropped from the buffer
+        self._dropped = store.revision
+        self._condition = threading.Condition()
+        self._closed = False
+        store.add_listener(self.publish)
+
+    def memory_usage(self) -> int:
+        """Approximate memory held by the buffered events, in bytes."""
+        return len(self._events) * 600
+
+    @property
+    def revision(self) -> int:
+        """Revision of the newest event, or of the store when none was published."""
+        with self._condition:
+            return self._events[-1]["revision"] if self._events else self._dropped
+
+    def cursor(self, revision: Optional[int] = None) -> str:
+        """Format a resume cursor."""
+        return f"{self.epoch}:{self.revision if revision is None else revision}"
+
+    def publish(self, event: Dict[str, Any]):
+        """Add an event and wake up waiting clients."""
+        with self._condition:
+            if len(self._events) == self._events.maxlen:
+                self._dropped = self._events[0]["revision"]
+            self._events.append(event)
+            self._condition.notify_all()
+        CHANGE_EVENTS.inc()
+
+    def since(self, cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Get the events after a cursor.
+
+        Args:
+            cursor: "<epoch>:<revision>" from an earlier event or response, a
+                bare revision, or None for no replay
+
+        Returns:
+            Tuple of (events, reset). reset is True when the cursor cannot be
+            resumed; the events are then empty.
+        """
+        if cursor is None or cursor == '':
+            return [], False
+        revision = self.parse_cursor(cursor)
+        with self._condition:
+            if revision is None or revision < self._dropped or revision > self._newest():
+                return [], True
+            return [event for event in self._events if event["revision"] > revision], False
+
+    def wait(self, revision: int, timeout: float) -> List[Dict[str, Any]]:
+        """
+        Block until events newer than a revision exist, or the timeout passes.
+
+        Args:
+            revision: Revision the client has seen
+            timeout: Seconds to wait
+
+        Returns:
+            The newer events (empty on timeout or close)
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._closed or self._newest() > revision, timeout)
+            if self._closed:
+                return []
+            return [event for event in self._events if event["revision"] > revision]
+
+    def stream(self, cursor: Optional[str], heartbeat: float = 15.0, duration: float = 300.0):
+        """
+        Generate a server-sent events stream.
+
+        The stream replays the events after the cursor, then sends new ones
+        as they are published, with a comment line every heartbeat seconds
+        to keep proxies from closing it. It ends after `duration` seconds;
+        EventSource clients reconnect with the last event id and resume.
+
+        Args:
+            cursor: Resume cursor (e.g. the Last-Event-ID header)
+            heartbeat: Seconds between keep-alive comments
+            duration: Seconds before the stream is closed
+
+        Yields:
+            SSE-formatted strings
+        """
+        events, reset = self.since(cursor)
+        revision = self.revision if reset or not cursor else self.parse_cursor(cursor)
+        if events:
+            revision = events[-1]["revision"]
+        # Tell the client how long to wait before reconnecting
+        yield "retry: 2000\n\n"
+        yield self._format({"type": "reset" if reset else "hello", "revision": revision})
+        for event in events:
+            yield self._format(event)
+
+        CHANGE_SUBSCRIBERS.inc()
+        try:
+            deadline = time.monotonic() + duration
+            while not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                events = self.wait(revision, min(heartbeat, remaining))
+                if not events:
+                    yield ": keep-alive\n\n"
+                    continue
+                for event in events:
+                    yield self._format(event)
+                revision = events[-1]["revision"]
+        finally:
+            CHANGE_SUBSCRIBERS.dec()
+
+    def close(self):
+        """Stop publishing and end open streams."""
+        self.store.remove_listener(self.publish)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _newest(self) -> int:
+        return self._events[-1]["revision"] if self._events else self._dropped
+
+    def parse_cursor(self, cursor: str) -> Optional[int]:
+        """Get the revision of a cursor, or None if it belongs to another epoch or is malformed."""
+        epoch, _, revision = str(cursor).rpartition(':')
+        if epoch and epoch != self.epoch:
+            return None
+        try:
+            return int(revision)
+        except ValueError:
+            return None
+
+    def _format(self, event: Dict[str, Any]) -> str:
+        return f"id: {self.cursor(event['revision'])}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
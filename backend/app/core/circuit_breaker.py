@@ -0,0 +1,90 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/circuit_breaker.py
+"""
+app/core/circuit_breaker.py
+Stops calling a failing dependency for a while after consecutive failures.
+"""
+
+import time
+import logging
+import threading
+from app.core import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CIRCUIT_OPEN = metrics.registry.gauge(
+    'circuit_breaker_open', 'Whether calls to a dependency are currently skipped', ['name'])
+CIRCUIT_SKIPPED = metrics.registry.counter(
+    'circuit_breaker_skipped_total', 'Calls skipped because a circuit was open', ['name'])
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failures of a dependency and, past a threshold,
+    skips calls to it for a cooldown period. Once the cooldown has passed,
+    a single trial call is let through: success closes the circuit, and
+    failure opens it for another cooldown.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 30.0):
+        """
+        Initialize the breaker.
+
+        Args:
+            name: Dependency name, used in logs and metrics
+            failure_threshold: Consecutive failures that open the circuit (0 disables it)
+            cooldown: Seconds calls are skipped once the circuit is open
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently being skipped."""
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """
+        Decide whether a call may be made now.
+
+        Returns:
+            True if the circuit is closed, or if this call is the trial once
+            the cooldown has passed; the caller must then report the outcome
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self._opened_at >= self.cooldown:
+                self._trial = True
+                return True
+        CIRCUIT_SKIPPED.inc(name=self.name)
+        return False
+
+    def record_success(self):
+        """Report a successful call, closing the circuit."""
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"{self.name} responds again; resuming calls")
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+        CIRCUIT_OPEN.set(0, name=self.name)
+
+    def record_failure(self):
+        """Report a failed call, opening the circuit past the threshold."""
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is None and (not self.failure_threshold or self._failures < self.failure_threshold):
+                return
+            if self._opened_at is None:
+                logger.warning(f"{self.name} failed {self._failures} times in a row; "
+                               f"skipping calls for {self.cooldown:.0f}s")
+            self._opened_at = time.monotonic()
+            self._trial = False
+        CIRCUIT_OPEN.set(1, name=self.name)
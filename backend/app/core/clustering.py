@@ -0,0 +1,342 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/clustering.py
+"""
+app/core/clustering.py
+K-means grouping of sibling domains to keep every level under a target fan-out.
+"""
+
+import re
+import math
+import logging
+import numpy as np
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from app.core.domain_model import DomainStore
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Domain field marking intermediate domains created by the organizer
+AUTO_GROUP_FIELD = 'autoGroup'
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from in into is it its of on or that the their this to with
+about over under between within without via per vs
+""".split())
+
+# A plan node is an item index, or a list of nodes forming one group
+PlanNode = Union[int, List[Any]]
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = 50, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster vectors with k-means++ initialization and Lloyd iterations.
+
+    Args:
+        vectors: n x d matrix
+        k: Number of clusters (capped at n)
+        iterations: Maximum number of Lloyd iterations
+        seed: Random seed, so the same input always gives the same clusters
+
+    Returns:
+        Tuple of (cluster label per row, k x d centroids)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+    squared_norms = np.einsum('ij,ij->i', vectors, vectors)
+
+    # k-means++: each next centroid is drawn proportionally to its squared distance
+    centroids = np.empty((k, vectors.shape[1]), dtype=np.float32)
+    centroids[0] = vectors[rng.integers(n)]
+    closest = np.maximum(squared_norms - 2 * vectors @ centroids[0] + centroids[0] @ centroids[0], 0)
+    for c in range(1, k):
+        total = float(closest.sum())
+        choice = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centroids[c] = vectors[choice]
+        distance = np.maximum(squared_norms - 2 * vectors @ centroids[c] + centroids[c] @ centroids[c], 0)
+        np.minimum(closest, distance, out=closest)
+
+    labels = np.full(n, -1, dtype=np.int64)
+    for _ in range(iterations):
+        distances = (squared_norms[:, None] - 2 * vectors @ centroids.T
+                     + np.einsum('ij,ij->i', centroids, centroids)[None, :])
+        new_labels = np.argmin(distances, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+
+        # Re-seed empty clusters with the points furthest from their centroid
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            spread = distances[np.arange(n), labels]
+            for c, row in zip(empty, np.argsort(spread)[::-1]):
+                centroids[c] = vectors[row]
+
+    return labels, centroids
+
+
+def partition(vectors: np.ndarray, indices: np.ndarray, max_size: int, seed: int = 0) -> List[np.ndarray]:
+    """
+    Split rows into clusters of at most max_size rows.
+
+    Clusters that k-means leaves too large are split again; rows k-means
+    cannot separate (e.g. identical vectors) are cut into consecutive chunks.
+
+    Args:
+        vectors: n x d matrix
+        indices: Rows of vectors to split
+        max_size: Maximum rows per cluster
+        seed: Random seed
+
+    Returns:
+        List of index arrays
+    """
+    if len(indices) <= max_size:
+        return [indices]
+
+    labels, _ = kmeans(vectors[indices], math.ceil(len(indices) / max_size), seed=seed)
+    clusters = []
+    for label in np.unique(labels):
+        members = indices[labels == label]
+        if len(members) == len(indices):
+            clusters.extend(indices[start:start + max_size] for start in range(0, len(indices), max_size))
+            break
+        clusters.extend(partition(vectors, members, max_size, seed))
+    return clusters
+
+
+def plan_groups(vectors: np.ndarray, max_fanout: int, top_fanout: Optional[int] = None) -> List[PlanNode]:
+    """
+    Plan a grouping of items so that no group, and the top level, exceeds the fan-out.
+
+    Args:
+        vectors: Unit-length item embeddings (n x d)
+        max_fanout: Maximum children of any group
+        top_fanout: Maximum nodes left at the top level (defaults to max_fanout)
+
+    Returns:
+        Top-level nodes: item indices left in place and (nested) groups
+    """
+    top_fanout = max(2, top_fanout or max_fanout)
+    nodes: List[PlanNode] = list(range(len(vectors)))
+    node_vectors = np.asarray(vectors, dtype=np.float32)
+
+    while len(nodes) > top_fanout:
+        clusters = partition(node_vectors, np.arange(len(nodes)), max_fanout)
+        if len(clusters) >= len(nodes):
+            # k-means made no progress; fall back to consecutive chunks
+            clusters = [np.arange(start, min(start + max_fanout, len(nodes)))
+                        for start in range(0, len(nodes), max_fanout)]
+
+        grouped = []
+        grouped_vectors = np.zeros((len(clusters), node_vectors.shape[1]), dtype=np.float32)
+        for position, members in enumerate(clusters):
+            grouped.append(nodes[members[0]] if len(members) == 1 else [nodes[i] for i in members])
+            centroid = node_vectors[members].mean(axis=0)
+            norm = np.linalg.norm(centroid)
+            grouped_vectors[position] = centroid / norm if norm > 0 else centroid
+        nodes, node_vectors = grouped, grouped_vectors
+
+    return nodes
+
+
+def label_group(names: Sequence[str], document_frequency: Counter, total: int) -> str:
+    """
+    Name a group after the words that best distinguish its members.
+
+    Args:
+        names: Member names (and descriptions)
+        document_frequency: Number of level items containing each word
+        total: Number of items at the level
+
+    Returns:
+        Group name, e.g. "Neural & Networks"
+    """
+    counts = Counter(word for name in names for word in set(_words(name)))
+    scored = sorted(
+        counts.items(),
+        key=lambda item: (-item[1] * math.log((1 + total) / (1 + document_frequency[item[0]])), item[0])
+    )
+    words = [word.capitalize() for word, count in scored[:2] if count > 1 or len(names) <= 2]
+    return " & ".join(words) if words else names[0][:60]
+
+
+def _words(text: str) -> List[str]:
+    return [word for word in re.findall(r'[a-z0-9]+', text.lower())
+            if len(word) > 2 and word not in STOPWORDS]
+
+
+class LevelOrganizer:
+    """
+    Keeps levels of the domain tree under a target fan-out by inserting
+    intermediate "auto group" domains that gather semantically close siblings.
+    """
+
+    def __init__(self, store: DomainStore, processor, max_fanout: int = 12):
+        """
+        Initialize the organizer.
+
+        Args:
+            store: Domain store to read and reorganize
+            processor: Semantic processor providing item embeddings
+            max_fanout: Target maximum number of children per level
+        """
+        if max_fanout < 2:
+            raise ValueError("max_fanout must be at least 2")
+        self.store = store
+        self.processor = processor
+        self.max_fanout = max_fanout
+
+    def propose(self, parent_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Propose groups for a level without changing it.
+
+        Existing auto groups stay in place; only the other domains are grouped.
+
+        Args:
+            parent_id: Parent domain ID or None for root level
+
+        Returns:
+            Proposal with nested groups of domain IDs
+        """
+        siblings = self.store.get_domains(parent_id)
+        existing = [domain for domain in siblings if domain.get(AUTO_GROUP_FIELD)]
+        loose = [domain for domain in siblings if not domain.get(AUTO_GROUP_FIELD)]
+
+        groups = []
+        after = len(siblings)
+        if len(siblings) > self.max_fanout and len(loose) > 1:
+            vectors = self.processor.get_item_embeddings(loose)
+            plan = plan_groups(vectors, self.max_fanout, self.max_fanout - len(existing))
+            frequency = Counter(word for domain in loose for word in set(_words(self._text(domain))))
+            taken = {domain["name"].lower() for domain in siblings}
+            groups = [self._describe(node, loose, frequency, taken)
+                      for node in plan if isinstance(node, list)]
+            after = len(existing) + len(plan)
+
+        return {
+            "parentId": parent_id,
+            "maxFanout": self.max_fanout,
+            "before": len(siblings),
+            "after": after,
+            "groups": groups,
+            "applied": False
+        }
+
+    def apply(self, parent_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Group a level by creating auto group domains and moving domains into them.
+
+        Args:
+            parent_id: Parent domain ID or None for root level
+
+        Returns:
+            The applied proposal, with the IDs of the created groups
+        """
+        proposal = self.propose(parent_id)
+        with self.store.batch():
+            for group in proposal["groups"]:
+                self._create_group(group, parent_id)
+        proposal["applied"] = bool(proposal["groups"])
+        if proposal["applied"]:
+            logger.info(f"Grouped level {parent_id} from {proposal['before']} to {proposal['after']} domains")
+        return proposal
+
+    def place_new_domain(self, domain_id: str) -> Optional[str]:
+        """
+        Keep a level under the fan-out after a domain was added to it.
+
+        The domain joins the closest auto group that has room; when none does,
+        the level's ungrouped domains are grouped again.
+
+        Args:
+            domain_id: ID of the newly added domain
+
+        Returns:
+            ID of the group the domain was moved into, or None if it stayed
+        """
+        domain = self.store.get_domain(domain_id)
+        if domain is None:
+            return None
+        parent_id = domain.get("parentId")
+        siblings = self.store.get_domains(parent_id)
+        if len(siblings) <= self.max_fanout:
+            return None
+
+        candidates = []
+        for group in siblings:
+            if not group.get(AUTO_GROUP_FIELD):
+                continue
+            members = self.store.get_domains(group["id"])
+            names = {member["name"].lower() for member in members}
+            if members and len(members) < self.max_fanout and domain["name"].lower() not in names:
+                candidates.append((group["id"], members))
+
+        if candidates:
+            vector = self.processor.get_item_embeddings([domain])[0]
+            scores = []
+            for _, members in candidates:
+                centroid = self.processor.get_item_embeddings(members).mean(axis=0)
+                norm = np.linalg.norm(centroid)
+                scores.append(float(vector @ centroid / norm) if norm > 0 else -1.0)
+            group_id = candidates[int(np.argmax(scores))][0]
+            if self.store.move_domain(domain_id, group_id):
+                return group_id
+
+        self.apply(parent_id)
+        moved = self.store.get_domain(domain_id)
+        return moved["parentId"] if moved and moved["parentId"] != parent_id else None
+
+    def _describe(self, node: List[PlanNode], items: List[Dict[str, Any]], frequency: Counter,
+                  taken: set) -> Dict[str, Any]:
+        """Turn a plan node into a named proposal group."""
+        child_taken = set()
+        subgroups = [self._describe(child, items, frequency, child_taken)
+                     for child in node if isinstance(child, list)]
+        domain_ids = [items[child]["id"] for child in node if not isinstance(child, list)]
+        names = [self._text(items[index]) for index in self._leaves(node)]
+
+        name = base = label_group(names, frequency, len(items))
+        suffix = 2
+        while name.lower() in taken:
+            name = f"{base} ({suffix})"
+            suffix += 1
+        taken.add(name.lower())
+        return {"name": name, "domainIds": domain_ids, "groups": subgroups}
+
+    def _create_group(self, group: Dict[str, Any], parent_id: Optional[str]):
+        """Create a proposed group (recursively) and move its domains into it."""
+        size = len(group["domainIds"]) + len(group["groups"])
+        created = self.store.add_domain(
+            group["name"], parent_id,
+            description=f"Automatically grouped {size} related domains",
+            metadata={AUTO_GROUP_FIELD: True}
+        )
+        if created is None:
+            logger.error(f"Could not create group '{group['name']}'")
+            return
+        group["id"] = created["id"]
+        for subgroup in group["groups"]:
+            self._create_group(subgroup, created["id"])
+        for domain_id in group["domainIds"]:
+            self.store.move_domain(domain_id, created["id"])
+
+    @staticmethod
+    def _leaves(node: PlanNode) -> List[int]:
+        if not isinstance(node, list):
+            return [node]
+        return [leaf for child in node for leaf in LevelOrganizer._leaves(child)]
+
+    @staticmethod
+    def _text(domain: Dict[str, Any]) -> str:
+        if domain.get("description"):
+            return f"{domain['name']} {domain['description']}"
+        return domain["name"]
@@ -5,117 +5,655 @@ Models for knowledge domains and documents.
 """
 
 import os
+import sys
 import json
 import uuid
+import atexit
 import logging
-from typing import List, Dict, Optional, Any, Union
+import threading
+import functools
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Any, Iterator, Tuple, Callable
+from app.core.pagination import SortedViews, paginate
+from app.core import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+STORE_SAVE_LATENCY = metrics.registry.histogram(
+    'domain_store_save_duration_seconds', 'Time to persist the domain store')
+STORE_SAVE_BYTES = metrics.registry.histogram(
+    'domain_store_save_bytes', 'Size of the persisted domain store', buckets=metrics.SIZE_BUCKETS)
+POSITION_UPDATES = metrics.registry.counter(
+    'domain_store_position_updates_total', 'Domain position updates received')
+POSITION_FLUSHES = metrics.registry.counter(
+    'domain_store_position_flushes_total', 'Saves that persisted buffered position updates')
+
+# Approximate resident size of one record including its strings and index
+# entries, used to estimate a store's memory footprint
+DOMAIN_RECORD_BYTES = 700
+DOCUMENT_RECORD_BYTES = 650
+
+# JSON keys with a dedicated record slot; any others are kept in `extra`
+DOCUMENT_FIELDS = frozenset(["id", "name", "path", "type", "dateAdded", "description"])
+DOMAIN_FIELDS = frozenset(["id", "name", "description", "parentId", "children", "documents", "x", "y"])
+
+
+def _synchronized(method):
+    """Run a DomainStore method while holding the store lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _mutation(method):
+    """Run a DomainStore mutation while holding the store lock and advance the revision."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            self.revision += 1
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class Document:
+    """
+    A document attached to a domain.
+    Fields the store does not know about are kept in `extra` so they survive a round trip.
+    """
+    
+    __slots__ = ('id', 'name', 'path', 'type', 'date_added', 'description', 'domain_id', 'extra')
+    
+    def __init__(self, id: str, name: str, path: str = "", type: str = "application/pdf",
+                 date_added: str = "", description: str = "", domain_id: Optional[str] = None,
+                 extra: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.name = name
+        self.path = path
+        self.type = type
+        self.date_added = date_added
+        self.description = description
+        self.domain_id = domain_id
+        self.extra = extra or None
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], domain_id: Optional[str] = None) -> 'Document':
+        """
+        Build a document from its JSON representation.
+        
+        Args:
+            data: Document object as stored in domains.json
+            domain_id: ID of the owning domain
+        
+        Returns:
+            Document record
+        """
+        extra = None
+        if not DOCUMENT_FIELDS.issuperset(data):
+            extra = {key: value for key, value in data.items() if key not in DOCUMENT_FIELDS}
+        return cls(
+            id=data.get("id") or str(uuid.uuid4()),
+            name=data.get("name", "Untitled Document"),
+            path=data.get("path", ""),
+            type=data.get("type", "application/pdf"),
+            date_added=data.get("dateAdded", ""),
+            description=data.get("description", ""),
+            domain_id=domain_id,
+            extra=extra
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the JSON representation returned by the API."""
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "path": self.path,
+            "type": self.type,
+            "dateAdded": self.date_added,
+            "description": self.description
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+class Domain:
+    """
+    A knowledge domain.
+    Children are an ordered set (dict keys) and documents an ordered id -> Document map,
+    so membership tests and removals do not scan lists. `ancestors` is the
+    materialized path of ids from the root down to the parent; it is derived
+    from parentId and maintained by the store, never serialized.
+    """
+    
+    __slots__ = ('id', 'name', 'description', 'parent_id', 'children', 'documents', 'x', 'y', 'extra',
+                 'ancestors')
+    
+    def __init__(self, id: str, name: str, description: str = "", parent_id: Optional[str] = None,
+                 x: float = 0, y: float = 0, extra: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.parent_id = parent_id
+        self.children: Dict[str, None] = {}
+        self.documents: Dict[str, Document] = {}
+        self.ancestors: Tuple[str, ...] = ()
+        self.x = x
+        self.y = y
+        self.extra = extra or None
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Domain':
+        """
+        Build a domain and its documents from its JSON representation.
+        
+        Args:
+            data: Domain object as stored in domains.json
+        
+        Returns:
+            Domain record
+        """
+        extra = None
+        if not DOMAIN_FIELDS.issuperset(data):
+            extra = {key: value for key, value in data.items() if key not in DOMAIN_FIELDS}
+        parent_id = data.get("parentId")
+        # Ids repeat across the tree (keys, parentId, children); intern them so each is stored once
+        domain = cls(
+            id=sys.intern(data["id"]),
+            name=data.get("name", ""),
+            description=data.get("description", ""),
+            parent_id=sys.intern(parent_id) if parent_id is not None else None,
+            x=data.get("x", 0),
+            y=data.get("y", 0),
+            extra=extra
+        )
+        children = data.get("children")
+        if children:
+            domain.children = dict.fromkeys(map(sys.intern, children))
+        for document_data in data.get("documents") or []:
+            document = Document.from_dict(document_data, domain.id)
+            domain.documents[document.id] = document
+        return domain
+    
+    def to_dict(self, include_documents: bool = True) -> Dict[str, Any]:
+        """
+        Get the JSON representation returned by the API.
+        
+        Args:
+            include_documents: Whether to list the documents (otherwise the
+                list is empty, for callers that page through them)
+        """
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "parentId": self.parent_id,
+            "children": list(self.children),
+            "documents": [document.to_dict() for document in self.documents.values()] if include_documents else [],
+            "x": self.x,
+            "y": self.y
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
 class DomainStore:
     """
     Stores and manages knowledge domains and documents.
     Uses a JSON file-based storage system.
     """
     
-    def __init__(self, storage_dir: str):
+    def __init__(self, storage_dir: str, flush_interval: Optional[float] = None,
+                 flush_threshold: Optional[int] = None):
         """
         Initialize the domain store.
         
         Args:
             storage_dir: Directory for data storage
+            flush_interval: Seconds position updates stay buffered before they
+                are saved (0 saves every update); defaults to POSITION_FLUSH_INTERVAL
+            flush_threshold: Number of buffered domains that triggers an
+                immediate save; defaults to POSITION_FLUSH_THRESHOLD
         """
         self.storage_dir = storage_dir
         self.data_file = os.path.join(storage_dir, 'domains.json')
-        self.domains = self._load_data()
+        self.domains: Dict[str, Domain] = {}
+        self.root_domains: Dict[str, None] = {}
+        # document_id -> Document; the owning domain is document.domain_id
+        self.document_index: Dict[str, Document] = {}
+        # document path -> ids of the documents attached from it, in attach order
+        self.path_index: Dict[str, Dict[str, None]] = {}
+        # Saves requested inside batch() are deferred to the end of the batch
+        self._batch_depth = 0
+        self._batch_dirty = False
+        # Mutations and saves hold the lock, so the flush timer never
+        # snapshots a half-applied change
+        self._lock = threading.RLock()
+        # Advanced by every mutation, so derived data can tell it is out of date
+        self.revision = 0
+        # Callbacks receiving a change event after each successful mutation
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        # Sorted views of levels and document lists, kept current from the change events
+        self.views = SortedViews(self)
+        # Positions applied to the records but not yet saved, by domain id
+        self.flush_interval = float(os.getenv('POSITION_FLUSH_INTERVAL', 2.0)
+                                    if flush_interval is None else flush_interval)
+        self.flush_threshold = int(os.getenv('POSITION_FLUSH_THRESHOLD', 1000)
+                                   if flush_threshold is None else flush_threshold)
+        self._pending_positions: Dict[str, Tuple[Any, Any]] = {}
+        self._flush_timer: Optional[threading.Timer] = None
+        self._load_data()
+        if self.flush_interval > 0:
+            atexit.register(self.flush_positions)
     
-    def _load_data(self) -> Dict[str, Any]:
+    def _load_data(self):
         """
-        Load domain data from storage.
-        
-        Returns:
-            Domain data structure
+        Load domain data from storage into records and rebuild the document index.
         """
+        self.domains = {}
+        self.root_domains = {}
+        self.document_index = {}
+        self.path_index = {}
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    return json.load(f)
-            else:
-                # Initialize with empty structure
-                return {
-                    "domains": {},
-                    "rootDomains": []
-                }
+            if not os.path.exists(self.data_file):
+                return
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+            
+            for domain_id, domain_data in data.get("domains", {}).items():
+                domain_data.setdefault("id", domain_id)
+                domain = Domain.from_dict(domain_data)
+                self.domains[domain.id] = domain
+                self.document_index.update(domain.documents)
+                for document in domain.documents.values():
+                    self._index_path(document)
+            self.root_domains = dict.fromkeys(map(sys.intern, data.get("rootDomains", [])))
+            self._index_ancestors()
         except Exception as e:
             logger.error(f"Error loading domain data: {str(e)}")
-            return {
-                "domains": {},
-                "rootDomains": []
-            }
+            self.domains = {}
+            self.root_domains = {}
+            self.document_index = {}
+            self.path_index = {}
+    
+    def memory_usage(self) -> int:
+        """
+        Estimate the memory held by the loaded records, in bytes.
+        
+        Returns:
+            Approximate size of all domain and document records
+        """
+        return (len(self.domains) * DOMAIN_RECORD_BYTES + len(self.document_index) * DOCUMENT_RECORD_BYTES
+                + self.views.memory_usage())
+    
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """
+        Register a callback for change events.
+        
+        Every successful mutation calls it, under the store lock and in
+        mutation order, with a dict holding the store revision, the event
+        type (domain.created, domain.updated, domain.moved, domain.merged,
+        domain.deleted, domain.positions, document.attached or
+        document.detached) and a compact payload.
+        
+        Args:
+            listener: Callback taking the event
+        """
+        self._listeners.append(listener)
+    
+    def remove_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Unregister a change event callback."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _emit(self, event_type: str, **payload):
+        """Update the sorted views and send a change event to the listeners."""
+        event = {"revision": self.revision, "type": event_type, **payload}
+        self.views.apply(event)
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Error in change listener: {str(e)}")
     
+    def _index_path(self, document: Document):
+        """Add a document to the path index."""
+        self.path_index.setdefault(document.path, {})[document.id] = None
+    
+    def _unindex_path(self, document: Document):
+        """Drop a document from the path index."""
+        ids = self.path_index.get(document.path)
+        if ids is not None:
+            ids.pop(document.id, None)
+            if not ids:
+                del self.path_index[document.path]
+    
+    def _index_ancestors(self):
+        """Materialize every domain's ancestor path from the parentId pointers."""
+        resolved = set()
+        for domain in self.domains.values():
+            # Walk up to the first domain whose path is known, then fill in downwards
+            chain = []
+            seen = set()
+            current = domain
+            while current is not None and current.id not in resolved and current.id not in seen:
+                chain.append(current)
+                seen.add(current.id)
+                current = self.domains.get(current.parent_id) if current.parent_id is not None else None
+            path = current.ancestors + (current.id,) if current is not None and current.id in resolved else ()
+            for record in reversed(chain):
+                record.ancestors = path
+                resolved.add(record.id)
+                path = path + (record.id,)
+    
+    def _reindex_subtree(self, domain: Domain):
+        """Recompute ancestor paths below a domain whose own path changed."""
+        stack = [domain]
+        while stack:
+            current = stack.pop()
+            path = current.ancestors + (current.id,)
+            for child_id in current.children:
+                child = self.domains.get(child_id)
+                if child is not None:
+                    child.ancestors = path
+                    stack.append(child)
+    
+    def _snapshot(self) -> Dict[str, Any]:
+        """Get the domains.json representation of the store."""
+        return {
+            "domains": {domain_id: domain.to_dict() for domain_id, domain in self.domains.items()},
+            "rootDomains": list(self.root_domains)
+        }
+    
+    @contextmanager
+    def batch(self):
+        """
+        Group several mutations into a single save.
+        
+        Mutations inside the block report success without writing; the store
+        is saved once when the outermost batch exits.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._batch_dirty:
+                self._batch_dirty = False
+                self._save_data()
+    
+    @_synchronized
     def _save_data(self) -> bool:
         """
-        Save domain data to storage.
+        Save domain data to storage, including any buffered positions.
         
         Returns:
             Success status
         """
+        if self._batch_depth > 0:
+            self._batch_dirty = True
+            return True
         try:
             os.makedirs(self.storage_dir, exist_ok=True)
-            with open(self.data_file, 'w') as f:
-                json.dump(self.domains, f, indent=2)
+            with STORE_SAVE_LATENCY.time(span="save"):
+                with open(self.data_file, 'w') as f:
+                    json.dump(self._snapshot(), f, indent=2)
+                    size = f.tell()
+            STORE_SAVE_BYTES.observe(size)
+            if self._pending_positions:
+                POSITION_FLUSHES.inc()
+                self._pending_positions.clear()
             return True
         except Exception as e:
             logger.error(f"Error saving domain data: {str(e)}")
             return False
     
+    def _child_ids(self, parent_id: Optional[str]) -> Dict[str, None]:
+        """Get the ordered child id set of a level."""
+        if parent_id is None:
+            return self.root_domains
+        parent = self.domains.get(parent_id)
+        return parent.children if parent is not None else {}
+    
+    def _name_taken(self, sibling_ids: Dict[str, None], name: str) -> bool:
+        """Check whether a level already has a domain with this name, ignoring case."""
+        lowered = name.lower()
+        return any(self.domains[sibling_id].name.lower() == lowered
+                   for sibling_id in sibling_ids if sibling_id in self.domains)
+    
     def get_domains(self, parent_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Get domains at a specific level.
         
         Args:
             parent_id: Parent domain ID or None for root level
-            
+        
         Returns:
             List of domain objects
         """
         try:
-            domain_ids = []
-            if parent_id is None:
-                domain_ids = self.domains["rootDomains"]
-            elif parent_id in self.domains["domains"]:
-                domain_ids = self.domains["domains"][parent_id].get("children", [])
-                
             return [
-                self.domains["domains"][domain_id]
-                for domain_id in domain_ids
-                if domain_id in self.domains["domains"]
+                self.domains[domain_id].to_dict()
+                for domain_id in self._child_ids(parent_id)
+                if domain_id in self.domains
             ]
         except Exception as e:
             logger.error(f"Error getting domains: {str(e)}")
             return []
     
-    def get_domain(self, domain_id: str) -> Optional[Dict[str, Any]]:
+    def get_domain(self, domain_id: str, include_documents: bool = True) -> Optional[Dict[str, Any]]:
         """
         Get a single domain by ID.
         
         Args:
             domain_id: Domain ID
-            
+            include_documents: Whether to list the domain's documents
+        
         Returns:
             Domain object or None if not found
         """
         try:
-            if domain_id in self.domains["domains"]:
-                return self.domains["domains"][domain_id]
-            return None
+            domain = self.domains.get(domain_id)
+            return domain.to_dict(include_documents) if domain is not None else None
         except Exception as e:
             logger.error(f"Error getting domain: {str(e)}")
             return None
     
-    def add_domain(self, name: str, parent_id: Optional[str] = None, description: str = "") -> Optional[Dict[str, Any]]:
+    def get_document(self, document_id: str, domain_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get a single document by ID.
+        
+        Args:
+            document_id: Document ID
+            domain_id: Optional domain the document must belong to
+        
+        Returns:
+            Document object or None if not found
+        """
+        document = self.document_index.get(document_id)
+        if document is None or (domain_id is not None and document.domain_id != domain_id):
+            return None
+        return document.to_dict()
+    
+    def find_document_by_path(self, path: str) -> Optional[Document]:
+        """
+        Find the document attached from a file.
+        
+        Args:
+            path: Document path, relative to the upload folder
+        
+        Returns:
+            Document record attached first from the path, or None if there is none
+        """
+        ids = self.path_index.get(path)
+        if not ids:
+            return None
+        return self.document_index.get(next(iter(ids)))
+    
+    @_synchronized
+    def get_domains_page(self, parent_id: Optional[str] = None, order: str = 'name', limit: int = 100,
+                         cursor: Optional[str] = None, descending: bool = False) -> Dict[str, Any]:
+        """
+        Get one page of the domains at a level.
+        
+        Args:
+            parent_id: Parent domain ID or None for root level
+            order: 'name' or 'added' (the order domains joined the level)
+            limit: Page size
+            cursor: nextCursor of the previous page
+            descending: Whether to reverse the order
+        
+        Returns:
+            Dictionary with domains, nextCursor (None on the last page) and total
+        
+        Raises:
+            ValueError: If the cursor is malformed or belongs to another order
+        """
+        view = self.views.level(parent_id, order)
+        keys, next_cursor = paginate(view, order, limit, cursor, descending)
+        domains = [self.domains[key[-1]].to_dict() for key in keys if key[-1] in self.domains]
+        return {"domains": domains, "nextCursor": next_cursor, "total": len(view)}
+    
+    @_synchronized
+    def get_documents_page(self, domain_id: str, order: str = 'dateAdded', limit: int = 100,
+                           cursor: Optional[str] = None, descending: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Get one page of a domain's documents.
+        
+        Args:
+            domain_id: Domain ID
+            order: 'name' or 'dateAdded'
+            limit: Page size
+            cursor: nextCursor of the previous page
+            descending: Whether to reverse the order
+        
+        Returns:
+            Dictionary with documents, nextCursor and total, or None if the domain does not exist
+        
+        Raises:
+            ValueError: If the cursor is malformed or belongs to another order
+        """
+        if domain_id not in self.domains:
+            return None
+        view = self.views.documents(domain_id, order)
+        keys, next_cursor = paginate(view, order, limit, cursor, descending)
+        documents = [self.document_index[key[-1]].to_dict() for key in keys if key[-1] in self.document_index]
+        return {"documents": documents, "nextCursor": next_cursor, "total": len(view)}
+    
+    def level_version(self, parent_id: Optional[str] = None) -> Any:
+        """
+        Get a value that changes whenever a level's domains or their names
+        and descriptions change.
+        
+        Args:
+            parent_id: Parent domain ID or None for root level
+        
+        Returns:
+            Opaque version
+        """
+        return self.views.version(parent_id)
+    
+    def get_child_ids(self, parent_id: Optional[str] = None) -> List[str]:
+        """
+        Get the IDs of the domains at a level.
+        
+        Args:
+            parent_id: Parent domain ID or None for root level
+        
+        Returns:
+            List of domain IDs in display order
+        """
+        return [domain_id for domain_id in self._child_ids(parent_id) if domain_id in self.domains]
+    
+    def get_subtree_ids(self, domain_id: str, include_self: bool = True) -> List[str]:
+        """
+        Get the IDs of a domain's descendants.
+        
+        Args:
+            domain_id: Domain ID
+            include_self: Whether the domain itself is included
+        
+        Returns:
+            List of domain IDs, parents before children
+        """
+        if domain_id not in self.domains:
+            return []
+        ids = []
+        stack = [domain_id]
+        while stack:
+            current = self.domains.get(stack.pop())
+            if current is None:
+                continue
+            ids.append(current.id)
+            stack.extend(reversed(list(current.children)))
+        return ids if include_self else ids[1:]
+    
+    def get_ancestor_ids(self, domain_id: str) -> List[str]:
+        """
+        Get the IDs of a domain's ancestors, root first.
+        
+        Args:
+            domain_id: Domain ID
+        
+        Returns:
+            List of domain IDs, empty for root domains and unknown IDs
+        """
+        domain = self.domains.get(domain_id)
+        return list(domain.ancestors) if domain is not None else []
+    
+    def is_ancestor(self, ancestor_id: str, domain_id: str) -> bool:
+        """
+        Check whether a domain is a proper ancestor of another one.
+        
+        Args:
+            ancestor_id: Possible ancestor ID
+            domain_id: Domain ID
+        
+        Returns:
+            Whether ancestor_id lies on the path from the root to domain_id
+        """
+        domain = self.domains.get(domain_id)
+        return domain is not None and ancestor_id in domain.ancestors
+    
+    def is_in_subtree(self, domain_id: str, root_id: str) -> bool:
+        """
+        Check whether a domain belongs to the subtree rooted at another one.
+        
+        Args:
+            domain_id: Domain ID
+            root_id: Subtree root ID
+        
+        Returns:
+            Whether domain_id is root_id or one of its descendants
+        """
+        if domain_id == root_id:
+            return domain_id in self.domains
+        return self.is_ancestor(root_id, domain_id)
+    
+    def iter_domains(self) -> Iterator[Domain]:
+        """Iterate over every domain record."""
+        return iter(list(self.domains.values()))
+    
+    @_synchronized
+    def hierarchy_snapshot(self) -> Tuple[int, List[str], Dict[str, Tuple[str, Optional[str], Tuple[str, ...], Any, Any, int]]]:
+        """
+        Copy the tree structure and positions in one consistent read.
+        
+        Returns:
+            Tuple of (revision, root domain IDs, domain_id -> (name, parent_id,
+            child IDs, x, y, document count))
+        """
+        records = {
+            domain.id: (domain.name, domain.parent_id, tuple(domain.children), domain.x, domain.y,
+                        len(domain.documents))
+            for domain in self.domains.values()
+        }
+        return self.revision, list(self.root_domains), records
+    
+    @_mutation
+    def add_domain(self, name: str, parent_id: Optional[str] = None, description: str = "",
+                   metadata: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """
         Add a new domain.
         
@@ -123,7 +661,8 @@ class DomainStore:
             name: Domain name
             parent_id: Parent domain ID or None for root level
             description: Optional description
-            
+            metadata: Optional extra fields stored and returned with the domain
+        
         Returns:
             New domain object or None on error
         """
@@ -132,61 +671,43 @@ class DomainStore:
             if not name or not name.strip():
                 logger.error("Cannot add domain with empty name")
                 return None
-                
-            # Check for duplicate names at the same level
-            existing_domains = self.get_domains(parent_id)
-            if any(domain["name"].lower() == name.lower() for domain in existing_domains):
-                logger.error(f"Domain with name '{name}' already exists at this level")
-                return None
-                
+            
             # Check if parent exists if specified
-            if parent_id is not None and parent_id not in self.domains["domains"]:
+            if parent_id is not None and parent_id not in self.domains:
                 logger.error(f"Parent domain with ID {parent_id} does not exist")
                 return None
-                
-            # Create new domain
-            domain_id = str(uuid.uuid4())
-            domain = {
-                "id": domain_id,
-                "name": name,
-                "description": description,
-                "parentId": parent_id,
-                "children": [],
-                "documents": [],
-                "x": 0,  # Initial position, will be set by frontend
-                "y": 0
-            }
             
-            # Start a transaction-like operation
-            original_domains = self.domains.copy()
-            try:
-                # Add to domains dictionary
-                self.domains["domains"][domain_id] = domain
-                
-                # Add to parent's children or root domains
-                if parent_id is None:
-                    self.domains["rootDomains"].append(domain_id)
-                else:
-                    if "children" not in self.domains["domains"][parent_id]:
-                        self.domains["domains"][parent_id]["children"] = []
-                    self.domains["domains"][parent_id]["children"].append(domain_id)
-                
-                # Save changes
-                if not self._save_data():
-                    raise Exception("Failed to save domain data")
-                    
-                return domain
-                
-            except Exception as e:
-                # Transaction failed - restore original data
-                self.domains = original_domains
-                logger.error(f"Transaction failed in add_domain: {str(e)}")
+            # Check for duplicate names at the same level
+            siblings = self._child_ids(parent_id)
+            if self._name_taken(siblings, name):
+                logger.error(f"Domain with name '{name}' already exists at this level")
+                return None
+            
+            # Create new domain; x/y are the initial position, set later by the frontend
+            extra = {key: value for key, value in (metadata or {}).items() if key not in DOMAIN_FIELDS}
+            domain = Domain(str(uuid.uuid4()), name, description, parent_id, extra=extra)
+            if parent_id is not None:
+                domain.ancestors = self.domains[parent_id].ancestors + (parent_id,)
+            
+            # Add to domains and to the parent's children or root domains
+            self.domains[domain.id] = domain
+            siblings[domain.id] = None
+            
+            if not self._save_data():
+                # Undo the insert so memory matches what is on disk
+                del self.domains[domain.id]
+                siblings.pop(domain.id, None)
+                logger.error("Transaction failed in add_domain: Failed to save domain data")
                 return None
-                
+            
+            created = domain.to_dict()
+            self._emit("domain.created", domain=created)
+            return created
         except Exception as e:
             logger.error(f"Error adding domain: {str(e)}")
             return None
     
+    @_mutation
     def update_domain(self, domain_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Update a domain.
@@ -194,67 +715,184 @@ class DomainStore:
         Args:
             domain_id: Domain ID
             updates: Dictionary of updates
-            
+        
         Returns:
             Updated domain object or None on error
         """
         try:
-            if domain_id not in self.domains["domains"]:
+            domain = self.domains.get(domain_id)
+            if domain is None:
                 return None
-                
+            
             # Only update allowed fields
             allowed_fields = ['name', 'description', 'x', 'y']
+            changes = {}
             for field in allowed_fields:
                 if field in updates:
-                    self.domains["domains"][domain_id][field] = updates[field]
+                    setattr(domain, field, updates[field])
+                    changes[field] = updates[field]
             
             self._save_data()
-            return self.domains["domains"][domain_id]
+            self._emit("domain.updated", id=domain_id, parentId=domain.parent_id, changes=changes)
+            return domain.to_dict()
         except Exception as e:
             logger.error(f"Error updating domain: {str(e)}")
             return None
     
+    @_mutation
+    def move_domain(self, domain_id: str, new_parent_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Move a domain, with its subtree, under another parent.
+        
+        Args:
+            domain_id: Domain ID
+            new_parent_id: New parent domain ID or None for root level
+        
+        Returns:
+            Moved domain object or None on error
+        """
+        try:
+            domain = self.domains.get(domain_id)
+            if domain is None:
+                return None
+            if new_parent_id is not None and new_parent_id not in self.domains:
+                logger.error(f"Parent domain with ID {new_parent_id} does not exist")
+                return None
+            if domain.parent_id == new_parent_id:
+                return domain.to_dict()
+            
+            # A domain cannot move into its own subtree
+            if new_parent_id is not None and self.is_in_subtree(new_parent_id, domain_id):
+                logger.error(f"Cannot move domain {domain_id} into its own subtree")
+                return None
+            
+            target = self._child_ids(new_parent_id)
+            if self._name_taken(target, domain.name):
+                logger.error(f"Domain with name '{domain.name}' already exists at the target level")
+                return None
+            
+            old_parent_id = domain.parent_id
+            self._child_ids(old_parent_id).pop(domain_id, None)
+            target[domain_id] = None
+            domain.parent_id = new_parent_id
+            domain.ancestors = (self.domains[new_parent_id].ancestors + (new_parent_id,)
+                                if new_parent_id is not None else ())
+            self._reindex_subtree(domain)
+            
+            self._save_data()
+            moved = domain.to_dict()
+            self._emit("domain.moved", id=domain_id, fromParentId=old_parent_id, toParentId=new_parent_id,
+                       domain=moved)
+            return moved
+        except Exception as e:
+            logger.error(f"Error moving domain: {str(e)}")
+            return None
+    
+    @_mutation
+    def merge_domains(self, source_id: str, target_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Merge a domain into another one.
+        
+        The source's documents and children move to the target; children whose
+        name already exists under the target are merged recursively. The source
+        domain is then removed.
+        
+        Args:
+            source_id: ID of the domain merged away
+            target_id: ID of the domain that remains
+        
+        Returns:
+            Updated target domain object or None on error
+        """
+        try:
+            source = self.domains.get(source_id)
+            target = self.domains.get(target_id)
+            if source is None or target is None or source_id == target_id:
+                return None
+            
+            # The target cannot live inside the source's subtree
+            if self.is_ancestor(source_id, target_id):
+                logger.error(f"Cannot merge domain {source_id} into its descendant {target_id}")
+                return None
+            
+            source_parent_id = source.parent_id
+            with self.batch():
+                self._merge_into(source, target)
+                self._save_data()
+            merged = target.to_dict()
+            self._emit("domain.merged", sourceId=source_id, sourceParentId=source_parent_id,
+                       targetId=target_id, domain=merged)
+            return merged
+        except Exception as e:
+            logger.error(f"Error merging domains: {str(e)}")
+            return None
+    
+    def _merge_into(self, source: Domain, target: Domain):
+        """Move a domain's documents and children into another domain and drop it."""
+        for document in source.documents.values():
+            document.domain_id = target.id
+            target.documents[document.id] = document
+        source.documents = {}
+        
+        names = {self.domains[child_id].name.lower(): child_id
+                 for child_id in target.children if child_id in self.domains}
+        for child_id in list(source.children):
+            child = self.domains.get(child_id)
+            if child is None:
+                continue
+            existing_id = names.get(child.name.lower())
+            if existing_id is not None:
+                self._merge_into(child, self.domains[existing_id])
+            else:
+                target.children[child_id] = None
+                child.parent_id = target.id
+                child.ancestors = target.ancestors + (target.id,)
+                self._reindex_subtree(child)
+                names[child.name.lower()] = child_id
+        
+        self._child_ids(source.parent_id).pop(source.id, None)
+        del self.domains[source.id]
+    
+    @_mutation
     def delete_domain(self, domain_id: str) -> bool:
         """
         Delete a domain and its children.
         
         Args:
             domain_id: Domain ID
-            
+        
         Returns:
             Success status
         """
         try:
-            if domain_id not in self.domains["domains"]:
+            domain = self.domains.get(domain_id)
+            if domain is None:
                 return False
-                
-            # Get domain info before deletion
-            domain = self.domains["domains"][domain_id]
-            parent_id = domain.get("parentId")
-            
-            # Recursively delete all children
-            children = domain.get("children", [])
-            for child_id in children:
-                self.delete_domain(child_id)
             
-            # Remove from parent's children list
-            if parent_id is None:
-                if domain_id in self.domains["rootDomains"]:
-                    self.domains["rootDomains"].remove(domain_id)
-            elif parent_id in self.domains["domains"]:
-                if "children" in self.domains["domains"][parent_id]:
-                    if domain_id in self.domains["domains"][parent_id]["children"]:
-                        self.domains["domains"][parent_id]["children"].remove(domain_id)
+            # Remove from parent's children or root domains
+            self._child_ids(domain.parent_id).pop(domain_id, None)
             
-            # Delete domain
-            del self.domains["domains"][domain_id]
+            # Delete the subtree iteratively, dropping its documents from the index
+            stack = [domain_id]
+            count = 0
+            while stack:
+                removed = self.domains.pop(stack.pop(), None)
+                if removed is None:
+                    continue
+                count += 1
+                for document in removed.documents.values():
+                    self.document_index.pop(document.id, None)
+                    self._unindex_path(document)
+                stack.extend(removed.children)
             
             self._save_data()
+            self._emit("domain.deleted", id=domain_id, parentId=domain.parent_id, removed=count)
             return True
         except Exception as e:
             logger.error(f"Error deleting domain: {str(e)}")
             return False
     
+    @_mutation
     def add_document(self, domain_id: str, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Add a document to a domain.
@@ -262,35 +900,38 @@ class DomainStore:
         Args:
             domain_id: Domain ID
             document: Document object with name, path, etc.
-            
+        
         Returns:
             Updated document object or None on error
         """
         try:
-            if domain_id not in self.domains["domains"]:
+            domain = self.domains.get(domain_id)
+            if domain is None:
                 return None
-                
-            document_id = str(uuid.uuid4())
-            document_obj = {
-                "id": document_id,
-                "name": document.get("name", "Untitled Document"),
-                "path": document.get("path", ""),
-                "type": document.get("type", "application/pdf"),
-                "dateAdded": document.get("dateAdded", ""),
-                "description": document.get("description", "")
-            }
             
-            if "documents" not in self.domains["domains"][domain_id]:
-                self.domains["domains"][domain_id]["documents"] = []
-                
-            self.domains["domains"][domain_id]["documents"].append(document_obj)
+            document_obj = Document(
+                id=str(uuid.uuid4()),
+                name=document.get("name", "Untitled Document"),
+                path=document.get("path", ""),
+                type=document.get("type", "application/pdf"),
+                date_added=document.get("dateAdded", ""),
+                description=document.get("description", ""),
+                domain_id=domain_id
+            )
+            
+            domain.documents[document_obj.id] = document_obj
+            self.document_index[document_obj.id] = document_obj
+            self._index_path(document_obj)
             
             self._save_data()
-            return document_obj
+            attached = document_obj.to_dict()
+            self._emit("document.attached", domainId=domain_id, parentId=domain.parent_id, document=attached)
+            return attached
         except Exception as e:
             logger.error(f"Error adding document: {str(e)}")
             return None
     
+    @_mutation
     def remove_document(self, domain_id: str, document_id: str) -> bool:
         """
         Remove a document from a domain.
@@ -298,28 +939,25 @@ class DomainStore:
         Args:
             domain_id: Domain ID
             document_id: Document ID
-            
+        
         Returns:
             Success status
         """
         try:
-            if domain_id not in self.domains["domains"]:
-                return False
-                
-            if "documents" not in self.domains["domains"][domain_id]:
+            document = self.document_index.get(document_id)
+            if document is None or document.domain_id != domain_id:
                 return False
-                
-            initial_count = len(self.domains["domains"][domain_id]["documents"])
-            self.domains["domains"][domain_id]["documents"] = [
-                doc for doc in self.domains["domains"][domain_id]["documents"]
-                if doc.get("id") != document_id
-            ]
             
-            if len(self.domains["domains"][domain_id]["documents"]) < initial_count:
-                self._save_data()
-                return True
-                
-            return False
+            del self.document_index[document_id]
+            self._unindex_path(document)
+            domain = self.domains.get(domain_id)
+            if domain is not None:
+                domain.documents.pop(document_id, None)
+            
+            self._save_data()
+            self._emit("document.detached", domainId=domain_id,
+                       parentId=domain.parent_id if domain is not None else None, documentId=document_id)
+            return True
         except Exception as e:
             logger.error(f"Error removing document: {str(e)}")
             return False
@@ -330,47 +968,86 @@ class DomainStore:
         
         Args:
             domain_id: Domain ID
-            
+        
         Returns:
             List of domains in the path
         """
         try:
-            path = []
-            current_id = domain_id
+            domain = self.domains.get(domain_id)
+            if domain is None:
+                return []
             
-            while current_id is not None:
-                if current_id not in self.domains["domains"]:
-                    break
-                    
-                domain = self.domains["domains"][current_id]
-                path.insert(0, domain)
-                current_id = domain.get("parentId")
-                
-            return path
+            # The materialized path is already in root-to-parent order
+            return [self.domains[ancestor_id].to_dict() for ancestor_id in domain.ancestors] + [domain.to_dict()]
         except Exception as e:
             logger.error(f"Error getting domain path: {str(e)}")
             return []
     
+    @_mutation
     def update_domain_positions(self, positions: Dict[str, Dict[str, float]]) -> bool:
         """
         Update domain positions.
         
+        The new positions are applied to the records at once, so reads see
+        them immediately, but saving is deferred: updates are coalesced per
+        domain and written together after flush_interval seconds, or as soon
+        as flush_threshold domains are waiting, whichever comes first.
+        
         Args:
             positions: Dictionary of domain_id -> {x, y}
-            
+        
         Returns:
             Success status
         """
         try:
+            applied = {}
             for domain_id, position in positions.items():
-                if domain_id in self.domains["domains"]:
+                domain = self.domains.get(domain_id)
+                if domain is not None:
                     if "x" in position:
-                        self.domains["domains"][domain_id]["x"] = position["x"]
+                        domain.x = position["x"]
                     if "y" in position:
-                        self.domains["domains"][domain_id]["y"] = position["y"]
+                        domain.y = position["y"]
+                    self._pending_positions[domain.id] = (domain.x, domain.y)
+                    applied[domain.id] = {"x": domain.x, "y": domain.y}
+            POSITION_UPDATES.inc(len(positions))
+            if applied:
+                self._emit("domain.positions", positions=applied)
             
-            self._save_data()
+            if self.flush_interval <= 0 or len(self._pending_positions) >= self.flush_threshold:
+                return self.flush_positions()
+            if self._pending_positions and self._flush_timer is None:
+                # The timer starts with the first buffered update and is not
+                # pushed back by later ones, so a long drag still saves regularly
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush_positions)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
             return True
         except Exception as e:
             logger.error(f"Error updating domain positions: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    @_synchronized
+    def flush_positions(self) -> bool:
+        """
+        Save buffered position updates now.
+        
+        Returns:
+            Success status (True when nothing was buffered)
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending_positions:
+            return True
+        return self._save_data()
+    
+    @property
+    def pending_positions(self) -> int:
+        """Number of domains whose position is buffered but not yet saved."""
+        return len(self._pending_positions)
+    
+    def close(self):
+        """Save buffered positions and stop the flush timer."""
+        self.flush_positions()
+        atexit.unregister(self.flush_positions)
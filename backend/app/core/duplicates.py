@@ -0,0 +1,220 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/duplicates.py
+"""
+app/core/duplicates.py
+Near-duplicate detection for new domains and uploaded documents.
+"""
+
+import threading
+import logging
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.domain_model import DomainStore
+from app.core.vector_index import VectorIndex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Where duplicates are looked for, relative to the new item's level
+SCOPES = ('siblings', 'subtree', 'global')
+
+# What happens when a duplicate is found
+POLICIES = ('flag', 'reject', 'off')
+
+
+class DuplicateDetector:
+    """
+    Finds existing domains and documents that are semantically near-identical
+    to new ones, using one vector index of domains and one of documents.
+
+    The indexes are built from the store on first use and kept current by the
+    index calls made when items are created; entries of deleted items are
+    dropped when a search returns them. They are rebuilt when the processor
+    switches to another embedding namespace.
+    """
+
+    def __init__(self, store: DomainStore, processor, threshold: float = 0.92, scope: str = 'siblings'):
+        """
+        Initialize the detector.
+
+        Args:
+            store: Domain store of the knowledge base
+            processor: Semantic processor providing embeddings
+            threshold: Cosine similarity at or above which items are duplicates
+            scope: Default scope, one of SCOPES
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown duplicate scope '{scope}'")
+        self.store = store
+        self.processor = processor
+        self.threshold = threshold
+        self.scope = scope
+        self.domain_index: Optional[VectorIndex] = None
+        self.document_index: Optional[VectorIndex] = None
+        self._namespace: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def memory_usage(self) -> int:
+        """Memory held by the vector indexes, in bytes."""
+        if self.domain_index is None:
+            return 0
+        return self.domain_index.nbytes + self.document_index.nbytes
+
+    def find_domain_duplicates(self, name: str, description: str = "", parent_id: Optional[str] = None,
+                               scope: Optional[str] = None, exclude_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Find domains similar to a prospective domain.
+
+        Args:
+            name: Domain name
+            description: Domain description
+            parent_id: Level the domain is created at
+            scope: 'siblings' (same level), 'subtree' (under the same parent) or 'global'
+            exclude_id: Domain to leave out, e.g. the one being updated
+
+        Returns:
+            Matches with id, name and similarity, most similar first
+        """
+        self._build()
+        vector = self.processor.get_item_embeddings([{"name": name, "description": description}])[0]
+        scope = scope or self.scope
+
+        allowed = None
+        accept = None
+        if scope == 'siblings':
+            allowed = [domain_id for domain_id in self.store.get_child_ids(parent_id) if domain_id != exclude_id]
+        elif scope == 'subtree' and parent_id is not None:
+            # Ancestry checks on the candidates instead of enumerating the subtree
+            accept = lambda domain_id: self.store.is_ancestor(parent_id, domain_id)
+
+        matches = []
+        for domain_id, similarity in self._search(self.domain_index, self.store.domains, vector, allowed, accept):
+            domain = self.store.domains[domain_id]
+            if domain_id == exclude_id:
+                continue
+            matches.append({"id": domain.id, "name": domain.name, "parentId": domain.parent_id,
+                            "similarity": round(similarity, 4)})
+        return matches
+
+    def find_document_duplicates(self, document_path: str, domain_id: str,
+                                 scope: Optional[str] = None) -> Tuple[Optional[np.ndarray], List[Dict[str, Any]]]:
+        """
+        Find documents similar to a newly uploaded document.
+
+        Args:
+            document_path: Path of the uploaded file relative to the upload folder
+            domain_id: Domain the document is added to
+            scope: 'siblings' (same domain), 'subtree' (the domain and its descendants) or 'global'
+
+        Returns:
+            Tuple of (document embedding or None, matches with id, name, domainId and similarity)
+        """
+        self._build()
+        vector = self.processor.get_document_embedding(document_path)
+        if vector is None:
+            return None, []
+        scope = scope or self.scope
+
+        allowed = None
+        accept = None
+        if scope == 'siblings':
+            domain = self.store.domains.get(domain_id)
+            allowed = list(domain.documents) if domain is not None else []
+        elif scope == 'subtree':
+            def accept(document_id):
+                document = self.store.document_index.get(document_id)
+                return document is not None and self.store.is_in_subtree(document.domain_id, domain_id)
+
+        matches = []
+        for document_id, similarity in self._search(self.document_index, self.store.document_index,
+                                                    vector, allowed, accept):
+            document = self.store.document_index[document_id]
+            matches.append({"id": document.id, "name": document.name, "domainId": document.domain_id,
+                            "path": document.path, "similarity": round(similarity, 4)})
+        return vector, matches
+
+    def search_documents(self, vector: np.ndarray, k: int = 10,
+                         allowed: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Find the documents most similar to a vector, e.g. a query embedding.
+
+        Args:
+            vector: Query vector
+            k: Maximum number of documents
+            allowed: Optional document IDs the results are restricted to
+
+        Returns:
+            List of (document_id, similarity), most similar first
+        """
+        self._build()
+        if allowed is not None and not allowed:
+            return []
+        results = []
+        for key, similarity in self.document_index.search(vector, k=k, allowed=allowed):
+            if key in self.store.document_index:
+                results.append((key, similarity))
+            else:
+                self.document_index.remove(key)
+        return results
+
+    def index_domain(self, domain: Dict[str, Any]):
+        """Add or refresh a domain in the index."""
+        if not self._current():
+            return
+        vector = self.processor.get_item_embeddings([domain])[0]
+        self.domain_index.add(domain["id"], vector)
+
+    def index_document(self, document: Dict[str, Any], vector: Optional[np.ndarray] = None):
+        """Add a document to the index, embedding it unless its vector is given."""
+        if not self._current():
+            return
+        if vector is None:
+            vector = self.processor.get_document_embedding(document["path"])
+        if vector is not None and len(vector) == self.document_index.dimension:
+            self.document_index.add(document["id"], vector)
+
+    def _search(self, index: VectorIndex, live: Dict[str, Any], vector: np.ndarray, allowed: Optional[List[str]],
+                accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """Search an index above the threshold, dropping entries of deleted items."""
+        if allowed is not None and not allowed:
+            return []
+        results = []
+        for key, similarity in index.search(vector, k=10, allowed=allowed, min_score=self.threshold, accept=accept):
+            if key in live:
+                results.append((key, similarity))
+            else:
+                index.remove(key)
+        return results
+
+    def _current(self) -> bool:
+        """Whether the indexes are built, from the processor's active embedding namespace."""
+        return self.domain_index is not None and self._namespace == self.processor.embedding_namespace
+
+    def _build(self):
+        """Build the indexes from the store on first use and after a namespace switch."""
+        if self._current():
+            return
+        with self._lock:
+            if self._current():
+                return
+            namespace = self.processor.embedding_namespace
+            domain_index = VectorIndex(self.processor.embedding_dimension)
+            document_index = VectorIndex(self.processor.embedding_dimension)
+
+            domains = [{"id": domain.id, "name": domain.name, "description": domain.description}
+                       for domain in self.store.iter_domains()]
+            if domains:
+                vectors = self.processor.get_item_embeddings(domains)
+                for domain, vector in zip(domains, vectors):
+                    domain_index.add(domain["id"], vector)
+
+            documents = list(self.store.document_index.values())
+            for document in documents:
+                vector = self.processor.get_document_embedding(document.path)
+                if vector is not None:
+                    document_index.add(document.id, vector)
+
+            logger.info(f"Built duplicate indexes of {len(domains)} domains and {len(documents)} documents")
+            self.document_index = document_index
+            self.domain_index = domain_index
+            self._namespace = namespace
@@ -0,0 +1,402 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/embedding_migration.py
+"""
+app/core/embedding_migration.py
+Versioned embedding namespaces and background re-embedding between them.
+"""
+
+import os
+import re
+import json
+import time
+import fcntl
+import threading
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.domain_model import DomainStore
+from app.core.embedding_store import EmbeddingStore
+from app.core import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The namespace embeddings.npz held before namespaces existed
+LEGACY_MODEL = "text-embedding-ada-002"
+LEGACY_DIMENSION = 1536
+
+STATE_FILE = 'embedding_namespace.json'
+LOCK_FILE = 'embedding_migration.lock'
+
+MIGRATED_ITEMS = metrics.registry.counter(
+    'embedding_migration_items_total', 'Items re-embedded into a new embedding namespace')
+
+# Consecutive provider failures after which a migration stops as failed
+MAX_FAILURES = 8
+
+
+def namespace_name(model: str, dimension: int) -> str:
+    """Format a namespace as "<model>@<dimension>"."""
+    return f"{model}@{dimension}"
+
+
+def namespace_file(data_dir: str, model: str, dimension: int) -> str:
+    """
+    Get the file a namespace's embeddings are persisted to.
+
+    Args:
+        data_dir: Data directory of the knowledge base
+        model: Embedding model
+        dimension: Embedding dimension
+
+    Returns:
+        Path of the .npz file
+    """
+    if (model, dimension) == (LEGACY_MODEL, LEGACY_DIMENSION):
+        return os.path.join(data_dir, 'embeddings.npz')
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '-', model)
+    return os.path.join(data_dir, f'embeddings-{slug}-{dimension}.npz')
+
+
+def load_state(data_dir: str) -> Dict[str, Any]:
+    """Read the namespace state of a knowledge base (empty if none was written)."""
+    try:
+        with open(os.path.join(data_dir, STATE_FILE), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.error(f"Error reading embedding namespace state: {str(e)}")
+        return {}
+
+
+def save_state(data_dir: str, state: Dict[str, Any]):
+    """Write the namespace state of a knowledge base, atomically replacing it."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, STATE_FILE)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def resolve_active_namespace(data_dir: str, model: str, dimension: int, persist: bool = True) -> Tuple[str, int]:
+    """
+    Get the namespace a knowledge base reads embeddings from.
+
+    The first time, an existing embeddings.npz makes the legacy namespace
+    active; otherwise the configured model is. The choice is recorded so
+    that later configuration changes only take effect through a migration.
+
+    Args:
+        data_dir: Data directory of the knowledge base
+        model: Configured embedding model
+        dimension: Configured embedding dimension
+        persist: Whether to record the choice
+
+    Returns:
+        Tuple of (model, dimension)
+    """
+    state = load_state(data_dir)
+    active = state.get("active")
+    if active:
+        return active["model"], int(active["dimension"])
+
+    if os.path.exists(namespace_file(data_dir, LEGACY_MODEL, LEGACY_DIMENSION)):
+        model, dimension = LEGACY_MODEL, LEGACY_DIMENSION
+    if persist and os.path.isdir(os.path.dirname(data_dir)):
+        try:
+            state["active"] = {"model": model, "dimension": dimension}
+            save_state(data_dir, state)
+        except Exception as e:
+            logger.error(f"Error recording embedding namespace: {str(e)}")
+    return model, dimension
+
+
+class EmbeddingMigration:
+    """
+    Re-embeds every domain and document of a knowledge base into a new
+    namespace in the background, then makes it the active one.
+
+    Reads keep using the active namespace throughout. Progress and the
+    partially filled target store are checkpointed, so a migration that
+    was running when the process stopped resumes where it left off. When
+    several worker processes share the knowledge base, one of them (the
+    holder of a file lock) migrates and the others pick up the switch from
+    the state file.
+    """
+
+    def __init__(self, store: DomainStore, processor, rate: float = 5.0, checkpoint_every: int = 100):
+        """
+        Initialize the migration service.
+
+        Args:
+            store: Domain store of the knowledge base
+            processor: Semantic processor of the knowledge base
+            rate: Maximum embedding requests per second
+            checkpoint_every: Items embedded between checkpoints
+        """
+        self.store = store
+        self.processor = processor
+        self.rate = rate
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.data_dir = os.path.join(processor.upload_folder, 'data')
+        self._thread: Optional[threading.Thread] = None
+        self._target: Optional[EmbeddingStore] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._state_mtime = self._mtime()
+        self._checked = time.monotonic()
+
+    def memory_usage(self) -> int:
+        """Approximate memory held by the target store while migrating, in bytes."""
+        target = self._target
+        return target.nbytes if target is not None and self.running else 0
+
+    @property
+    def running(self) -> bool:
+        """Whether this process is migrating."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Get the active namespace and the progress of the latest migration.
+
+        Returns:
+            Dictionary with active, target (configured namespace), migration
+            (or None) and running
+        """
+        state = load_state(self.data_dir)
+        migration = state.get("migration")
+        return {
+            "active": namespace_name(self.processor.embedding_model, self.processor.embedding_dimension),
+            "target": namespace_name(self.processor.target_model, self.processor.target_dimension),
+            "migration": migration,
+            "running": self.running or bool(migration and migration.get("status") == "running")
+        }
+
+    def start(self, model: str, dimension: int) -> Dict[str, Any]:
+        """
+        Start (or resume) migrating to a namespace.
+
+        Args:
+            model: Embedding model of the new namespace
+            dimension: Embedding dimension of the new namespace
+
+        Returns:
+            Status after starting
+
+        Raises:
+            ValueError: If the namespace is already active or another migration is running
+        """
+        with self._lock:
+            if (model, dimension) == (self.processor.embedding_model, self.processor.embedding_dimension):
+                raise ValueError(f"{namespace_name(model, dimension)} is already the active namespace")
+            state = load_state(self.data_dir)
+            migration = state.get("migration") or {}
+            target = migration.get("target") or {}
+            same_target = (target.get("model"), target.get("dimension")) == (model, dimension)
+            if self.running or (migration.get("status") == "running" and not same_target):
+                raise ValueError("Another embedding migration is running")
+
+            now = datetime.now().isoformat()
+            if not same_target or migration.get("status") not in ("running", "failed"):
+                migration = {"target": {"model": model, "dimension": dimension}, "startedAt": now,
+                             "done": 0, "total": None}
+            migration.update({"status": "running", "updatedAt": now, "error": None})
+            state["migration"] = migration
+            save_state(self.data_dir, state)
+            self._spawn(model, dimension)
+        return self.status()
+
+    def resume(self):
+        """Resume a migration left running by a previous process, if any."""
+        self.processor.pending_migration = False
+        migration = load_state(self.data_dir).get("migration") or {}
+        if migration.get("status") != "running" or self.running:
+            return
+        target = migration["target"]
+        with self._lock:
+            logger.info(f"Resuming embedding migration to {namespace_name(target['model'], target['dimension'])}")
+            self._spawn(target["model"], int(target["dimension"]))
+
+    def cancel(self) -> Dict[str, Any]:
+        """
+        Stop a running migration and discard its progress.
+
+        Returns:
+            Status after cancelling
+        """
+        self._halt()
+        with self._lock:
+            state = load_state(self.data_dir)
+            migration = state.get("migration")
+            if migration and migration.get("status") in ("running", "failed"):
+                target = migration["target"]
+                path = namespace_file(self.data_dir, target["model"], int(target["dimension"]))
+                if os.path.exists(path) and path != self.processor.embeddings_file:
+                    os.remove(path)
+                migration.update({"status": "cancelled", "updatedAt": datetime.now().isoformat()})
+                save_state(self.data_dir, state)
+        return self.status()
+
+    def sync(self, interval: float = 5.0):
+        """
+        Follow a switch made by another process, checking at most every interval seconds.
+
+        Args:
+            interval: Seconds between checks of the state file
+        """
+        now = time.monotonic()
+        if now - self._checked < interval:
+            return
+        self._checked = now
+        mtime = self._mtime()
+        if mtime == self._state_mtime:
+            return
+        self._state_mtime = mtime
+        active = load_state(self.data_dir).get("active")
+        if not active or self.running:
+            return
+        model, dimension = active["model"], int(active["dimension"])
+        if (model, dimension) != (self.processor.embedding_model, self.processor.embedding_dimension):
+            path = namespace_file(self.data_dir, model, dimension)
+            store = EmbeddingStore.load(path, dimension, self.processor.embeddings_cache.dtype)
+            self.processor.switch_namespace(model, dimension, store, path)
+
+    def close(self):
+        """Stop migrating; a running migration resumes when the knowledge base is loaded again."""
+        self._halt()
+
+    def _halt(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self._thread = None
+
+    def _spawn(self, model: str, dimension: int):
+        if not self._acquire():
+            logger.info("Embedding migration runs in another process")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(model, dimension),
+                                        name="embedding-migration", daemon=True)
+        self._thread.start()
+
+    def _acquire(self) -> bool:
+        """Take the migration lock file, shared by every process serving the knowledge base."""
+        if self._lock_file is not None:
+            return True
+        os.makedirs(self.data_dir, exist_ok=True)
+        lock_file = open(os.path.join(self.data_dir, LOCK_FILE), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _release(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _mtime(self) -> float:
+        try:
+            return os.path.getmtime(os.path.join(self.data_dir, STATE_FILE))
+        except OSError:
+            return 0.0
+
+    def _pending(self, target: EmbeddingStore, skipped: set) -> List[Tuple[str, str, str]]:
+        """List the (key, kind, source) of items without an embedding in the target namespace."""
+        pending = []
+        for domain in self.store.iter_domains():
+            key, text = self.processor.embedding_source({"name": domain.name, "description": domain.description})
+            if key not in target and key not in skipped:
+                pending.append((key, "text", text))
+        for document in list(self.store.document_index.values()):
+            key = f"doc:{document.path}"
+            if key not in target and key not in skipped:
+                pending.append((key, "document", document.path))
+        # Keys are shared by items with the same text
+        return list({key: (key, kind, source) for key, kind, source in pending}.values())
+
+    def _progress(self, **changes):
+        """Update the migration record in the state file."""
+        state = load_state(self.data_dir)
+        migration = state.setdefault("migration", {})
+        migration.update(changes, updatedAt=datetime.now().isoformat())
+        save_state(self.data_dir, state)
+        self._state_mtime = self._mtime()
+
+    def _run(self, model: str, dimension: int):
+        """Embed every pending item into the target namespace, then switch to it."""
+        path = namespace_file(self.data_dir, model, dimension)
+        dtype = self.processor.embeddings_cache.dtype
+        target = EmbeddingStore.load(path, dimension, dtype) if os.path.exists(path) else EmbeddingStore(dimension, dtype)
+        self._target = target
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        skipped: set = set()
+        done = len(target)
+        failures = 0
+        try:
+            # Items created during a pass are picked up by the next one
+            while not self._stop.is_set():
+                pending = self._pending(target, skipped)
+                if not pending:
+                    break
+                self._progress(done=done, total=done + len(pending))
+                for key, kind, source in pending:
+                    if self._stop.is_set():
+                        break
+                    started = time.monotonic()
+                    text = source if kind == "text" else self.processor.document_embedding_text(source)
+                    if text is None:
+                        skipped.add(key)
+                        continue
+                    vector = self.processor.request_embedding(text, model, dimension)
+                    if vector is None:
+                        failures += 1
+                        if failures >= MAX_FAILURES:
+                            target.save(path)
+                            self._progress(done=done, status="failed",
+                                           error=f"Embedding provider failed {failures} times in a row")
+                            logger.error(f"Embedding migration to {namespace_name(model, dimension)} failed")
+                            return
+                        # Back off while the provider is unavailable
+                        self._stop.wait(min(60, 2 ** failures))
+                        continue
+                    failures = 0
+                    target[key] = vector
+                    done += 1
+                    MIGRATED_ITEMS.inc()
+                    if done % self.checkpoint_every == 0:
+                        target.save(path)
+                        self._progress(done=done)
+                    self._stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+            target.save(path)
+            if self._stop.is_set():
+                # Left "running" so that the next process resumes it
+                self._progress(done=done)
+                return
+
+            # A crash between the two steps resumes into an already complete
+            # target, which then switches immediately
+            self.processor.switch_namespace(model, dimension, target, path)
+            state = load_state(self.data_dir)
+            state["active"] = {"model": model, "dimension": dimension}
+            state.setdefault("migration", {}).update(status="completed", done=done, total=done,
+                                                     updatedAt=datetime.now().isoformat())
+            save_state(self.data_dir, state)
+            self._state_mtime = self._mtime()
+            logger.info(f"Embedding migration to {namespace_name(model, dimension)} completed ({done} items)")
+        except Exception as e:
+            logger.error(f"Error migrating embeddings: {str(e)}")
+            self._progress(done=done, status="failed", error=str(e))
+        finally:
+            self._target = None
+            self._release()
@@ -0,0 +1,289 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/embedding_store.py
+"""
+app/core/embedding_store.py
+Compact, optionally quantized storage for embedding vectors.
+"""
+
+import os
+import threading
+import logging
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STORE_DTYPES = {
+    'float32': np.float32,
+    'float16': np.float16,
+    'int8': np.int8,
+}
+
+
+class EmbeddingStore:
+    """
+    Stores embeddings as rows of one contiguous array with an id -> row index.
+    Supports float32, float16 and int8 (with a per-vector scale) storage.
+    """
+
+    def __init__(self, dimension: int, dtype: str = 'float16', initial_capacity: int = 256):
+        """
+        Initialize the embedding store.
+
+        Args:
+            dimension: Length of every stored vector
+            dtype: Storage type, one of 'float32', 'float16' or 'int8'
+            initial_capacity: Number of rows allocated up front
+        """
+        if dtype not in STORE_DTYPES:
+            raise ValueError(f"Unsupported embedding store dtype '{dtype}'")
+
+        self.dimension = dimension
+        self.dtype = dtype
+        self.index: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        self._size = 0
+        self._lock = threading.RLock()
+
+        capacity = max(1, initial_capacity)
+        self._vectors = np.zeros((capacity, dimension), dtype=STORE_DTYPES[dtype])
+        self._scales = np.ones(capacity, dtype=np.float32)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        vector = self.get(key)
+        if vector is None:
+            raise KeyError(key)
+        return vector
+
+    def __setitem__(self, key: str, vector: np.ndarray):
+        self.put(key, vector)
+
+    def keys(self) -> List[str]:
+        """Get the stored keys."""
+        return list(self.index.keys())
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the vector arrays, in bytes."""
+        return self._vectors.nbytes + self._scales.nbytes + self._norms.nbytes
+
+    def quantize(self, vector: np.ndarray) -> Tuple[np.ndarray, float, float]:
+        """
+        Convert a vector to the store's representation without storing it.
+
+        Args:
+            vector: Embedding vector
+
+        Returns:
+            Tuple of (stored row, scale, norm of the represented vector)
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        if vector.shape != (self.dimension,):
+            raise ValueError(f"Expected a vector of length {self.dimension}, got shape {vector.shape}")
+
+        if self.dtype == 'int8':
+            peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+            scale = peak / 127.0 if peak > 0 else 1.0
+            row = np.round(vector / scale).astype(np.int8)
+        else:
+            scale = 1.0
+            row = vector.astype(STORE_DTYPES[self.dtype])
+
+        norm = float(np.linalg.norm(row.astype(np.float32))) * scale
+        return row, scale, norm
+
+    def put(self, key: str, vector: np.ndarray):
+        """
+        Store a vector under a key, replacing any previous vector.
+
+        Args:
+            key: Cache key
+            vector: Embedding vector
+        """
+        row, scale, norm = self.quantize(vector)
+        with self._lock:
+            position = self.index.get(key)
+            if position is None:
+                position = self._allocate_row()
+                self.index[key] = position
+            self._vectors[position] = row
+            self._scales[position] = scale
+            self._norms[position] = norm
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Get a stored vector as float32.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Dequantized vector or None if the key is not stored
+        """
+        with self._lock:
+            position = self.index.get(key)
+            if position is None:
+                return None
+            return self._vectors[position].astype(np.float32) * self._scales[position]
+
+    def remove(self, key: str) -> bool:
+        """
+        Remove a stored vector.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Whether the key was stored
+        """
+        with self._lock:
+            position = self.index.pop(key, None)
+            if position is None:
+                return False
+            self._norms[position] = 0
+            self._free_rows.append(position)
+            return True
+
+    def clear(self):
+        """Remove every stored vector and release the arrays."""
+        with self._lock:
+            self.index = {}
+            self._free_rows = []
+            self._size = 0
+            self._vectors = np.zeros((1, self.dimension), dtype=STORE_DTYPES[self.dtype])
+            self._scales = np.ones(1, dtype=np.float32)
+            self._norms = np.zeros(1, dtype=np.float32)
+
+    def save(self, path: str):
+        """
+        Write the stored vectors to an .npz file, atomically replacing it.
+
+        Args:
+            path: Output file path
+        """
+        with self._lock:
+            keys = list(self.index.keys())
+            positions = np.array([self.index[key] for key in keys], dtype=np.int64)
+            vectors = self._vectors[positions]
+            scales = self._scales[positions]
+            norms = self._norms[positions]
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temp_path, keys=np.array(keys, dtype=str), vectors=vectors,
+                 scales=scales, norms=norms, dtype=np.array(self.dtype))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str, dimension: int, dtype: str) -> 'EmbeddingStore':
+        """
+        Load a store written by save().
+
+        Vectors stored with another dtype are converted; a file with another
+        dimension is ignored.
+
+        Args:
+            path: File written by save()
+            dimension: Expected vector length
+            dtype: Storage type of the returned store
+
+        Returns:
+            Loaded store, or an empty one if the file is unusable
+        """
+        with np.load(path) as data:
+            keys = data['keys'].tolist()
+            vectors = data['vectors']
+            scales = data['scales']
+            norms = data['norms']
+            file_dtype = str(data['dtype'])
+
+        store = cls(dimension, dtype=dtype, initial_capacity=len(keys))
+        if keys and vectors.shape[1] != dimension:
+            logger.warning(f"Ignoring embeddings in {path}: dimension {vectors.shape[1]} != {dimension}")
+            return store
+
+        if file_dtype == dtype:
+            store._vectors[:len(keys)] = vectors
+            store._scales[:len(keys)] = scales
+            store._norms[:len(keys)] = norms
+            store.index = {key: row for row, key in enumerate(keys)}
+            store._size = len(keys)
+        else:
+            for row, key in enumerate(keys):
+                store.put(key, vectors[row].astype(np.float32) * scales[row])
+        return store
+
+    def rows(self, keys: Iterable[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the stored rows of several keys in their quantized form.
+
+        Args:
+            keys: Cache keys, all of which must be stored
+
+        Returns:
+            Tuple of (rows, scales, norms)
+        """
+        with self._lock:
+            positions = np.array([self.index[key] for key in keys], dtype=np.int64)
+            return self._vectors[positions], self._scales[positions], self._norms[positions]
+
+    def _allocate_row(self) -> int:
+        """Get a free row, growing the arrays geometrically when full."""
+        if self._free_rows:
+            return self._free_rows.pop()
+
+        if self._size == len(self._vectors):
+            capacity = len(self._vectors) * 2
+            vectors = np.zeros((capacity, self.dimension), dtype=self._vectors.dtype)
+            vectors[:self._size] = self._vectors[:self._size]
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            norms = np.zeros(capacity, dtype=np.float32)
+            norms[:self._size] = self._norms[:self._size]
+            self._vectors, self._scales, self._norms = vectors, scales, norms
+
+        self._size += 1
+        return self._size - 1
+
+
+def cosine_distance_matrix(rows: np.ndarray, scales: np.ndarray, norms: np.ndarray) -> np.ndarray:
+    """
+    Compute pairwise cosine distances between quantized rows.
+
+    Rows are converted to one float32 matrix (a copy for float16 and int8
+    storage) so the product runs through BLAS, and the per-row scales are
+    applied to the dot products afterwards. Rows with a zero norm get a
+    moderate distance of 0.5 to everything.
+
+    Args:
+        rows: Stored rows (n x dimension)
+        scales: Per-row scales
+        norms: Per-row norms of the represented vectors
+
+    Returns:
+        n x n matrix of distances in [0, 1]
+    """
+    # Integer matrix products skip BLAS and are several times slower; int8
+    # dot products summed in float32 keep about 7 significant digits, far
+    # more than the quantization itself
+    matrix = rows.astype(np.float32)
+    dots = (matrix @ matrix.T).astype(np.float64)
+
+    scales = scales.astype(np.float64)
+    norms = norms.astype(np.float64)
+    denominator = np.outer(norms, norms)
+    valid = denominator > 0
+
+    similarity = np.zeros_like(dots)
+    np.divide(dots * np.outer(scales, scales), denominator, out=similarity, where=valid)
+    distances = np.clip(1.0 - np.clip(similarity, -1.0, 1.0), 0.0, 1.0)
+    distances[~valid] = 0.5
+    return distances
@@ -0,0 +1,462 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/extractors.py
+"""
+app/core/extractors.py
+Text extractors for the document formats accepted by the upload route.
+"""
+
+import os
+import re
+import mmap
+import codecs
+import signal
+import zipfile
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PDF_MIME = 'application/pdf'
+DOC_MIME = 'application/msword'
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+TXT_MIME = 'text/plain'
+
+# Magic byte signatures, checked before falling back to the file extension
+MAGIC_SIGNATURES = [
+    (b'%PDF-', PDF_MIME),
+    (b'PK\x03\x04', DOCX_MIME),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', DOC_MIME),
+]
+
+EXTENSION_TYPES = {
+    '.pdf': PDF_MIME,
+    '.doc': DOC_MIME,
+    '.docx': DOCX_MIME,
+    '.txt': TXT_MIME,
+}
+
+# Target size of a yielded section for formats without natural pages
+SECTION_CHARS = 4000
+SECTION_BYTES = 64 * 1024
+
+# Printable runs of a legacy Word document, stored as UTF-16LE or as 8-bit text
+WIDE_TEXT_RUN = re.compile(rb'(?:[\x20-\x7e\t\r\n]\x00){8,}')
+NARROW_TEXT_RUN = re.compile(rb'[\x20-\x7e\t\r\n]{8,}')
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+Extractor = Callable[[str], Iterator[str]]
+
+
+def iter_pdf_pages(path: str) -> Iterator[str]:
+    """
+    Yield the text of each page of a PDF file.
+
+    Args:
+        path: Path to the PDF file
+
+    Returns:
+        Iterator over page texts
+    """
+    from PyPDF2 import PdfReader
+
+    pdf = PdfReader(path)
+    for number, page in enumerate(pdf.pages):
+        try:
+            yield page.extract_text() or ""
+        except Exception as e:
+            logger.warning(f"Skipping page {number + 1} of {path}: {str(e)}")
+            yield ""
+
+
+class PageTimeout(Exception):
+    """Raised inside a worker when a single page takes too long."""
+
+
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _extract_pdf_range(path: str, start: int, stop: int,
+                       page_timeout: Optional[float]) -> List[Tuple[int, Optional[str], Optional[str]]]:
+    """
+    Extract a range of PDF pages inside a worker process.
+
+    Args:
+        path: Path to the PDF file
+        start: First page number (zero-based)
+        stop: Page number to stop before
+        page_timeout: Optional time limit in seconds for each page
+
+    Returns:
+        List of (page_number, text, error) tuples; text is None for skipped pages
+    """
+    from PyPDF2 import PdfReader
+
+    use_alarm = bool(page_timeout) and hasattr(signal, 'setitimer')
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_page_timeout)
+
+    results = []
+    try:
+        pdf = PdfReader(path)
+        for number in range(start, stop):
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                results.append((number, pdf.pages[number].extract_text() or "", None))
+            except PageTimeout:
+                results.append((number, None, f"timed out after {page_timeout}s"))
+            except Exception as e:
+                results.append((number, None, str(e)))
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous_handler)
+    return results
+
+
+class ParallelPdfExtractor:
+    """
+    Extracts large PDFs by splitting them into page ranges and running
+    the ranges in a process pool, outside the request thread's GIL.
+    """
+
+    def __init__(self, workers: int, page_timeout: Optional[float] = None, min_pages: int = 20):
+        """
+        Initialize the extractor.
+
+        Args:
+            workers: Number of worker processes (0 or 1 disables parallel extraction)
+            page_timeout: Optional time limit in seconds for each page
+            min_pages: Minimum page count before the process pool is used
+        """
+        self.workers = workers
+        self.page_timeout = page_timeout
+        self.min_pages = min_pages
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether parallel extraction is configured."""
+        return self.workers > 1
+
+    def extract(self, path: str) -> Optional[Tuple[List[str], List[Dict[str, Any]]]]:
+        """
+        Extract all pages of a PDF in parallel.
+
+        Pages that time out or fail are left empty and reported instead of
+        failing the whole document.
+
+        Args:
+            path: Path to the PDF file
+
+        Returns:
+            Tuple of (page texts in order, skipped page reports), or None if
+            the document is too small to benefit from the pool
+        """
+        from PyPDF2 import PdfReader
+
+        page_count = len(PdfReader(path).pages)
+        if not self.enabled or page_count < self.min_pages:
+            return None
+
+        # A few ranges per worker keeps the pool busy when page costs vary
+        pages_per_task = max(1, -(-page_count // (self.workers * 4)))
+        executor = self._get_executor()
+        futures = [
+            (start, min(start + pages_per_task, page_count),
+             executor.submit(_extract_pdf_range, path, start,
+                             min(start + pages_per_task, page_count), self.page_timeout))
+            for start in range(0, page_count, pages_per_task)
+        ]
+
+        pages = [""] * page_count
+        skipped = []
+        pool_broken = False
+        for start, stop, future in futures:
+            # Backstop for pages stuck in native code, which the per-page
+            # alarm inside the worker cannot interrupt
+            timeout = self.page_timeout * (stop - start) + 5 if self.page_timeout else None
+            try:
+                for number, text, error in future.result(timeout=timeout):
+                    if text is None:
+                        skipped.append({"page": number + 1, "reason": error})
+                    else:
+                        pages[number] = text
+            except FuturesTimeout:
+                pool_broken = True
+                future.cancel()
+                skipped.extend({"page": number + 1, "reason": "worker timed out"}
+                               for number in range(start, stop))
+            except BrokenProcessPool as e:
+                pool_broken = True
+                skipped.extend({"page": number + 1, "reason": str(e)}
+                               for number in range(start, stop))
+            except Exception as e:
+                skipped.extend({"page": number + 1, "reason": str(e)}
+                               for number in range(start, stop))
+
+        if pool_broken:
+            self._reset_executor()
+        if skipped:
+            logger.warning(f"Skipped {len(skipped)} of {page_count} pages in {path}")
+        return pages, skipped
+
+    def shutdown(self):
+        """Shut down the worker pool."""
+        self._reset_executor()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Get or create the process pool."""
+        with self._executor_lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the server's threads and locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        """Discard the pool so that stuck workers do not block later extractions."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_text_sections(path: str) -> Iterator[str]:
+    """
+    Yield sections of a plain text file through a read-only memory map.
+
+    The file is never read into memory as a whole; sections are cut at
+    paragraph or line boundaries close to SECTION_BYTES.
+
+    Args:
+        path: Path to the text file
+
+    Returns:
+        Iterator over text sections
+    """
+    if os.path.getsize(path) == 0:
+        return
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # UTF-16 files cannot be split on single newline bytes; they are cut
+        # into windows of whole code units, and the decoder carries a surrogate
+        # pair split between windows over (the BOM sets the byte order)
+        if mm[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+            decoder = codecs.getincrementaldecoder('utf-16')(errors='replace')
+            size = len(mm)
+            for start in range(0, size, SECTION_BYTES):
+                end = min(start + SECTION_BYTES, size)
+                section = decoder.decode(mm[start:end], final=end >= size)
+                if section:
+                    yield section
+            return
+
+        start = 3 if mm[:3] == codecs.BOM_UTF8 else 0
+        size = len(mm)
+        # A window without a line break is cut mid-character at worst; the
+        # decoder carries the character's leading bytes over to the next one
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while start < size:
+            end = min(start + SECTION_BYTES, size)
+            if end < size:
+                # Prefer a paragraph break, then a line break
+                cut = mm.rfind(b'\n\n', start, end)
+                if cut <= start:
+                    cut = mm.rfind(b'\n', start, end)
+                if cut > start:
+                    end = cut + 1
+            section = decoder.decode(mm[start:end], final=end >= size)
+            if section:
+                yield section
+            start = end
+
+
+def iter_docx_sections(path: str) -> Iterator[str]:
+    """
+    Yield sections of a DOCX file by streaming its document XML.
+
+    Paragraphs are grouped into sections of roughly SECTION_CHARS, and
+    explicit page breaks always start a new section.
+
+    Args:
+        path: Path to the DOCX file
+
+    Returns:
+        Iterator over text sections
+    """
+    with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as xml:
+        paragraphs: List[str] = []
+        runs: List[str] = []
+        size = 0
+
+        for event, elem in iterparse(xml, events=('end',)):
+            tag = elem.tag
+            if tag == WORD_NS + 't':
+                runs.append(elem.text or "")
+            elif tag == WORD_NS + 'tab':
+                runs.append('\t')
+            elif tag in (WORD_NS + 'br', WORD_NS + 'cr'):
+                if elem.get(WORD_NS + 'type') == 'page':
+                    paragraphs.append(''.join(runs))
+                    runs = []
+                    if any(paragraphs):
+                        yield '\n'.join(paragraphs)
+                    paragraphs = []
+                    size = 0
+                else:
+                    runs.append('\n')
+            elif tag == WORD_NS + 'p':
+                paragraph = ''.join(runs)
+                runs = []
+                paragraphs.append(paragraph)
+                size += len(paragraph) + 1
+                # Release the parsed subtree to keep memory flat
+                elem.clear()
+                if size >= SECTION_CHARS:
+                    yield '\n'.join(paragraphs)
+                    paragraphs = []
+                    size = 0
+
+        if runs:
+            paragraphs.append(''.join(runs))
+        if any(paragraphs):
+            yield '\n'.join(paragraphs)
+
+
+def iter_doc_sections(path: str) -> Iterator[str]:
+    """
+    Yield text recovered from a legacy binary Word (OLE) document.
+
+    This is a best-effort scan for runs of UTF-16LE or 8-bit printable
+    text; it does not parse the Word file structure.
+
+    Args:
+        path: Path to the DOC file
+
+    Returns:
+        Iterator over text sections
+    """
+    if os.path.getsize(path) == 0:
+        return
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Word stores body text either as UTF-16LE or as 8-bit; keep whichever
+        # encoding recovers more text. The first pass only measures the runs,
+        # so no text is decoded before the chosen runs are yielded
+        wide_chars = sum((match.end() - match.start()) // 2 for match in WIDE_TEXT_RUN.finditer(mm))
+        narrow_chars = sum(match.end() - match.start() for match in NARROW_TEXT_RUN.finditer(mm))
+        if wide_chars >= narrow_chars:
+            pattern, encoding = WIDE_TEXT_RUN, 'utf-16-le'
+        else:
+            pattern, encoding = NARROW_TEXT_RUN, 'cp1252'
+
+        section: List[str] = []
+        size = 0
+        for match in pattern.finditer(mm):
+            run = mm[match.start():match.end()].decode(encoding, errors='replace')
+            section.append(run.replace('\r', '\n'))
+            size += len(run)
+            if size >= SECTION_CHARS:
+                yield '\n'.join(section)
+                section = []
+                size = 0
+        if section:
+            yield '\n'.join(section)
+
+
+class ExtractorRegistry:
+    """
+    Maps document types to text extractors.
+    Types are detected from magic bytes first and the file extension second.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._extractors: Dict[str, Extractor] = {}
+
+    def register(self, mime_type: str, extractor: Extractor):
+        """
+        Register an extractor for a MIME type.
+
+        Args:
+            mime_type: MIME type handled by the extractor
+            extractor: Callable taking a path and yielding text sections
+        """
+        self._extractors[mime_type] = extractor
+
+    def supported_types(self) -> List[str]:
+        """Get the MIME types with a registered extractor."""
+        return list(self._extractors.keys())
+
+    def detect_type(self, path: str) -> Optional[str]:
+        """
+        Detect the MIME type of a file.
+
+        Args:
+            path: Path to the file
+
+        Returns:
+            MIME type or None if the file type is not recognized
+        """
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(8)
+        except OSError as e:
+            logger.error(f"Error reading file header: {str(e)}")
+            return None
+
+        for signature, mime_type in MAGIC_SIGNATURES:
+            if header.startswith(signature):
+                if mime_type == DOCX_MIME and not self._is_docx(path):
+                    break
+                return mime_type
+
+        return EXTENSION_TYPES.get(os.path.splitext(path)[1].lower())
+
+    def iter_sections(self, path: str) -> Iterator[str]:
+        """
+        Lazily yield the pages or sections of a document.
+
+        Args:
+            path: Path to the document
+
+        Returns:
+            Iterator over text sections, empty if the type is unsupported
+        """
+        mime_type = self.detect_type(path)
+        extractor = self._extractors.get(mime_type)
+        if extractor is None:
+            logger.warning(f"No text extractor for {path} (type: {mime_type})")
+            return iter(())
+        return extractor(path)
+
+    @staticmethod
+    def _is_docx(path: str) -> bool:
+        """Check whether a zip container holds a Word document."""
+        try:
+            with zipfile.ZipFile(path) as archive:
+                return 'word/document.xml' in archive.namelist()
+        except zipfile.BadZipFile:
+            return False
+
+
+# Default registry covering every format the upload route accepts
+registry = ExtractorRegistry()
+registry.register(PDF_MIME, iter_pdf_pages)
+registry.register(DOC_MIME, iter_doc_sections)
+registry.register(DOCX_MIME, iter_docx_sections)
+registry.register(TXT_MIME, iter_text_sections)
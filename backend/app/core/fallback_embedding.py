@@ -0,0 +1,56 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/fallback_embedding.py
+"""
+app/core/fallback_embedding.py
+Deterministic local embeddings used when the embedding provider is unavailable.
+"""
+
+import re
+import hashlib
+import numpy as np
+from typing import Tuple
+
+# Character n-gram sizes hashed into the embedding
+NGRAM_RANGE = (3, 5)
+
+
+def hashed_ngram_embedding(text: str, dimension: int, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> np.ndarray:
+    """
+    Embed text by hashing its character n-grams into a fixed-size vector.
+
+    The same text always produces the same unit vector, in every process,
+    so layouts and downstream caches stay stable while the provider is down.
+
+    Args:
+        text: Text to embed
+        dimension: Size of the output vector
+        ngram_range: Inclusive range of n-gram sizes
+
+    Returns:
+        L2-normalized embedding vector
+    """
+    normalized = " " + re.sub(r"\s+", " ", text.lower()).strip() + " "
+    vector = np.zeros(dimension, dtype=np.float64)
+
+    grams = [
+        normalized[i:i + n]
+        for n in range(ngram_range[0], ngram_range[1] + 1)
+        for i in range(len(normalized) - n + 1)
+    ]
+    if not grams:
+        grams = [normalized]
+
+    # blake2b is stable across processes, unlike the builtin hash()
+    digests = np.array(
+        [int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'little')
+         for gram in grams],
+        dtype=np.uint64
+    )
+    indices = (digests % np.uint64(dimension)).astype(np.int64)
+    signs = np.where((digests >> np.uint64(63)) == 1, -1.0, 1.0)
+    np.add.at(vector, indices, signs)
+
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return vector / norm
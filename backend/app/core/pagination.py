@@ -0,0 +1,347 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/pagination.py
+"""
+app/core/pagination.py
+Sorted views of levels and document lists with cursor (keyset) pagination.
+"""
+
+import json
+import base64
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Orders of level listings; proximity is computed by the API from embeddings
+DOMAIN_ORDERS = ('name', 'added', 'proximity')
+DOCUMENT_ORDERS = ('name', 'dateAdded')
+
+Key = Tuple[Any, ...]
+
+
+def encode_cursor(order: str, descending: bool, key: Key) -> str:
+    """
+    Encode the sort key of the last item of a page as an opaque cursor.
+
+    Args:
+        order: Sort order the key belongs to
+        descending: Whether the order is reversed
+        key: Sort key, ending with the item id
+
+    Returns:
+        URL-safe cursor
+    """
+    payload = json.dumps([order, descending, list(key)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, order: str, descending: bool) -> Key:
+    """
+    Decode a cursor made by encode_cursor.
+
+    Args:
+        cursor: Cursor from a previous page
+        order: Sort order of the request
+        descending: Whether the request's order is reversed
+
+    Returns:
+        Sort key
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another order
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_order, cursor_descending, key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if cursor_order != order or cursor_descending != descending or not isinstance(key, list) or not key:
+        raise ValueError("Cursor does not match the requested order")
+    return tuple(key)
+
+
+class SortedKeys:
+    """
+    Sort keys of a set of items, each ending with the item id, kept sorted.
+
+    Insertions and removals are a binary search plus a list insert or
+    delete; a page is a binary search for the cursor plus a slice.
+    """
+
+    def __init__(self, keys: Iterable[Key] = ()):
+        self._keys: List[Key] = sorted(keys)
+        self._by_id: Dict[str, Key] = {key[-1]: key for key in self._keys}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._by_id
+
+    def key(self, item_id: str) -> Optional[Key]:
+        return self._by_id.get(item_id)
+
+    def last(self) -> Optional[Key]:
+        return self._keys[-1] if self._keys else None
+
+    def add(self, key: Key):
+        """Insert or re-key an item."""
+        self.remove(key[-1])
+        bisect.insort(self._keys, key)
+        self._by_id[key[-1]] = key
+
+    def remove(self, item_id: str) -> bool:
+        """Remove an item by id."""
+        key = self._by_id.pop(item_id, None)
+        if key is None:
+            return False
+        del self._keys[bisect.bisect_left(self._keys, key)]
+        return True
+
+    def page(self, after: Optional[Key], limit: int, descending: bool = False) -> List[Key]:
+        """
+        Get the keys following a cursor key.
+
+        Args:
+            after: Key of the last item of the previous page, or None for the first page
+            limit: Page size
+            descending: Walk the keys from the largest down
+
+        Returns:
+            Keys of the page, in page order
+        """
+        if not descending:
+            start = bisect.bisect_right(self._keys, after) if after is not None else 0
+            return self._keys[start:start + limit]
+        end = bisect.bisect_left(self._keys, after) if after is not None else len(self._keys)
+        return self._keys[max(0, end - limit):end][::-1]
+
+
+def paginate(keys: SortedKeys, order: str, limit: int, cursor: Optional[str] = None,
+             descending: bool = False) -> Tuple[List[Key], Optional[str]]:
+    """
+    Get one page of a sorted view.
+
+    A page resumes right after the key stored in the cursor, the item id
+    breaking ties, whether or not that item was since renamed, re-sorted or
+    removed, so items are neither skipped nor repeated across pages.
+
+    Args:
+        keys: Sorted view
+        order: Name of the view's order, recorded in the cursors
+        limit: Page size
+        cursor: Cursor returned with the previous page
+        descending: Whether to walk the view in reverse
+
+    Returns:
+        Tuple of (keys of the page, cursor of the next page or None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another order
+    """
+    after = decode_cursor(cursor, order, descending) if cursor else None
+    page = keys.page(after, limit + 1, descending)
+    if len(page) > limit:
+        return page[:limit], encode_cursor(order, descending, page[limit - 1])
+    return page, None
+
+
+class SortedViews:
+    """
+    Per-level and per-domain sorted views of a domain store, built on first
+    use and maintained from the store's change events.
+
+    Each level also has a version, advanced whenever its membership or a
+    member's name or description changes, so that orders computed outside
+    the store (such as semantic proximity) can tell they are out of date.
+    """
+
+    def __init__(self, store, max_views: int = 4096):
+        """
+        Initialize the views.
+
+        Args:
+            store: Domain store the views are of
+            max_views: Number of views kept, least recently used dropped first
+        """
+        self.store = store
+        self.max_views = max_views
+        self._views: 'OrderedDict[Tuple[str, Optional[str], str], SortedKeys]' = OrderedDict()
+        self._versions: Dict[Optional[str], int] = {}
+        # Advanced when every view is dropped at once
+        self._epoch = 0
+
+    def memory_usage(self) -> int:
+        """Approximate memory held by the views, in bytes."""
+        return sum(len(view) for view in self._views.values()) * 160
+
+    def version(self, parent_id: Optional[str]) -> Tuple[int, int]:
+        """Get the version of a level."""
+        return self._epoch, self._versions.get(parent_id, 0)
+
+    def level(self, parent_id: Optional[str], order: str) -> SortedKeys:
+        """Get the sorted view of a level's domains."""
+        return self._view(('level', parent_id, order), lambda: self._level_keys(parent_id, order))
+
+    def documents(self, domain_id: str, order: str) -> SortedKeys:
+        """Get the sorted view of a domain's documents."""
+        return self._view(('documents', domain_id, order), lambda: self._document_keys(domain_id, order))
+
+    def apply(self, event: Dict[str, Any]):
+        """Update the built views after a store mutation."""
+        kind = event["type"]
+        if kind == "domain.created":
+            domain = event["domain"]
+            self._add_domain(domain["parentId"], domain["id"])
+        elif kind == "domain.updated":
+            changes = event["changes"]
+            if "name" in changes:
+                view = self._views.get(('level', event["parentId"], 'name'))
+                domain = self.store.domains.get(event["id"])
+                if view is not None and domain is not None:
+                    view.add(domain_key(domain))
+            if "name" in changes or "description" in changes:
+                self._touch(event["parentId"])
+        elif kind == "domain.moved":
+            self._remove_domain(event["fromParentId"], event["id"])
+            self._add_domain(event["toParentId"], event["id"])
+        elif kind == "domain.deleted":
+            self._remove_domain(event["parentId"], event["id"])
+            # Drop the views of the deleted subtree
+            for key in [key for key in self._views if key[1] is not None and key[1] not in self.store.domains]:
+                del self._views[key]
+        elif kind == "domain.merged":
+            # Merges move children and documents across several levels
+            self._views.clear()
+            self._epoch += 1
+        elif kind == "document.attached":
+            document = self.store.document_index.get(event["document"]["id"])
+            if document is not None:
+                for order in DOCUMENT_ORDERS:
+                    view = self._views.get(('documents', event["domainId"], order))
+                    if view is not None:
+                        view.add(document_key(document, order))
+        elif kind == "document.detached":
+            for order in DOCUMENT_ORDERS:
+                view = self._views.get(('documents', event["domainId"], order))
+                if view is not None:
+                    view.remove(event["documentId"])
+
+    def _view(self, key: Tuple[str, Optional[str], str], build: Callable[[], Iterable[Key]]) -> SortedKeys:
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = SortedKeys(build())
+            while len(self._views) > self.max_views:
+                self._views.popitem(last=False)
+        self._views.move_to_end(key)
+        return view
+
+    def _level_keys(self, parent_id: Optional[str], order: str) -> Iterable[Key]:
+        child_ids = self.store._child_ids(parent_id)
+        if order == 'added':
+            # Children are kept in the order they joined the level
+            return [(position, domain_id) for position, domain_id in enumerate(child_ids)]
+        return [domain_key(self.store.domains[domain_id])
+                for domain_id in child_ids if domain_id in self.store.domains]
+
+    def _document_keys(self, domain_id: str, order: str) -> Iterable[Key]:
+        domain = self.store.domains.get(domain_id)
+        if domain is None:
+            return []
+        return [document_key(document, order) for document in domain.documents.values()]
+
+    def _add_domain(self, parent_id: Optional[str], domain_id: str):
+        self._touch(parent_id)
+        domain = self.store.domains.get(domain_id)
+        if domain is None:
+            return
+        view = self._views.get(('level', parent_id, 'name'))
+        if view is not None:
+            view.add(domain_key(domain))
+        view = self._views.get(('level', parent_id, 'added'))
+        if view is not None:
+            last = view.last()
+            view.add((last[0] + 1 if last is not None else 0, domain_id))
+
+    def _remove_domain(self, parent_id: Optional[str], domain_id: str):
+        self._touch(parent_id)
+        for order in ('name', 'added'):
+            view = self._views.get(('level', parent_id, order))
+            if view is not None:
+                view.remove(domain_id)
+
+    def _touch(self, parent_id: Optional[str]):
+        self._versions[parent_id] = self._versions.get(parent_id, 0) + 1
+
+
+def domain_key(domain) -> Key:
+    """Get the name sort key of a domain record."""
+    return (domain.name.casefold(), domain.id)
+
+
+def document_key(document, order: str) -> Key:
+    """Get the sort key of a document record."""
+    if order == 'dateAdded':
+        return (document.date_added or "", document.id)
+    return (document.name.casefold(), document.id)
+
+
+class ProximityCache:
+    """
+    Levels ordered by semantic distance to a pivot domain, kept until the
+    level or the pivot's level changes.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Number of (level, pivot) orders kept, least recently used dropped first
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple[Optional[str], str], Tuple[Any, SortedKeys]]' = OrderedDict()
+
+    def memory_usage(self) -> int:
+        """Approximate memory held by the cached orders, in bytes."""
+        with self._lock:
+            return sum(len(keys) for _, keys in self._entries.values()) * 160
+
+    def get(self, parent_id: Optional[str], pivot_id: str, version: Any,
+            build: Callable[[], Iterable[Key]]) -> SortedKeys:
+        """
+        Get a level's order by distance to a pivot, building it when missing or outdated.
+
+        Args:
+            parent_id: Level's parent domain ID or None for root level
+            pivot_id: Pivot domain ID
+            version: Versions of the level and the pivot's level
+            build: Computes the (distance, domain_id) keys
+
+        Returns:
+            Sorted view of the level
+        """
+        key = (parent_id, pivot_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        # Built outside the lock, since it computes distances; concurrent
+        # builds of the same order are equal, and the last one is kept
+        entry = (version, SortedKeys(build()))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry[1]
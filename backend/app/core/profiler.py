@@ -0,0 +1,176 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/profiler.py
+"""
+app/core/profiler.py
+Opt-in cProfile capture for slow or explicitly flagged API requests.
+"""
+
+import io
+import os
+import re
+import time
+import random
+import pstats
+import cProfile
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from flask import Flask, g, jsonify, request, send_file, Response
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Request header that forces a profile, and authorizes the listing endpoints
+PROFILE_HEADER = 'X-Profile-Token'
+
+PROFILE_NAME = re.compile(r'^[\w.-]+\.prof$')
+
+
+class RequestProfiler:
+    """
+    Profiles API requests with cProfile and keeps the profiles of slow ones.
+    Profiles are written as rotating .prof files (readable with pstats or
+    snakeviz) and can be listed and downloaded through /api/profiles.
+    """
+
+    def __init__(self, profile_dir: str, enabled: bool = False, threshold_ms: float = 1000,
+                 sample_rate: float = 1.0, max_files: int = 50, debug_token: Optional[str] = None):
+        """
+        Initialize the profiler.
+
+        Args:
+            profile_dir: Directory for profile files
+            enabled: Whether requests over the threshold are captured
+            threshold_ms: Latency above which a profile is kept
+            sample_rate: Fraction of requests profiled when enabled
+            max_files: Number of profile files kept before the oldest are removed
+            debug_token: Token that forces a profile when sent in PROFILE_HEADER
+        """
+        self.profile_dir = profile_dir
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.debug_token = debug_token
+
+    def init_app(self, app: Flask):
+        """
+        Register the profiling hooks and listing endpoints on an app.
+
+        Args:
+            app: Flask application
+        """
+        app.before_request(self._start_profile)
+        app.after_request(self._finish_profile)
+        app.teardown_request(self._discard_profile)
+        app.add_url_rule('/api/profiles', 'list_profiles', self._list_profiles_view, methods=['GET'])
+        app.add_url_rule('/api/profiles/<name>', 'get_profile', self._get_profile_view, methods=['GET'])
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """
+        List stored profiles, newest first.
+
+        Returns:
+            List of profile descriptions
+        """
+        if not os.path.isdir(self.profile_dir):
+            return []
+        profiles = []
+        for name in os.listdir(self.profile_dir):
+            if not PROFILE_NAME.match(name):
+                continue
+            stat = os.stat(os.path.join(self.profile_dir, name))
+            profiles.append({
+                "name": name,
+                "size": stat.st_size,
+                "created": datetime.fromtimestamp(stat.st_mtime).isoformat()
+            })
+        profiles.sort(key=lambda profile: profile["created"], reverse=True)
+        return profiles
+
+    def _debug_requested(self) -> bool:
+        return bool(self.debug_token) and request.headers.get(PROFILE_HEADER) == self.debug_token
+
+    def _start_profile(self):
+        if request.path.startswith('/api/profiles'):
+            return
+        forced = self._debug_requested()
+        if not forced and not (self.enabled and random.random() < self.sample_rate):
+            return
+
+        profile = cProfile.Profile()
+        g.profile = profile
+        g.profile_forced = forced
+        g.profile_start = time.perf_counter()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            g.pop('profile', None)
+
+    def _finish_profile(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        profile.disable()
+
+        elapsed_ms = (time.perf_counter() - g.pop('profile_start')) * 1000
+        if g.pop('profile_forced', False) or elapsed_ms >= self.threshold_ms:
+            try:
+                self._save_profile(profile, elapsed_ms)
+            except Exception as e:
+                logger.error(f"Error saving request profile: {str(e)}")
+        return response
+
+    def _discard_profile(self, exc=None):
+        # after_request is skipped when a view raises; never leave the
+        # profiler running on this thread for later requests
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.disable()
+        g.pop('profile_start', None)
+        g.pop('profile_forced', None)
+
+    def _save_profile(self, profile: cProfile.Profile, elapsed_ms: float):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        route = request.url_rule.rule if request.url_rule else request.path
+        slug = re.sub(r'[^\w]+', '-', route).strip('-') or 'root'
+        name = (f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{request.method}-{slug}"
+                f"-{int(elapsed_ms)}ms.prof")
+        profile.dump_stats(os.path.join(self.profile_dir, name))
+        logger.info(f"Saved profile of {request.method} {request.path} ({elapsed_ms:.0f} ms) as {name}")
+
+        # Rotate: keep only the newest max_files profiles
+        for stale in self.list_profiles()[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.profile_dir, stale["name"]))
+            except OSError:
+                pass
+
+    def _authorized(self) -> bool:
+        # Profiles expose code paths and timings; without a token they stay private
+        return self._debug_requested()
+
+    def _list_profiles_view(self):
+        if not self._authorized():
+            return jsonify({"error": "Unauthorized"}), 401 if self.debug_token else 403
+        return jsonify({"profiles": self.list_profiles()})
+
+    def _get_profile_view(self, name):
+        """Download a profile, or render its top functions with ?format=text."""
+        if not self._authorized():
+            return jsonify({"error": "Unauthorized"}), 401 if self.debug_token else 403
+        path = os.path.join(self.profile_dir, name)
+        if not PROFILE_NAME.match(name) or not os.path.exists(path):
+            return jsonify({"error": "Profile not found"}), 404
+
+        if request.args.get('format') == 'text':
+            output = io.StringIO()
+            stats = pstats.Stats(path, stream=output)
+            try:
+                stats.sort_stats(request.args.get('sort', 'cumulative'))
+            except KeyError:
+                return jsonify({"error": "Unknown sort key"}), 400
+            stats.print_stats(request.args.get('limit', 50, type=int))
+            return Response(output.getvalue(), mimetype='text/plain')
+        return send_file(path, as_attachment=True, download_name=name, mimetype='application/octet-stream')
@@ -0,0 +1,222 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/prompts.py
+"""
+app/core/prompts.py
+Token counting and token-budgeted prompt assembly for completions.
+"""
+
+import re
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Model answering document queries and writing summaries
+COMPLETION_MODEL = "gpt-4"
+
+# Tokens the chat format adds around each message, and once to prime the reply
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+# Joins passages that are not contiguous in the document
+PASSAGE_SEPARATOR = "\n...\n"
+
+# Approximates BPE tokens when tiktoken is unavailable: words of up to four
+# characters, single digits, single punctuation marks and runs of whitespace
+_HEURISTIC_TOKEN = re.compile(r"[^\W\d_]{1,4}|\d|[^\w\s]|\s+")
+
+# tiktoken encodings by model, None where tiktoken could not load one
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def load_encoding(model: str):
+    """
+    Load the tiktoken encoding of a model, once per process.
+
+    tiktoken downloads encoding files it has not cached (see TIKTOKEN_CACHE_DIR);
+    with STARTUP_PRELOAD this is called at startup, otherwise on first use.
+
+    Args:
+        model: Completion model whose tokenizer is loaded
+
+    Returns:
+        The encoding, or None when tiktoken or its encoding files are unavailable
+    """
+    if model in _encodings:
+        return _encodings[model]
+    with _encodings_lock:
+        if model not in _encodings:
+            encoding = None
+            try:
+                import tiktoken
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable for {model}, approximating token counts: {str(e)}")
+            _encodings[model] = encoding
+        return _encodings[model]
+
+
+class TokenCounter:
+    """
+    Counts and truncates text in the tokens of a completion model.
+
+    Uses the model's tiktoken encoding when tiktoken and its encoding files
+    are available, and otherwise a local approximation that tends to
+    overcount, so budgets computed with it stay within the real limit.
+    The encoding is shared by every counter of the model (see load_encoding).
+    """
+
+    def __init__(self, model: str):
+        """
+        Initialize the counter.
+
+        Args:
+            model: Completion model whose tokenizer is used
+        """
+        self.model = model
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from the model's own tokenizer."""
+        return self._get_encoding() is not None
+
+    def _get_encoding(self):
+        return load_encoding(self.model)
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens of a text.
+
+        Args:
+            text: Text to count
+
+        Returns:
+            Number of tokens
+        """
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return sum(1 for _ in _HEURISTIC_TOKEN.finditer(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Cut a text down to its leading tokens.
+
+        Args:
+            text: Text to cut
+            max_tokens: Number of tokens kept
+
+        Returns:
+            The longest prefix of the text with at most max_tokens tokens
+        """
+        if max_tokens <= 0:
+            return ""
+        encoding = self._get_encoding()
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            # A cut inside a multi-byte character decodes to a replacement character
+            return encoding.decode(tokens[:max_tokens]).rstrip("\ufffd")
+        for count, match in enumerate(_HEURISTIC_TOKEN.finditer(text), 1):
+            if count == max_tokens:
+                return text[:match.end()]
+        return text
+
+    def count_messages(self, *contents: str) -> int:
+        """
+        Count the prompt tokens of a chat request.
+
+        Args:
+            contents: Content of each message
+
+        Returns:
+            Number of prompt tokens, including the chat format's overhead
+        """
+        return sum(self.count(content) + MESSAGE_OVERHEAD for content in contents) + REPLY_OVERHEAD
+
+
+def pack_context(counter: TokenCounter, pieces: List[str], budget: int,
+                 separator: str = PASSAGE_SEPARATOR) -> Tuple[str, int]:
+    """
+    Join pieces of context, in order, into at most a number of tokens.
+
+    Pieces are taken whole while they fit; the first one that does not fit
+    is truncated to the tokens left and the rest are dropped.
+
+    Args:
+        counter: Token counter of the completion model
+        pieces: Context pieces, most important first or in document order
+        budget: Maximum number of tokens of the joined context
+        separator: Text placed between pieces
+
+    Returns:
+        Tuple of (context, number of pieces used at least in part)
+    """
+    parts = []
+    used = 0
+    separator_tokens = counter.count(separator)
+    for piece in pieces:
+        cost = separator_tokens if parts else 0
+        left = budget - used - cost
+        if left <= 0:
+            break
+        tokens = counter.count(piece)
+        if tokens > left:
+            piece = counter.truncate(piece, left)
+            tokens = counter.count(piece)
+            # Tokens can merge differently across the cut; trim until it fits
+            while tokens > left and piece:
+                piece = counter.truncate(piece, left - (tokens - left))
+                tokens = counter.count(piece)
+            if piece.strip():
+                parts.append(piece)
+                used += cost + tokens
+            break
+        parts.append(piece)
+        used += cost + tokens
+    return separator.join(parts), len(parts)
+
+
+def assemble_document_prompt(counter: TokenCounter, system_prompt: str, query: str,
+                             pieces: List[str], budget: int) -> Optional[Tuple[str, int]]:
+    """
+    Build the user message of a document query within a prompt token budget.
+
+    The budget covers the whole prompt: the system message, the question,
+    the message template and the chat format's overhead. The document
+    context fills whatever is left.
+
+    Args:
+        counter: Token counter of the completion model
+        system_prompt: System message sent with the prompt
+        query: User question
+        pieces: Document passages, or the document's text as one piece
+        budget: Maximum number of prompt tokens
+
+    Returns:
+        Tuple of (user message, prompt tokens), or None if the question
+        alone leaves no room for context
+    """
+    template = "Based on this document content:\n\n{context}\n\nQuestion: {query}"
+    fixed = counter.count_messages(system_prompt, template.format(context="", query=query))
+    context_budget = budget - fixed
+    while context_budget > 0:
+        context, used = pack_context(counter, pieces, context_budget)
+        if not used:
+            return None
+        user_prompt = template.format(context=context, query=query)
+        tokens = counter.count_messages(system_prompt, user_prompt)
+        if tokens <= budget:
+            return user_prompt, tokens
+        # Tokens merged across the template boundary; give back the excess
+        context_budget -= tokens - budget
+    return None
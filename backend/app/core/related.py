@@ -0,0 +1,585 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/related.py
+"""
+app/core/related.py
+Persistent k-nearest-neighbour graph of every domain and document embedding.
+"""
+
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+import logging
+import numpy as np
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from app.core.domain_model import DomainStore
+from app.core.vector_index import VectorIndex
+from app.core import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+KINDS = ('domain', 'document')
+
+GRAPH_BUILD_LATENCY = metrics.registry.histogram(
+    'related_graph_build_duration_seconds', 'Time to build the related items graph')
+RELATED_LOOKUPS = metrics.registry.counter(
+    'related_graph_lookups_total', 'Related item lookups', ['source'])
+
+Neighbors = List[Tuple[str, float]]
+
+
+def fingerprint(text: str) -> int:
+    """Hash the text an item is embedded from, to notice changes made while the graph was not loaded."""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+class NeighborGraph:
+    """
+    Immutable kNN graph in compressed sparse row form.
+
+    The neighbours of node i are neighbors[offsets[i]:offsets[i + 1]], as
+    node positions, with their similarities in the same slice of scores,
+    most similar first.
+    """
+
+    __slots__ = ('keys', 'fingerprints', 'offsets', 'neighbors', 'scores', 'row')
+
+    def __init__(self, keys: np.ndarray, fingerprints: np.ndarray, offsets: np.ndarray,
+                 neighbors: np.ndarray, scores: np.ndarray):
+        self.keys = keys
+        self.fingerprints = fingerprints
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.scores = scores
+        self.row = {key.decode(): i for i, key in enumerate(keys.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.row
+
+    @property
+    def edges(self) -> int:
+        return len(self.neighbors)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.keys, self.fingerprints, self.offsets, self.neighbors, self.scores)
+        return sum(array.nbytes for array in arrays) + len(self.row) * 100
+
+    @classmethod
+    def from_lists(cls, nodes: List[Tuple[str, int, Neighbors]]) -> 'NeighborGraph':
+        """
+        Pack neighbour lists into CSR arrays.
+
+        Args:
+            nodes: List of (key, fingerprint, neighbours); neighbours that
+                are not nodes themselves are dropped
+
+        Returns:
+            The packed graph
+        """
+        position = {key: i for i, (key, _, _) in enumerate(nodes)}
+        offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        neighbors, scores = [], []
+        for i, (_, _, entries) in enumerate(nodes):
+            for key, score in entries:
+                target = position.get(key)
+                if target is not None:
+                    neighbors.append(target)
+                    scores.append(score)
+            offsets[i + 1] = len(neighbors)
+        return cls(np.array([key.encode() for key, _, _ in nodes], dtype='S'),
+                   np.array([value for _, value, _ in nodes], dtype=np.int64), offsets,
+                   np.array(neighbors, dtype=np.int32), np.array(scores, dtype=np.float16))
+
+    @classmethod
+    def load(cls, path: str) -> Tuple['NeighborGraph', Dict[str, Any]]:
+        """Load a graph and its metadata."""
+        with np.load(path) as data:
+            graph = cls(data['keys'], data['fingerprints'], data['offsets'], data['neighbors'], data['scores'])
+            meta = json.loads(str(data['meta']))
+        return graph, meta
+
+    def save(self, path: str, meta: Dict[str, Any]):
+        """Write the graph and its metadata, atomically replacing the file."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temp_path, keys=self.keys, fingerprints=self.fingerprints, offsets=self.offsets,
+                 neighbors=self.neighbors, scores=self.scores, meta=np.array(json.dumps(meta)))
+        os.replace(temp_path, path)
+
+    def neighbors_of(self, key: str) -> Optional[Neighbors]:
+        """Get a node's neighbours and similarities, or None if it is not a node."""
+        i = self.row.get(key)
+        if i is None:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        keys = self.keys
+        return [(keys[j].decode(), float(score))
+                for j, score in zip(self.neighbors[start:end].tolist(), self.scores[start:end].tolist())]
+
+    def fingerprint_of(self, key: str) -> Optional[int]:
+        i = self.row.get(key)
+        return int(self.fingerprints[i]) if i is not None else None
+
+
+class RelatedGraph:
+    """
+    k-nearest-neighbour graph over the embeddings of every domain and
+    document in a knowledge base, regardless of where they are in the tree.
+
+    The graph is built in a background thread with batched searches of a
+    vector index, and persisted as CSR arrays, so a restart only has to
+    reload the vectors before following changes again. Store mutations are
+    applied incrementally: a new or changed item gets its neighbours from
+    the vector index and is offered as a neighbour to each of them, into
+    an overlay that is packed into the CSR arrays once it grows. Deleted
+    items are skipped when read. Similarities of changed items that remain
+    in other items' lists go stale, so the graph is rebuilt from scratch
+    once the changes since the last build reach rebuild_fraction of it.
+    """
+
+    def __init__(self, path: str, store: DomainStore, processor, k: int = 16,
+                 rebuild_fraction: float = 0.25, save_interval: float = 30.0):
+        """
+        Open (or start building) the graph and follow the store.
+
+        Args:
+            path: File the graph is persisted to
+            store: Domain store whose domains and documents are the nodes
+            processor: Semantic processor providing embeddings
+            k: Neighbours kept per node
+            rebuild_fraction: Share of changed nodes at which the graph is rebuilt
+            save_interval: Seconds between saves of a changed graph
+        """
+        self.path = path
+        self.store = store
+        self.processor = processor
+        self.k = max(1, k)
+        self.rebuild_fraction = rebuild_fraction
+        self.save_interval = save_interval
+        self._lock = threading.RLock()
+        self.graph: Optional[NeighborGraph] = None
+        self.index: Optional[VectorIndex] = None
+        # Lists and fingerprints of nodes changed since the CSR arrays were packed
+        self._overlay: Dict[str, Neighbors] = {}
+        self._fingerprints: Dict[str, int] = {}
+        self._namespace: Optional[str] = None
+        self._changes = 0
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._last_build: Dict[str, Any] = {}
+        self._error: Optional[str] = None
+        self._retry_at = 0.0
+        self._load()
+
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="related-graph", daemon=True)
+        self._worker.start()
+        store.add_listener(self._on_change)
+
+    def memory_usage(self) -> int:
+        """Approximate memory held by the graph and its vector index, in bytes."""
+        graph, index = self.graph, self.index
+        return ((graph.nbytes if graph is not None else 0) + (index.nbytes if index is not None else 0)
+                + sum(len(entries) for entries in list(self._overlay.values())) * 120)
+
+    @property
+    def ready(self) -> bool:
+        return self.graph is not None or self.index is not None
+
+    def status(self) -> Dict[str, Any]:
+        """Describe the graph."""
+        with self._lock:
+            graph = self.graph
+            return {
+                "ready": self.ready,
+                "warm": self.index is not None,
+                "nodes": len(self.index) if self.index is not None else (len(graph) if graph is not None else 0),
+                "edges": graph.edges if graph is not None else 0,
+                "k": self.k,
+                "overlay": len(self._overlay),
+                "changesSinceBuild": self._changes,
+                "pending": self._queue.qsize(),
+                "namespace": self._namespace,
+                "lastBuild": self._last_build,
+                "error": self._error
+            }
+
+    def rebuild(self):
+        """Queue a rebuild from scratch."""
+        self._queue.put(("rebuild", None))
+
+    def related(self, key: str, k: int = 10, kind: Optional[str] = None, subtree: Optional[str] = None,
+                exclude_subtree: Optional[str] = None) -> Optional[Tuple[List[Dict[str, Any]], str]]:
+        """
+        Get the items most related to a domain or document.
+
+        The item's stored neighbours are read in order and filtered, which
+        takes O(k) work. Only when the filters leave fewer than k of them is
+        the vector index searched instead.
+
+        Args:
+            key: Domain or document ID
+            k: Number of related items
+            kind: Optional 'domain' or 'document' to return only that kind
+            subtree: Optional domain ID; only items in its subtree are returned
+            exclude_subtree: Optional domain ID; items in its subtree are left out
+
+        Returns:
+            Tuple of (related items with id, kind and similarity, most similar
+            first; 'graph' or 'search'), or None while the graph is not built yet
+        """
+        accept = self._filter(key, kind, subtree, exclude_subtree)
+        with self._lock:
+            if not self.ready:
+                return None
+            stored = self._neighbors(key)
+            index = self.index
+
+        if stored is not None:
+            live = [(other, score) for other, score in stored if self._kind(other) is not None]
+            if len(live) < len(stored) and len(live) < self.k and index is not None:
+                # Neighbours were deleted; find replacements in the background
+                self._queue.put(("refresh", key))
+            matches = [(other, score) for other, score in live if accept(other)][:k]
+            # A full stored list that ran out under the filters may hide further matches
+            if len(matches) >= k or len(stored) < self.k:
+                RELATED_LOOKUPS.inc(source="graph")
+                return self._describe(matches), "graph"
+
+        vector = index.get(key) if index is not None else None
+        if vector is None:
+            RELATED_LOOKUPS.inc(source="graph")
+            return self._describe(matches if stored is not None else []), "graph"
+        RELATED_LOOKUPS.inc(source="search")
+        matches = [(other, score) for other, score in index.search(vector, k=k, accept=accept)]
+        return self._describe(matches), "search"
+
+    def flush(self):
+        """Wait until queued changes are applied (for tests and benchmarks)."""
+        self._queue.join()
+
+    def close(self):
+        """Stop following the store and save the graph."""
+        self.store.remove_listener(self._on_change)
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout=10)
+        try:
+            self.save()
+        except Exception as e:
+            logger.error(f"Error saving related graph: {str(e)}")
+
+    def save(self) -> bool:
+        """
+        Pack the overlay into the CSR arrays and write them if anything changed.
+
+        Returns:
+            Whether the graph was written
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            graph = self._compact()
+            meta = {"namespace": self._namespace, "k": self.k, "changes": self._changes}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        graph.save(self.path, meta)
+        return True
+
+    def build(self) -> NeighborGraph:
+        """
+        Build the graph from scratch: embed every item, then search all neighbours in batches.
+
+        Returns:
+            The new graph (also installed as the current one)
+        """
+        start = time.perf_counter()
+        with GRAPH_BUILD_LATENCY.time():
+            namespace = self.processor.embedding_namespace
+            index, fingerprints = self._index_items()
+            # Twice the lists of an interactive search: builds are rare and run in the background
+            keys, neighbors, scores = index.nearest_neighbors(self.k, nprobe=index.nprobe * 2)
+            nodes = []
+            for i, key in enumerate(keys):
+                entries = [(keys[j], float(score)) for j, score in zip(neighbors[i].tolist(), scores[i].tolist())
+                           if j >= 0]
+                nodes.append((key, fingerprints[key], entries))
+            graph = NeighborGraph.from_lists(nodes)
+        with self._lock:
+            self.graph = graph
+            self.index = index
+            self._fingerprints = fingerprints
+            self._overlay = {}
+            self._namespace = namespace
+            self._changes = 0
+            self._dirty = True
+        self.save()
+        self._last_build = {
+            "nodes": len(graph),
+            "edges": graph.edges,
+            "durationMs": round((time.perf_counter() - start) * 1000, 1),
+            "finishedAt": time.time()
+        }
+        logger.info(f"Built related graph of {len(graph)} nodes and {graph.edges} edges "
+                    f"in {self._last_build['durationMs']} ms")
+        return graph
+
+    def _on_change(self, event: Dict[str, Any]):
+        """Follow domain and document changes of the store."""
+        kind = event["type"]
+        if kind == "domain.created":
+            self._queue.put(("domain", event["domain"]["id"]))
+        elif kind == "domain.updated":
+            if "name" in event["changes"] or "description" in event["changes"]:
+                self._queue.put(("domain", event["id"]))
+        elif kind in ("domain.deleted", "domain.merged"):
+            # Removed descendants and merged-away children are not listed in the event
+            self._queue.put(("sweep", None))
+        elif kind == "document.attached":
+            self._queue.put(("document", event["document"]["id"]))
+        elif kind == "document.detached":
+            self._queue.put(("detached", event["documentId"]))
+
+    def _run(self):
+        """Bring the graph up, then apply queued changes and save periodically."""
+        try:
+            self._open()
+        except Exception as e:
+            logger.error(f"Error opening related graph: {str(e)}")
+            self._error = str(e)
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                item = ()
+            try:
+                if item is None or self._closed:
+                    return
+                if self.index is None or self._namespace != self.processor.embedding_namespace:
+                    # First build failed, or the processor switched to another embedding model
+                    if time.monotonic() >= self._retry_at:
+                        self._retry_at = time.monotonic() + 60
+                        self.build()
+                elif item:
+                    self._apply(*item)
+                    if self._changes > max(64, len(self.index) * self.rebuild_fraction):
+                        self.build()
+                if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+                    self.save()
+                self._error = None
+            except Exception as e:
+                logger.error(f"Error updating related graph: {str(e)}")
+                self._error = str(e)
+            finally:
+                if item != ():
+                    self._queue.task_done()
+
+    def _open(self):
+        """Warm the vector index for a loaded graph and catch up with the store, or build the graph."""
+        if self.graph is None or self._namespace != self.processor.embedding_namespace:
+            self.build()
+            return
+        index, fingerprints = self._index_items()
+        with self._lock:
+            self.index = index
+            changed = [key for key, value in fingerprints.items() if self._fingerprint(key) != value]
+            removed = [key for key in self.graph.row if key not in fingerprints]
+        # Items added, changed or removed while the graph was not loaded
+        for key in changed:
+            self._insert(key, fingerprints[key], index.get(key))
+        if removed:
+            with self._lock:
+                self._changes += len(removed)
+                self._dirty = True
+        logger.info(f"Loaded related graph of {len(self.graph)} nodes; "
+                    f"{len(changed)} changed and {len(removed)} removed since it was saved")
+
+    def _apply(self, action: str, key: Optional[str]):
+        if action == "rebuild":
+            self.build()
+        elif action == "sweep":
+            live = self.store.document_index
+            for stale in [node for node in list(self.index.index)
+                          if node not in self.store.domains and node not in live]:
+                self._remove(stale)
+        elif action == "detached":
+            # Documents moved by a merge are detached and attached again
+            if key not in self.store.document_index and key in self.index:
+                self._remove(key)
+        elif action == "refresh":
+            vector = self.index.get(key)
+            if vector is not None:
+                self._insert(key, self._fingerprints.get(key, 0), vector)
+        else:
+            item = self._embed(action, key)
+            if item is None:
+                return
+            value, vector = item
+            if self._fingerprint(key) == value and key in self.index:
+                return
+            self._insert(key, value, vector)
+
+    def _insert(self, key: str, value: int, vector: np.ndarray):
+        """Add or update a node, its neighbours, and its place in their lists."""
+        self.index.add(key, vector)
+        found = [(other, score) for other, score in self.index.search(vector, k=self.k + 1) if other != key]
+        found = found[:self.k]
+        with self._lock:
+            self._overlay[key] = found
+            self._fingerprints[key] = value
+            for other, score in found:
+                current = [(node, node_score) for node, node_score in (self._neighbors(other) or [])
+                           if node != key]
+                if len(current) >= self.k and score <= current[-1][1]:
+                    continue
+                current.append((key, score))
+                current.sort(key=lambda entry: -entry[1])
+                self._overlay[other] = current[:self.k]
+            self._changes += 1
+            self._dirty = True
+            if self.graph is None or len(self._overlay) > max(256, len(self.graph) // 8):
+                self.graph = self._compact()
+
+    def _remove(self, key: str):
+        with self._lock:
+            self.index.remove(key)
+            self._overlay.pop(key, None)
+            self._fingerprints.pop(key, None)
+            self._changes += 1
+            self._dirty = True
+
+    def _compact(self) -> NeighborGraph:
+        """Pack the live nodes' lists, from the overlay or the CSR arrays, into new CSR arrays."""
+        graph = self.graph
+        keys = list(self.index.index) if self.index is not None else list(graph.row if graph is not None else [])
+        nodes = []
+        for key in keys:
+            if self._kind(key) is None:
+                continue
+            entries = self._neighbors(key) or []
+            nodes.append((key, self._fingerprint(key) or 0, entries))
+        graph = NeighborGraph.from_lists(nodes)
+        self._overlay = {}
+        return graph
+
+    def _neighbors(self, key: str) -> Optional[Neighbors]:
+        entries = self._overlay.get(key)
+        if entries is not None:
+            return entries
+        graph = self.graph
+        return graph.neighbors_of(key) if graph is not None else None
+
+    def _fingerprint(self, key: str) -> Optional[int]:
+        value = self._fingerprints.get(key)
+        if value is None and self.graph is not None:
+            value = self.graph.fingerprint_of(key)
+        return value
+
+    def _kind(self, key: str) -> Optional[str]:
+        if key in self.store.domains:
+            return 'domain'
+        if key in self.store.document_index:
+            return 'document'
+        return None
+
+    def _embed(self, kind: str, key: str) -> Optional[Tuple[int, np.ndarray]]:
+        """Get the fingerprint and embedding of a domain or document, or None if it is gone."""
+        if kind == 'domain':
+            domain = self.store.domains.get(key)
+            if domain is None:
+                return None
+            vector = self.processor.get_item_embeddings([{"name": domain.name, "description": domain.description}])[0]
+            return fingerprint(f"{domain.name}\0{domain.description}"), vector
+        document = self.store.document_index.get(key)
+        if document is None:
+            return None
+        vector = self.processor.get_document_embedding(document.path)
+        if vector is None or len(vector) != self.processor.embedding_dimension:
+            return None
+        return fingerprint(document.path), vector
+
+    def _index_items(self) -> Tuple[VectorIndex, Dict[str, int]]:
+        """Embed every domain and document into a new vector index."""
+        index = VectorIndex(self.processor.embedding_dimension)
+        fingerprints = {}
+        domains = list(self.store.iter_domains())
+        if domains:
+            vectors = self.processor.get_item_embeddings(
+                [{"name": domain.name, "description": domain.description} for domain in domains])
+            index.add_many([domain.id for domain in domains], vectors)
+            for domain in domains:
+                fingerprints[domain.id] = fingerprint(f"{domain.name}\0{domain.description}")
+        keys, vectors = [], []
+        for document in list(self.store.document_index.values()):
+            item = self._embed('document', document.id)
+            if item is not None:
+                fingerprints[document.id] = item[0]
+                keys.append(document.id)
+                vectors.append(item[1])
+        if keys:
+            index.add_many(keys, np.array(vectors))
+        return index, fingerprints
+
+    def _filter(self, key: str, kind: Optional[str], subtree: Optional[str],
+                exclude_subtree: Optional[str]) -> Callable[[str], bool]:
+        """Build the predicate related items must satisfy."""
+        store = self.store
+
+        def domain_of(other: str) -> Optional[str]:
+            if other in store.domains:
+                return other
+            document = store.document_index.get(other)
+            return document.domain_id if document is not None else None
+
+        def accept(other: str) -> bool:
+            if other == key:
+                return False
+            other_kind = self._kind(other)
+            if other_kind is None or (kind is not None and other_kind != kind):
+                return False
+            if subtree is None and exclude_subtree is None:
+                return True
+            domain_id = domain_of(other)
+            if domain_id is None:
+                return False
+            if subtree is not None and not store.is_in_subtree(domain_id, subtree):
+                return False
+            return exclude_subtree is None or not store.is_in_subtree(domain_id, exclude_subtree)
+        return accept
+
+    def _describe(self, matches: Iterable[Tuple[str, float]]) -> List[Dict[str, Any]]:
+        results = []
+        for other, score in matches:
+            domain = self.store.domains.get(other)
+            if domain is not None:
+                results.append({"id": other, "kind": "domain", "name": domain.name,
+                                "parentId": domain.parent_id, "similarity": round(score, 4)})
+                continue
+            document = self.store.document_index.get(other)
+            if document is not None:
+                results.append({"id": other, "kind": "document", "name": document.name,
+                                "domainId": document.domain_id, "path": document.path,
+                                "similarity": round(score, 4)})
+        return results
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            graph, meta = NeighborGraph.load(self.path)
+        except Exception as e:
+            logger.error(f"Error loading related graph, rebuilding: {str(e)}")
+            return
+        if meta.get("k") != self.k:
+            return
+        self.graph = graph
+        self._namespace = meta.get("namespace")
+        self._changes = meta.get("changes", 0)
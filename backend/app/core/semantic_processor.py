@@ -5,29 +5,68 @@ Processes semantic information from documents and domain names.
 """
 
 import os
+import time
+import atexit
+import hashlib
+import threading
 import numpy as np
 import logging
-from typing import Dict, List, Tuple, Optional, Any
-from collections import defaultdict
+from typing import Callable, Dict, List, Tuple, Optional, Any, Union
+from collections import defaultdict, OrderedDict
 import openai
-from PyPDF2 import PdfReader
+from app.core.extractors import PDF_MIME, ParallelPdfExtractor, registry as extractor_registry
+from app.core.fallback_embedding import hashed_ngram_embedding
+from app.core.embedding_store import STORE_DTYPES, EmbeddingStore, cosine_distance_matrix
+from app.core.single_flight import SingleFlight
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.embedding_migration import namespace_file, namespace_name, resolve_active_namespace, load_state
+from app.core.answer_cache import AnswerCache, normalize_query
+from app.core.prompts import COMPLETION_MODEL, TokenCounter, assemble_document_prompt
+from app.core import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Defaults; the model in use is the processor's active embedding namespace
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_DIMENSION = 1536
+DOCUMENT_QUERY_PROMPT = "You are a helpful assistant explaining concepts from documents."
+
+EMBEDDING_CACHE_LOOKUPS = metrics.registry.counter(
+    'semantic_embedding_cache_lookups_total', 'Embedding cache lookups', ['kind', 'result'])
+FALLBACK_EMBEDDINGS = metrics.registry.counter(
+    'semantic_fallback_embeddings_total', 'Embeddings served by the local fallback embedder')
+PROVIDER_REQUESTS = metrics.registry.counter(
+    'semantic_provider_requests_total', 'Calls to the embedding and completion provider', ['operation', 'outcome'])
+PROVIDER_LATENCY = metrics.registry.histogram(
+    'semantic_provider_request_duration_seconds', 'Provider call latency', ['operation'])
+EXTRACTION_LATENCY = metrics.registry.histogram(
+    'semantic_text_extraction_duration_seconds', 'Document text extraction time', ['mode'])
+
+def create_pdf_extractor() -> ParallelPdfExtractor:
+    """Create a PDF extraction pool configured from the environment."""
+    page_timeout = float(os.getenv('PDF_PAGE_TIMEOUT', 10))
+    return ParallelPdfExtractor(
+        workers=int(os.getenv('PDF_EXTRACT_WORKERS', min(4, os.cpu_count() or 1))),
+        page_timeout=page_timeout if page_timeout > 0 else None,
+        min_pages=int(os.getenv('PDF_PARALLEL_MIN_PAGES', 20))
+    )
+
 class SemanticProcessor:
     """
     Processes semantic information from documents and domains.
     Uses OpenAI embeddings to compute semantic distances.
     """
     
-    def __init__(self, upload_folder: str):
+    def __init__(self, upload_folder: str, pdf_extractor: Optional[ParallelPdfExtractor] = None):
         """
         Initialize the semantic processor.
         
         Args:
             upload_folder: Path to uploaded files
+            pdf_extractor: Optional PDF process pool shared with other processors;
+                one is created (and owned) when not given
         """
         self.upload_folder = upload_folder
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
@@ -43,15 +82,84 @@ class SemanticProcessor:
             self.newer_client = OpenAI(api_key=self.openai_api_key)
             self.use_newer_client = True
             logger.info("Using newer OpenAI client")
-        except (ImportError, TypeError):
+        except Exception:
             self.use_newer_client = False
             logger.info("Using legacy OpenAI client")
             
-        self.embeddings_cache = {}
+        # Embeddings persist across restarts; loading them here means a
+        # processor created before workers fork is shared copy-on-write
+        self.persist_interval = float(os.getenv('EMBEDDING_PERSIST_INTERVAL', 60))
+        
+        # Embeddings live in one namespace per (model, dimension). The active
+        # namespace is recorded on disk, so changing EMBEDDING_MODEL only sets
+        # the target of a migration and never silently invalidates the cache
+        data_dir = os.path.join(upload_folder, 'data')
+        self.target_model = os.getenv('EMBEDDING_MODEL', EMBEDDING_MODEL)
+        self.target_dimension = int(os.getenv('EMBEDDING_DIMENSION', EMBEDDING_DIMENSION))
+        self.embedding_model, self.embedding_dimension = resolve_active_namespace(
+            data_dir, self.target_model, self.target_dimension, persist=self.persist_interval > 0
+        )
+        self.embeddings_file = namespace_file(data_dir, self.embedding_model, self.embedding_dimension)
+        # Whether a migration was running when the processor last stopped
+        self.pending_migration = (load_state(data_dir).get("migration") or {}).get("status") == "running"
+        if (self.embedding_model, self.embedding_dimension) != (self.target_model, self.target_dimension):
+            logger.info(f"Serving embeddings from {self.embedding_namespace}; "
+                        f"migrate to {namespace_name(self.target_model, self.target_dimension)} to switch")
+        self.embeddings_cache = self._load_embeddings(os.getenv('EMBEDDING_STORE_DTYPE', 'float16'))
+        self._embeddings_dirty = False
+        self._last_persist = time.monotonic()
+        self._persist_lock = threading.Lock()
+        if self.persist_interval > 0:
+            atexit.register(self.save_embeddings)
+        
+        # Cache keys served by the local fallback embedder, waiting to be
+        # re-embedded by the provider: cache_key -> text or document path.
+        # The oldest are forgotten past the cap; they are embedded again when next used
+        self.degraded_keys = OrderedDict()
+        self.degraded_keys_max = int(os.getenv('DEGRADED_KEYS_MAX', 10000))
+        self._degraded_lock = threading.Lock()
+        
+        # During a provider outage, skip embedding calls for a while after
+        # consecutive failures instead of paying a timeout for every item
+        self.embedding_breaker = CircuitBreaker(
+            'embedding_provider',
+            failure_threshold=int(os.getenv('PROVIDER_BREAKER_FAILURES', 3)),
+            cooldown=float(os.getenv('PROVIDER_BREAKER_COOLDOWN', 30))
+        )
+        self._reembed_thread = None
+        
+        # Extracted text keyed by full path: (mtime, size, sections, complete, skipped)
+        # Shared by request threads and the migration and indexing threads
+        self.text_cache = OrderedDict()
+        self.text_cache_size = int(os.getenv('TEXT_CACHE_SIZE', 32))
+        self._text_cache_lock = threading.Lock()
+        
+        self._owns_pdf_extractor = pdf_extractor is None
+        self.pdf_extractor = pdf_extractor or create_pdf_extractor()
+        
+        # Concurrent identical expensive calls share one computation
+        self.single_flight = SingleFlight(timeout=float(os.getenv('SINGLE_FLIGHT_TIMEOUT', 60)))
+        
+        # Document queries fill a prompt token budget with context, and their
+        # answers are reused for the same or a paraphrased question
+        self.token_counter = TokenCounter(COMPLETION_MODEL)
+        self.prompt_token_budget = int(os.getenv('PROMPT_TOKEN_BUDGET', 2000))
+        self.answer_cache = AnswerCache(
+            os.path.join(data_dir, 'answers.json') if self.persist_interval > 0 else None,
+            max_entries=int(os.getenv('ANSWER_CACHE_SIZE', 1024)),
+            threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95))
+        )
+        
+        # Search queries and questions are embedded into a bounded LRU rather
+        # than the persisted store, which would otherwise grow with user traffic
+        self.query_embeddings = OrderedDict()
+        self.query_embeddings_max = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 256))
+        self._query_embeddings_lock = threading.Lock()
     
     def compute_distances(self, items: List[Dict[str, Any]], level_id: Optional[str] = None) -> Dict[Tuple[str, str], float]:
         """
         Compute semantic distances between items.
+        Concurrent calls for the same items share one computation.
         
         Args:
             items: List of items with name and optional description
@@ -60,43 +168,12 @@ class SemanticProcessor:
         Returns:
             Dictionary mapping (item1_id, item2_id) to distance
         """
+        key = ("distances", tuple(
+            (item.get('id'), item.get('name'), item.get('description'), item.get('documentPath'))
+            for item in items
+        ))
         try:
-            distances = {}
-            logger.info(f"Computing distances for {len(items)} items")
-            
-            # Get embeddings for each item
-            item_embeddings = {}
-            for item in items:
-                embedding = None
-                
-                # If item has a document path, use that for embedding
-                if 'documentPath' in item and item['documentPath']:
-                    embedding = self._get_document_embedding(item['documentPath'])
-                
-                # Otherwise use the name and description
-                if not embedding:
-                    text = item['name']
-                    if 'description' in item and item['description']:
-                        text += ": " + item['description']
-                    embedding = self._get_text_embedding(text)
-                
-                if embedding is not None:
-                    item_embeddings[item['id']] = embedding
-                else:
-                    logger.warning(f"Could not generate embedding for item: {item['name']}")
-                    # Create a random embedding as fallback to prevent crashes
-                    item_embeddings[item['id']] = np.random.rand(1536)
-            
-            # Compute distances between all item pairs
-            for i, item1_id in enumerate(item_embeddings.keys()):
-                item1_embedding = item_embeddings[item1_id]
-                for item2_id in list(item_embeddings.keys())[i+1:]:
-                    item2_embedding = item_embeddings[item2_id]
-                    distance = self._compute_distance(item1_embedding, item2_embedding)
-                    distances[(item1_id, item2_id)] = distance
-            
-            return distances
-            
+            return self.single_flight.do(key, self._compute_distances, items)
         except Exception as e:
             logger.error(f"Error computing distances: {str(e)}")
             return {}
@@ -104,6 +181,7 @@ class SemanticProcessor:
     def get_document_summary(self, document_path: str) -> str:
         """
         Get a summary of a document for display.
+        Concurrent calls for the same document share one completion.
         
         Args:
             document_path: Path to the document
@@ -112,52 +190,25 @@ class SemanticProcessor:
             Summary of the document
         """
         try:
-            # Extract text from PDF
-            full_path = os.path.join(self.upload_folder, document_path)
-            text = self._extract_text_from_pdf(full_path)
-            
-            if not text:
-                return "Could not extract text from document"
-            
-            # Generate summary with OpenAI - handle different API versions
-            try:
-                if self.use_newer_client:
-                    response = self.newer_client.chat.completions.create(
-                        model="gpt-4",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant that provides concise document summaries."},
-                            {"role": "user", "content": f"Please provide a short summary (maximum 200 words) of the following document:\n\n{text[:5000]}..."}
-                        ],
-                        temperature=0.7,
-                        max_tokens=250
-                    )
-                    return response.choices[0].message.content
-                else:
-                    response = openai.ChatCompletion.create(
-                        model="gpt-4",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant that provides concise document summaries."},
-                            {"role": "user", "content": f"Please provide a short summary (maximum 200 words) of the following document:\n\n{text[:5000]}..."}
-                        ],
-                        temperature=0.7,
-                        max_tokens=250
-                    )
-                    return response["choices"][0]["message"]["content"]
-            except Exception as e:
-                logger.error(f"Error generating summary: {str(e)}")
-                return f"AI summary unavailable. Document begins with: {text[:500]}..."
-                
+            return self.single_flight.do(("summary", document_path), self._summarize_document, document_path)
         except Exception as e:
             logger.error(f"Error getting document summary: {str(e)}")
             return f"Error summarizing document: {str(e)}"
     
-    def process_document_query(self, document_path: str, query: str) -> str:
+    def process_document_query(self, document_path: str, query: str,
+                               passages: Optional[Union[List[str], Callable[[int], Optional[List[str]]]]] = None) -> str:
         """
         Process a query about a specific document.
+        Answers are cached by document content and question, and reused for
+        paraphrased questions; concurrent identical questions share one completion.
         
         Args:
             document_path: Path to the document
             query: User query about the document
+            passages: Optional passages relevant to the query, used as context
+                instead of the beginning of the document, or a function returning
+                them given their total length in characters, only called when the
+                answer is not cached
             
         Returns:
             Response to the query
@@ -165,76 +216,593 @@ class SemanticProcessor:
         try:
             if not self.openai_api_key:
                 return "OpenAI API key not configured"
-
-            # Extract text from PDF
+            
             full_path = os.path.join(self.upload_folder, document_path)
-            text = self._extract_text_from_pdf(full_path)
+            digest = self.answer_cache.document_digest(full_path)
+            if digest is None:
+                return self._answer_document_query(document_path, query, passages)
             
-            if not text:
+            cached = self.answer_cache.get(digest, query, self._query_embedding, self.embedding_namespace)
+            if cached is not None:
+                return cached[0]
+            return self.single_flight.do(("query", digest, normalize_query(query)), self._answer_document_query,
+                                         document_path, query, passages, digest)
+            
+        except Exception as e:
+            logger.error(f"Error processing document query: {str(e)}")
+            return f"Error processing query: {str(e)}"
+    
+    def cached_document_answer(self, document_path: str, query: str) -> Optional[str]:
+        """
+        Get the cached answer to exactly this question about a document.
+        Makes no provider call, so callers can answer without queueing a completion.
+        
+        Args:
+            document_path: Path to the document
+            query: User query about the document
+        
+        Returns:
+            Cached answer, or None
+        """
+        try:
+            digest = self.answer_cache.document_digest(os.path.join(self.upload_folder, document_path))
+            return self.answer_cache.peek(digest, query) if digest is not None else None
+        except Exception as e:
+            logger.error(f"Error looking up cached answer: {str(e)}")
+            return None
+    
+    def _answer_document_query(self, document_path: str, query: str,
+                               passages: Optional[Union[List[str], Callable[[int], Optional[List[str]]]]],
+                               digest: Optional[str] = None) -> str:
+        """
+        Answer a query about a document with a completion, caching the answer.
+        
+        Args:
+            document_path: Path to the document
+            query: User query about the document
+            passages: Passages used as context, or a function returning them
+            digest: Content digest of the document, or None to skip caching
+            
+        Returns:
+            Response to the query
+        """
+        try:
+            # Passages are over-fetched by length and packed by tokens
+            max_chars = self.prompt_token_budget * 6
+            if callable(passages):
+                passages = passages(max_chars)
+            if not passages:
+                full_path = os.path.join(self.upload_folder, document_path)
+                text = self._extract_text(full_path, max_chars=max_chars)
+                passages = [text] if text else None
+            
+            if not passages:
                 return "Could not extract text from document"
-
-            # Create OpenAI query with context - handle different API versions
+            
+            assembled = assemble_document_prompt(self.token_counter, DOCUMENT_QUERY_PROMPT, query,
+                                                 passages, self.prompt_token_budget)
+            if assembled is None:
+                return "Query too long for the prompt token budget"
+            user_prompt, _ = assembled
+            
+            # Create OpenAI query with context
             try:
-                if self.use_newer_client:
-                    response = self.newer_client.chat.completions.create(
-                        model="gpt-4",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant explaining concepts from documents."},
-                            {"role": "user", "content": f"Based on this document content:\n\n{text[:4000]}...\n\nQuestion: {query}"}
-                        ],
-                        temperature=0.7,
-                        max_tokens=500
-                    )
-                    return response.choices[0].message.content
-                else:
-                    response = openai.ChatCompletion.create(
-                        model="gpt-4",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant explaining concepts from documents."},
-                            {"role": "user", "content": f"Based on this document content:\n\n{text[:4000]}...\n\nQuestion: {query}"}
-                        ],
-                        temperature=0.7,
-                        max_tokens=500
-                    )
-                    return response["choices"][0]["message"]["content"]
+                answer = self._request_completion(DOCUMENT_QUERY_PROMPT, user_prompt, max_tokens=500)
             except Exception as e:
                 logger.error(f"Error processing query with AI: {str(e)}")
                 return f"Unable to process query with AI. Error: {str(e)}"
             
+            if digest is not None and answer:
+                self.answer_cache.put(digest, document_path, query, answer)
+            return answer
+            
         except Exception as e:
             logger.error(f"Error processing document query: {str(e)}")
             return f"Error processing query: {str(e)}"
     
+    def _query_embedding(self, query: str) -> Optional[np.ndarray]:
+        """
+        Embed a question for answer cache lookups.
+        
+        Args:
+            query: User question
+            
+        Returns:
+            Embedding vector, or None when only a degraded fallback is available
+        """
+        try:
+            embedding, degraded = self._embed_query(query)
+            return None if degraded else embedding
+        except Exception as e:
+            logger.error(f"Error embedding query: {str(e)}")
+            return None
+    
+    def get_query_embedding(self, query: str) -> np.ndarray:
+        """
+        Get the unit-length embedding of a search query, without persisting it.
+        
+        Args:
+            query: Search query
+            
+        Returns:
+            float32 vector of the active embedding dimension (the local fallback
+            embedding when the provider is unavailable)
+        """
+        try:
+            embedding, _ = self._embed_query(query)
+        except Exception as e:
+            logger.error(f"Error embedding query: {str(e)}")
+            embedding = hashed_ngram_embedding(query, self.embedding_dimension)
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def _embed_query(self, query: str) -> Tuple[np.ndarray, bool]:
+        """
+        Embed a query, caching it in the bounded query LRU only.
+        
+        Args:
+            query: Search query or question
+            
+        Returns:
+            Tuple of (embedding vector, whether it is a degraded fallback)
+        """
+        cache_key = self._text_cache_key(query)
+        # A query that is also an item's text is already in the store
+        if cache_key in self.embeddings_cache:
+            EMBEDDING_CACHE_LOOKUPS.inc(kind="query", result="hit")
+            return self.embeddings_cache[cache_key], False
+        with self._query_embeddings_lock:
+            embedding = self.query_embeddings.get(cache_key)
+            if embedding is not None:
+                self.query_embeddings.move_to_end(cache_key)
+        if embedding is not None and len(embedding) == self.embedding_dimension:
+            EMBEDDING_CACHE_LOOKUPS.inc(kind="query", result="hit")
+            return embedding, False
+        
+        EMBEDDING_CACHE_LOOKUPS.inc(kind="query", result="miss")
+        embedding = self._request_embedding(query)
+        if embedding is None:
+            FALLBACK_EMBEDDINGS.inc()
+            return hashed_ngram_embedding(query, self.embedding_dimension), True
+        with self._query_embeddings_lock:
+            self.query_embeddings[cache_key] = embedding
+            self.query_embeddings.move_to_end(cache_key)
+            while len(self.query_embeddings) > self.query_embeddings_max:
+                self.query_embeddings.popitem(last=False)
+        return embedding, False
+    
+    def get_extraction_report(self, document_path: str) -> Dict[str, Any]:
+        """
+        Get a report of the last full text extraction of a document.
+        
+        Args:
+            document_path: Path to the document
+            
+        Returns:
+            Report with section count and any skipped pages
+        """
+        full_path = os.path.join(self.upload_folder, document_path)
+        self._extract_text(full_path)
+        with self._text_cache_lock:
+            entry = self.text_cache.get(full_path)
+        if entry is None:
+            return {"type": extractor_registry.detect_type(full_path), "sections": 0, "skippedPages": []}
+        return {
+            "type": extractor_registry.detect_type(full_path),
+            "sections": len(entry[2]),
+            "skippedPages": entry[4]
+        }
+    
+    def save_embeddings(self) -> bool:
+        """
+        Persist the embeddings cache if it changed since the last save.
+        
+        Returns:
+            Whether the cache was written
+        """
+        if self.persist_interval <= 0 or not self._embeddings_dirty:
+            return False
+        if not os.path.isdir(self.upload_folder):
+            return False
+        
+        with self._persist_lock:
+            self._embeddings_dirty = False
+            self._last_persist = time.monotonic()
+            try:
+                self.embeddings_cache.save(self.embeddings_file)
+                logger.info(f"Saved {len(self.embeddings_cache)} embeddings to {self.embeddings_file}")
+                return True
+            except Exception as e:
+                self._embeddings_dirty = True
+                logger.error(f"Error saving embeddings: {str(e)}")
+                return False
+    
+    @property
+    def embedding_namespace(self) -> str:
+        """Name of the namespace embeddings are currently read from and written to."""
+        return namespace_name(self.embedding_model, self.embedding_dimension)
+    
+    def switch_namespace(self, model: str, dimension: int, store: EmbeddingStore, path: str):
+        """
+        Make another embedding namespace the active one.
+        
+        Requests already running finish against the store they started with;
+        every later lookup uses the new one.
+        
+        Args:
+            model: Embedding model of the namespace
+            dimension: Embedding dimension of the namespace
+            store: The namespace's embeddings
+            path: File the namespace is persisted to
+        """
+        with self._persist_lock:
+            self.embedding_model = model
+            self.embedding_dimension = dimension
+            self.embeddings_file = path
+            self.embeddings_cache = store
+            self._embeddings_dirty = False
+        with self._degraded_lock:
+            self.degraded_keys = OrderedDict()
+        with self._query_embeddings_lock:
+            self.query_embeddings.clear()
+        logger.info(f"Switched embeddings to namespace {self.embedding_namespace} ({len(store)} embeddings)")
+    
+    def embedding_source(self, item: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Get the cache key and embedded text of a domain-like item.
+        
+        Args:
+            item: Item with name and optional description
+        
+        Returns:
+            Tuple of (cache key, text)
+        """
+        text = self._item_text(item)
+        return self._text_cache_key(text), text
+    
+    def get_document_text(self, document_path: str) -> str:
+        """
+        Get the full extracted text of a document.
+        
+        Args:
+            document_path: Path to the document relative to the upload folder
+        
+        Returns:
+            Extracted text (empty if none could be extracted)
+        """
+        return self._extract_text(os.path.join(self.upload_folder, document_path))
+    
+    def document_embedding_text(self, document_path: str) -> Optional[str]:
+        """
+        Get the text a document's embedding is computed from.
+        
+        Args:
+            document_path: Path to the document relative to the upload folder
+        
+        Returns:
+            Text or None if the document has no extractable text
+        """
+        full_path = os.path.join(self.upload_folder, document_path)
+        text = self._extract_text(full_path, max_chars=2000)
+        if not text:
+            return None
+        return f"Document: {os.path.basename(document_path)}\n\nContent: {text[:2000]}"
+    
+    def request_embedding(self, text: str, model: str, dimension: int) -> Optional[np.ndarray]:
+        """
+        Embed text with a given provider model, without caching or fallback.
+        
+        Args:
+            text: Text to embed
+            model: Embedding model
+            dimension: Expected embedding dimension
+        
+        Returns:
+            Embedding vector, or None if the provider is unavailable or
+            returned a vector of another dimension
+        """
+        embedding = self._request_embedding(text, model, dimension)
+        if embedding is not None and len(embedding) != dimension:
+            logger.error(f"Model {model} returned {len(embedding)} dimensions, expected {dimension}")
+            return None
+        return embedding
+    
+    def memory_usage(self) -> int:
+        """
+        Estimate the memory held by the caches, in bytes.
+        
+        Returns:
+            Embedding store size plus the size of the cached extracted text, query embeddings and answers
+        """
+        with self._text_cache_lock:
+            entries = list(self.text_cache.values())
+        text_bytes = sum(sum(len(section) for section in entry[2]) for entry in entries)
+        with self._query_embeddings_lock:
+            query_bytes = sum(embedding.nbytes for embedding in self.query_embeddings.values())
+        return self.embeddings_cache.nbytes + text_bytes + query_bytes + self.answer_cache.memory_usage()
+    
+    def close(self):
+        """Persist the embeddings and release the processor's resources."""
+        self.save_embeddings()
+        atexit.unregister(self.save_embeddings)
+        if self._owns_pdf_extractor:
+            self.pdf_extractor.shutdown()
+        with self._text_cache_lock:
+            self.text_cache.clear()
+    
     def clear_cache(self):
-        """Clear the embeddings cache."""
-        self.embeddings_cache = {}
+        """Clear the embeddings and extracted text caches."""
+        self.embeddings_cache.clear()
+        self._embeddings_dirty = True
+        with self._text_cache_lock:
+            self.text_cache.clear()
+        with self._degraded_lock:
+            self.degraded_keys = OrderedDict()
+        with self._query_embeddings_lock:
+            self.query_embeddings.clear()
+    
+    def _compute_distances(self, items: List[Dict[str, Any]]) -> Dict[Tuple[str, str], float]:
+        """
+        Compute semantic distances between items without coalescing.
+        
+        Args:
+            items: List of items with name and optional description
+            
+        Returns:
+            Dictionary mapping (item1_id, item2_id) to distance
+        """
+        try:
+            distances = {}
+            logger.info(f"Computing distances for {len(items)} items")
+            
+            # Resolve each item to a stored embedding, or a vector when the
+            # embedding is degraded and therefore not stored
+            store = self.embeddings_cache
+            item_ids = []
+            item_keys = []
+            unstored = {}
+            for item in items:
+                cache_key, embedding = self._resolve_item_embedding(item)
+                if cache_key not in store or len(embedding) != store.dimension:
+                    unstored[len(item_ids)] = embedding
+                item_ids.append(item['id'])
+                item_keys.append(cache_key)
+            
+            matrix = self._distance_matrix(item_keys, unstored, store)
+            
+            # Distances between all item pairs
+            first, second = np.triu_indices(len(item_ids), k=1)
+            for i, j, distance in zip(first.tolist(), second.tolist(), matrix[first, second].tolist()):
+                distances[(item_ids[i], item_ids[j])] = distance
+            
+            return distances
+            
+        except Exception as e:
+            logger.error(f"Error computing distances: {str(e)}")
+            return {}
+    
+    def get_item_embeddings(self, items: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Get unit-length embeddings of items, in the order given.
+        
+        Args:
+            items: List of items with name, optional description and optional documentPath
+            
+        Returns:
+            len(items) x embedding_dimension float32 matrix
+        """
+        dimension = self.embedding_dimension
+        vectors = np.zeros((len(items), dimension), dtype=np.float32)
+        for row, item in enumerate(items):
+            _, embedding = self._resolve_item_embedding(item)
+            if len(embedding) == dimension:
+                vectors[row] = embedding
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+    
+    def get_document_embedding(self, document_path: str) -> Optional[np.ndarray]:
+        """
+        Get the embedding of a document, computing and caching it if needed.
+        
+        Args:
+            document_path: Path to the document relative to the upload folder
+            
+        Returns:
+            Embedding vector or None if the document has no extractable text
+        """
+        return self._get_document_embedding(document_path)
+    
+    def _resolve_item_embedding(self, item: Dict[str, Any]) -> Tuple[str, np.ndarray]:
+        """
+        Get the cache key and embedding of a domain-like item.
+        
+        Args:
+            item: Item with name, optional description and optional documentPath
+            
+        Returns:
+            Tuple of (cache key, embedding)
+        """
+        embedding = None
+        cache_key = None
+        
+        # If item has a document path, use that for embedding
+        if 'documentPath' in item and item['documentPath']:
+            embedding = self._get_document_embedding(item['documentPath'])
+            cache_key = f"doc:{item['documentPath']}"
+        
+        # Otherwise use the name and description
+        text = self._item_text(item)
+        if embedding is None:
+            embedding = self._get_text_embedding(text)
+            cache_key = self._text_cache_key(text)
+        
+        if embedding is None:
+            logger.warning(f"Could not generate embedding for item: {item['name']}")
+            # Deterministic fallback keeps the layout stable between calls
+            embedding = hashed_ngram_embedding(text, self.embedding_dimension)
+        return cache_key, embedding
+    
+    @staticmethod
+    def _item_text(item: Dict[str, Any]) -> str:
+        """Get the text embedded for a domain-like item."""
+        text = item['name']
+        if 'description' in item and item['description']:
+            text += ": " + item['description']
+        return text
     
-    def _extract_text_from_pdf(self, pdf_path: str) -> str:
+    def _summarize_document(self, document_path: str) -> str:
         """
-        Extract text from a PDF file.
+        Summarize a document with the completion API without coalescing.
         
         Args:
-            pdf_path: Path to the PDF file
+            document_path: Path to the document
             
         Returns:
-            Extracted text
+            Summary of the document
         """
         try:
-            pdf = PdfReader(pdf_path)
-            text = ""
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            return text
+            full_path = os.path.join(self.upload_folder, document_path)
+            text = self._extract_text(full_path, max_chars=5000)
             
+            if not text:
+                return "Could not extract text from document"
+            
+            # Generate summary with OpenAI
+            try:
+                return self._request_completion(
+                    "You are a helpful assistant that provides concise document summaries.",
+                    f"Please provide a short summary (maximum 200 words) of the following document:\n\n{text[:5000]}...",
+                    max_tokens=250
+                )
+            except Exception as e:
+                logger.error(f"Error generating summary: {str(e)}")
+                return f"AI summary unavailable. Document begins with: {text[:500]}..."
+                
         except Exception as e:
-            logger.error(f"Error extracting text from PDF: {str(e)}")
+            logger.error(f"Error getting document summary: {str(e)}")
+            return f"Error summarizing document: {str(e)}"
+    
+    def _load_embeddings(self, dtype: str) -> EmbeddingStore:
+        """
+        Load persisted embeddings, or start with an empty store.
+        
+        Args:
+            dtype: Storage type of the store
+            
+        Returns:
+            Embedding store
+        """
+        if self.persist_interval > 0 and os.path.exists(self.embeddings_file):
+            try:
+                store = EmbeddingStore.load(self.embeddings_file, self.embedding_dimension, dtype)
+                logger.info(f"Loaded {len(store)} embeddings from {self.embeddings_file}")
+                return store
+            except Exception as e:
+                logger.error(f"Error loading embeddings: {str(e)}")
+        return EmbeddingStore(self.embedding_dimension, dtype=dtype)
+    
+    def _cache_embedding(self, cache_key: str, embedding: np.ndarray):
+        """Store an embedding and persist the cache in the background when due."""
+        store = self.embeddings_cache
+        if len(embedding) != store.dimension:
+            # Computed for the namespace that was active before a switch
+            return
+        store[cache_key] = embedding
+        self._embeddings_dirty = True
+        if (self.persist_interval > 0
+                and time.monotonic() - self._last_persist >= self.persist_interval
+                and not self._persist_lock.locked()):
+            self._last_persist = time.monotonic()
+            threading.Thread(target=self.save_embeddings, name="persist-embeddings", daemon=True).start()
+    
+    def _extract_text(self, full_path: str, max_chars: Optional[int] = None) -> str:
+        """
+        Extract text from a document of any supported format, with caching.
+        
+        Sections are read lazily, so callers that only need a prefix of the
+        document stop extraction as soon as max_chars characters are available.
+        
+        Args:
+            full_path: Path to the document
+            max_chars: Optional number of leading characters needed
+            
+        Returns:
+            Extracted text (at most max_chars characters if given)
+        """
+        try:
+            stat = os.stat(full_path)
+            with self._text_cache_lock:
+                entry = self.text_cache.get(full_path)
+            if entry is not None and entry[:2] != (stat.st_mtime, stat.st_size):
+                entry = None
+            
+            if entry is None or not self._has_enough_text(entry, max_chars):
+                mode = "full" if max_chars is None else "prefix"
+                with EXTRACTION_LATENCY.time(span="extract", mode=mode):
+                    entry = self._read_sections(full_path, stat, max_chars)
+            
+            # Extraction runs outside the lock; only the LRU bookkeeping is guarded
+            with self._text_cache_lock:
+                self.text_cache[full_path] = entry
+                self.text_cache.move_to_end(full_path)
+                while len(self.text_cache) > self.text_cache_size:
+                    self.text_cache.popitem(last=False)
+            
+            text = "".join(section + "\n" for section in entry[2])
+            return text[:max_chars] if max_chars is not None else text
+            
+        except Exception as e:
+            logger.error(f"Error extracting text from document: {str(e)}")
             return ""
     
+    def _read_sections(self, full_path: str, stat: os.stat_result, max_chars: Optional[int]) -> Tuple:
+        """
+        Read document sections into a new text cache entry.
+        
+        Full extractions of large PDFs run page ranges in the process pool;
+        everything else is read lazily on the calling thread.
+        
+        Args:
+            full_path: Path to the document
+            stat: File status used to validate the cache entry
+            max_chars: Optional number of leading characters needed
+            
+        Returns:
+            Text cache entry
+        """
+        if (max_chars is None and self.pdf_extractor.enabled
+                and extractor_registry.detect_type(full_path) == PDF_MIME):
+            result = self.pdf_extractor.extract(full_path)
+            if result is not None:
+                pages, skipped = result
+                return (stat.st_mtime, stat.st_size, [page for page in pages if page], True, skipped)
+        
+        sections = []
+        size = 0
+        complete = True
+        for section in extractor_registry.iter_sections(full_path):
+            if section:
+                sections.append(section)
+                size += len(section) + 1
+            if max_chars is not None and size >= max_chars:
+                complete = False
+                break
+        return (stat.st_mtime, stat.st_size, sections, complete, [])
+    
+    def _has_enough_text(self, entry: Tuple, max_chars: Optional[int]) -> bool:
+        """Check whether a text cache entry can serve a request for max_chars."""
+        if entry[3]:
+            return True
+        if max_chars is None:
+            return False
+        return sum(len(section) + 1 for section in entry[2]) >= max_chars
+    
     def _get_document_embedding(self, document_path: str) -> Optional[np.ndarray]:
         """
         Get embedding for a document.
+        Concurrent cache misses for the same document share one computation.
         
         Args:
             document_path: Path to the document
@@ -245,21 +813,42 @@ class SemanticProcessor:
         try:
             cache_key = f"doc:{document_path}"
             if cache_key in self.embeddings_cache:
+                EMBEDDING_CACHE_LOOKUPS.inc(kind="document", result="hit")
                 return self.embeddings_cache[cache_key]
             
-            # Extract text from PDF
-            full_path = os.path.join(self.upload_folder, document_path)
-            text = self._extract_text_from_pdf(full_path)
+            EMBEDDING_CACHE_LOOKUPS.inc(kind="document", result="miss")
+            return self.single_flight.do(("document-embedding", document_path),
+                                         self._embed_document, document_path)
             
-            if not text:
-                return None
+        except Exception as e:
+            logger.error(f"Error getting document embedding: {str(e)}")
+            return None
+    
+    def _embed_document(self, document_path: str) -> Optional[np.ndarray]:
+        """
+        Compute and cache the embedding of a document.
+        
+        Args:
+            document_path: Path to the document
+            
+        Returns:
+            Document embedding vector
+        """
+        try:
+            cache_key = f"doc:{document_path}"
+            if cache_key in self.embeddings_cache:
+                return self.embeddings_cache[cache_key]
             
             # Generate summary for embedding
-            summary = f"Document: {os.path.basename(document_path)}\n\nContent: {text[:2000]}"
-            embedding = self._get_text_embedding(summary)
+            summary = self.document_embedding_text(document_path)
+            if not summary:
+                return None
+            embedding, degraded = self._embed_text(summary)
             
-            if embedding is not None:
-                self.embeddings_cache[cache_key] = embedding
+            if degraded:
+                self._mark_degraded(cache_key, document_path)
+            else:
+                self._cache_embedding(cache_key, embedding)
                 
             return embedding
             
@@ -278,86 +867,212 @@ class SemanticProcessor:
             Embedding vector
         """
         try:
-            # Cache handling
-            cache_key = f"text:{hash(text)}"
-            if cache_key in self.embeddings_cache:
-                return self.embeddings_cache[cache_key]
+            embedding, _ = self._embed_text(text)
+            return embedding
             
-            embedding = None
+        except Exception as e:
+            logger.error(f"Error getting embedding: {str(e)}")
+            return hashed_ngram_embedding(text, self.embedding_dimension)
+    
+    def _embed_text(self, text: str) -> Tuple[np.ndarray, bool]:
+        """
+        Embed text with the provider, falling back to the local embedder.
+        
+        Fallback vectors are deterministic but degraded: they are not cached,
+        and are re-embedded in the background once the provider responds again.
+        
+        Args:
+            text: Text to embed
+            
+        Returns:
+            Tuple of (embedding vector, whether it is a degraded fallback)
+        """
+        cache_key = self._text_cache_key(text)
+        if cache_key in self.embeddings_cache:
+            EMBEDDING_CACHE_LOOKUPS.inc(kind="text", result="hit")
+            return self.embeddings_cache[cache_key], False
+        
+        EMBEDDING_CACHE_LOOKUPS.inc(kind="text", result="miss")
+        embedding = self._request_embedding(text)
+        if embedding is None:
+            FALLBACK_EMBEDDINGS.inc()
+            self._mark_degraded(cache_key, text)
+            return hashed_ngram_embedding(text, self.embedding_dimension), True
+        
+        self._cache_embedding(cache_key, embedding)
+        if self.degraded_keys:
+            self._schedule_reembedding()
+        return embedding, False
+    
+    def _request_embedding(self, text: str, model: Optional[str] = None,
+                           dimension: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Request an embedding from the provider.
+        
+        Args:
+            text: Text to embed
+            model: Embedding model (defaults to the active namespace's)
+            dimension: Embedding dimension (defaults to the active namespace's)
             
+        Returns:
+            Embedding vector or None if the provider is unavailable
+        """
+        model = model or self.embedding_model
+        dimension = dimension or self.embedding_dimension
+        # Only the text-embedding-3 models can shorten their output
+        options = {"dimensions": dimension} if model.startswith("text-embedding-3") else {}
+        if not self.use_newer_client and not self.openai_api_key:
+            return None
+        if not self.embedding_breaker.allow():
+            PROVIDER_REQUESTS.inc(operation="embedding", outcome="skipped")
+            return None
+        with PROVIDER_LATENCY.time(span="embed", operation="embedding"):
             # Try using the newer OpenAI client first
             if self.use_newer_client:
                 try:
                     response = self.newer_client.embeddings.create(
-                        model="text-embedding-ada-002",
-                        input=text[:8191]
+                        model=model,
+                        input=text[:8191],
+                        **options
                     )
                     embedding = np.array(response.data[0].embedding)
                 except Exception as e:
-                    logger.warning(f"Newer OpenAI client error: {str(e)}, falling back to legacy client")
-                    # Fall back to legacy client
-                    self.use_newer_client = False
+                    logger.warning(f"Newer OpenAI client error: {str(e)}")
+                    PROVIDER_REQUESTS.inc(operation="embedding", outcome="error")
+                    self.embedding_breaker.record_failure()
+                    return None
             
-            # Try legacy client if newer client failed or isn't available
-            if embedding is None and self.openai_api_key:
+            # Legacy client when the newer one isn't available
+            else:
                 try:
                     response = openai.Embedding.create(
-                        model="text-embedding-ada-002",
-                        input=text[:8191]
+                        model=model,
+                        input=text[:8191],
+                        **options
                     )
                     embedding = np.array(response["data"][0]["embedding"])
                 except Exception as e:
                     logger.error(f"All OpenAI embedding methods failed: {str(e)}")
-                    embedding = np.random.rand(1536)
-            elif embedding is None:
-                embedding = np.random.rand(1536)
-            
-            # Cache and return
-            self.embeddings_cache[cache_key] = embedding
-            return embedding
-            
-        except Exception as e:
-            logger.error(f"Error getting embedding: {str(e)}")
-            return np.random.rand(1536)
+                    PROVIDER_REQUESTS.inc(operation="embedding", outcome="error")
+                    self.embedding_breaker.record_failure()
+                    return None
+        PROVIDER_REQUESTS.inc(operation="embedding", outcome="success")
+        self.embedding_breaker.record_success()
+        return embedding
     
-    def _compute_distance(self, emb1: np.ndarray, emb2: np.ndarray) -> float:
+    def _request_completion(self, system_prompt: str, user_prompt: str, max_tokens: int) -> str:
         """
-        Compute semantic distance between two embeddings.
+        Request a chat completion from the provider - handles different API versions.
         
         Args:
-            emb1: First embedding vector
-            emb2: Second embedding vector
+            system_prompt: System message
+            user_prompt: User message
+            max_tokens: Maximum tokens in the response
             
         Returns:
-            Distance value (0-1, where 0 is identical)
-        """
-        try:
-            # Check if vectors are valid
-            if emb1 is None or emb2 is None or len(emb1) == 0 or len(emb2) == 0:
-                logger.warning("Invalid embedding vectors received for distance calculation")
-                return 0.5  # Return moderate distance for invalid vectors
-                
-            # Check for NaN values 
-            if np.isnan(emb1).any() or np.isnan(emb2).any():
-                logger.warning("NaN values detected in embedding vectors")
-                return 0.5
-                
-            # Normalize the vectors to avoid numerical issues
-            norm1 = np.linalg.norm(emb1)
-            norm2 = np.linalg.norm(emb2)
+            Completion text
             
-            if norm1 == 0 or norm2 == 0:
-                logger.warning("Zero norm encountered in embedding")
-                return 0.5
-                
-            # Compute cosine similarity and convert to distance
-            similarity = np.dot(emb1, emb2) / (norm1 * norm2)
+        Raises:
+            Exception: If the provider call fails
+        """
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        with PROVIDER_LATENCY.time(span="completion", operation="completion"):
+            try:
+                if self.use_newer_client:
+                    response = self.newer_client.chat.completions.create(
+                        model=COMPLETION_MODEL,
+                        messages=messages,
+                        temperature=0.7,
+                        max_tokens=max_tokens
+                    )
+                    content = response.choices[0].message.content
+                else:
+                    response = openai.ChatCompletion.create(
+                        model=COMPLETION_MODEL,
+                        messages=messages,
+                        temperature=0.7,
+                        max_tokens=max_tokens
+                    )
+                    content = response["choices"][0]["message"]["content"]
+            except Exception:
+                PROVIDER_REQUESTS.inc(operation="completion", outcome="error")
+                raise
+        PROVIDER_REQUESTS.inc(operation="completion", outcome="success")
+        return content
+    
+    def _mark_degraded(self, cache_key: str, source: str):
+        """Remember a key that was served by the fallback embedder."""
+        with self._degraded_lock:
+            self.degraded_keys[cache_key] = source
+            self.degraded_keys.move_to_end(cache_key)
+            while len(self.degraded_keys) > self.degraded_keys_max:
+                self.degraded_keys.popitem(last=False)
+    
+    def _schedule_reembedding(self):
+        """Start re-embedding degraded keys in the background, if not already running."""
+        with self._degraded_lock:
+            if self._reembed_thread is not None and self._reembed_thread.is_alive():
+                return
+            self._reembed_thread = threading.Thread(
+                target=self._reembed_degraded,
+                name="reembed-degraded",
+                daemon=True
+            )
+            self._reembed_thread.start()
+    
+    def _reembed_degraded(self):
+        """Re-embed degraded keys with the provider until none are left or it fails again."""
+        while True:
+            with self._degraded_lock:
+                if not self.degraded_keys:
+                    return
+                cache_key, source = next(iter(self.degraded_keys.items()))
+                del self.degraded_keys[cache_key]
             
-            # Clip to valid range due to potential floating point errors
-            similarity = max(-1.0, min(1.0, similarity))
+            if cache_key.startswith("doc:"):
+                if self._get_document_embedding(source) is None:
+                    # Document is no longer readable; nothing to recover
+                    continue
+                recovered = cache_key in self.embeddings_cache
+            else:
+                _, degraded = self._embed_text(source)
+                recovered = not degraded
             
-            return max(0, min(1, 1 - similarity))  # Ensure distance is between 0 and 1
+            if not recovered:
+                logger.info("Embedding provider unavailable again, pausing re-embedding")
+                return
+            logger.info(f"Re-embedded degraded key {cache_key}")
+    
+    def _distance_matrix(self, keys: List[str], unstored: Dict[int, np.ndarray],
+                         store: Optional[EmbeddingStore] = None) -> np.ndarray:
+        """
+        Compute pairwise distances from stored embeddings in their compact form.
+        
+        Args:
+            keys: Cache key of each item
+            unstored: Vectors by item position for items whose key is not stored
+            store: Embedding store the keys were resolved against (defaults to the active one)
             
-        except Exception as e:
-            logger.error(f"Error computing distance: {str(e)}")
-            return 0.5  # Return moderate distance on error
\ No newline at end of file
+        Returns:
+            Matrix of distances (0-1, where 0 is identical)
+        """
+        store = store if store is not None else self.embeddings_cache
+        rows = np.zeros((len(keys), store.dimension), dtype=STORE_DTYPES[store.dtype])
+        scales = np.ones(len(keys), dtype=np.float32)
+        norms = np.zeros(len(keys), dtype=np.float32)
+        
+        stored_positions = [i for i in range(len(keys)) if i not in unstored]
+        if stored_positions:
+            stored_rows = store.rows([keys[i] for i in stored_positions])
+            rows[stored_positions], scales[stored_positions], norms[stored_positions] = stored_rows
+        for i, vector in unstored.items():
+            rows[i], scales[i], norms[i] = store.quantize(vector)
+        
+        return cosine_distance_matrix(rows, scales, norms)
+    
+    def _text_cache_key(self, text: str) -> str:
+        """Get the embeddings cache key of a text, stable across processes."""
+        return f"text:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
@@ -0,0 +1,97 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/single_flight.py
+"""
+app/core/single_flight.py
+Coalesces identical concurrent calls into a single in-flight computation.
+"""
+
+import threading
+import logging
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """An in-flight computation shared by every caller with the same key."""
+
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time.
+    Callers arriving while a computation is in flight wait for it and share
+    its result, or its exception.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        Initialize the single-flight group.
+
+        Args:
+            timeout: Default number of seconds a waiting caller waits for the
+                in-flight computation (None waits indefinitely)
+        """
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) unless a call with the same key is in flight.
+
+        Args:
+            key: Identity of the computation, e.g. the operation and its inputs
+            fn: Function computing the result
+            timeout: Seconds to wait for an in-flight call, overriding the default
+
+        Returns:
+            Result of the (possibly shared) computation
+
+        Raises:
+            TimeoutError: If waiting for an in-flight call took too long
+            Exception: Whatever the shared computation raised
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+                if call.waiters:
+                    logger.info(f"Shared result of {key[0] if isinstance(key, tuple) else key} "
+                                f"with {call.waiters} waiting caller(s)")
+            return call.result
+
+        wait = self.timeout if timeout is None else timeout
+        if not call.done.wait(wait):
+            raise TimeoutError(f"Timed out after {wait}s waiting for in-flight computation")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self) -> int:
+        """Get the number of computations currently in flight."""
+        with self._lock:
+            return len(self._calls)
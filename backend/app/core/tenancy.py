@@ -0,0 +1,355 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/tenancy.py
+"""
+app/core/tenancy.py
+Tenant-scoped knowledge bases with lazily loaded, LRU-evicted in-memory state.
+"""
+
+import os
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from app.core.domain_model import DomainStore
+from app.core import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = 'default'
+
+# Entries of a default knowledge base stored directly in the upload folder,
+# the layout before each tenant had its own directory
+LEGACY_DEFAULT_ENTRIES = ('documents', 'data')
+
+# Tenant ids become directory names, so keep them to a safe alphabet
+TENANT_ID_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+TENANTS_LOADED = metrics.registry.gauge(
+    'tenants_loaded', 'Tenants with in-memory state')
+TENANT_MEMORY = metrics.registry.gauge(
+    'tenants_memory_bytes', 'Estimated memory held by loaded tenants')
+TENANT_EVICTIONS = metrics.registry.counter(
+    'tenant_evictions_total', 'Tenants whose in-memory state was evicted')
+
+
+class UnknownTenantError(Exception):
+    """Raised for tenant ids that are malformed or not allowed."""
+
+
+class Tenant:
+    """In-memory state of one tenant's knowledge base."""
+
+    __slots__ = ('id', 'root', 'store', 'processor', 'services', 'active', 'lock')
+
+    def __init__(self, tenant_id: str, root: str):
+        self.id = tenant_id
+        self.root = root
+        self.store: Optional[DomainStore] = None
+        self.processor = None
+        # Other per-tenant components (indexes, caches) by name
+        self.services: Dict[str, Any] = {}
+        # Requests currently using the tenant; such tenants are never evicted
+        self.active = 0
+        self.lock = threading.RLock()
+
+    def memory_usage(self) -> int:
+        """Estimated memory held by the loaded store and processor, in bytes."""
+        total = self.store.memory_usage() if self.store is not None else 0
+        if self.processor is not None:
+            total += self.processor.memory_usage()
+        for service in list(self.services.values()):
+            if hasattr(service, 'memory_usage'):
+                total += service.memory_usage()
+        return total
+
+
+class TenantRegistry:
+    """
+    Maps tenant ids to their DomainStore and SemanticProcessor.
+
+    Every tenant, the default one included, lives under
+    <upload folder>/tenants/<tenant id>, so no tenant's directory contains
+    another's. A default knowledge base left directly in the upload folder is
+    moved to tenants/default once. State is loaded on first use and the
+    least recently used idle tenants are evicted when the estimated memory
+    of all loaded tenants exceeds the budget; the default tenant stays loaded.
+
+    Besides the default tenant, only listed tenants and those whose directory
+    already exists are accepted, unless open_tenants lets any well-formed id
+    create one.
+    """
+
+    def __init__(self, upload_folder: str, memory_budget: int = 512 * 1024 ** 2,
+                 max_tenants: int = 0, allowed: Optional[List[str]] = None,
+                 open_tenants: bool = False, budget_interval: float = 5.0,
+                 processor_factory: Optional[Callable[[str], Any]] = None):
+        """
+        Initialize the tenant registry.
+
+        Args:
+            upload_folder: Application upload folder
+            memory_budget: Estimated bytes of tenant state kept in memory
+            max_tenants: Maximum number of loaded tenants (0 for no limit)
+            allowed: Optional list of the only tenant ids accepted
+            open_tenants: Accept any well-formed tenant id when no list is given,
+                creating its directories on first use
+            budget_interval: Minimum seconds between memory budget checks
+            processor_factory: Creates a semantic processor for a tenant root;
+                defaults to SemanticProcessor sharing one PDF process pool
+        """
+        self.upload_folder = upload_folder
+        self.memory_budget = memory_budget
+        self.max_tenants = max_tenants
+        self.allowed = set(allowed) if allowed else None
+        self.open_tenants = open_tenants
+        self.budget_interval = budget_interval
+        self._budget_checked = 0.0
+        self._processor_factory = processor_factory
+        self._pdf_extractor = None
+        self._tenants: 'OrderedDict[str, Tenant]' = OrderedDict()
+        self._lock = threading.RLock()
+        self._migrate_default_tenant()
+
+    def validate(self, tenant_id: Optional[str]) -> str:
+        """
+        Normalize and check a tenant id.
+
+        Args:
+            tenant_id: Requested tenant id, or None for the default tenant
+
+        Returns:
+            Tenant id
+
+        Raises:
+            UnknownTenantError: If the id is malformed or not allowed
+        """
+        if not tenant_id:
+            return DEFAULT_TENANT
+        if not TENANT_ID_PATTERN.match(tenant_id):
+            raise UnknownTenantError(f"Invalid tenant id '{tenant_id}'")
+        if tenant_id == DEFAULT_TENANT:
+            return tenant_id
+        if self.allowed is not None:
+            if tenant_id not in self.allowed:
+                raise UnknownTenantError(f"Unknown tenant '{tenant_id}'")
+        elif not self.open_tenants and not os.path.isdir(self.root(tenant_id)):
+            raise UnknownTenantError(f"Unknown tenant '{tenant_id}'")
+        return tenant_id
+
+    def root(self, tenant_id: str) -> str:
+        """Get a tenant's upload folder."""
+        return os.path.join(self.upload_folder, 'tenants', tenant_id)
+
+    def _migrate_default_tenant(self):
+        """Move a default knowledge base stored directly in the upload folder to its own directory."""
+        target = self.root(DEFAULT_TENANT)
+        legacy = [name for name in LEGACY_DEFAULT_ENTRIES
+                  if os.path.exists(os.path.join(self.upload_folder, name))]
+        if not legacy or os.path.exists(target):
+            return
+        try:
+            os.makedirs(target, exist_ok=True)
+            for name in legacy:
+                os.replace(os.path.join(self.upload_folder, name), os.path.join(target, name))
+            logger.info(f"Moved the default knowledge base to {target}")
+        except OSError as e:
+            # Another worker process may be moving it at the same time
+            logger.error(f"Error moving the default knowledge base to {target}: {str(e)}")
+
+    def acquire(self, tenant_id: str) -> Tenant:
+        """
+        Mark a tenant as in use by a request, creating its entry if needed.
+
+        Args:
+            tenant_id: Validated tenant id
+
+        Returns:
+            Tenant entry; release() it when the request ends
+        """
+        with self._lock:
+            tenant = self._entry(tenant_id)
+            tenant.active += 1
+            return tenant
+
+    def release(self, tenant: Tenant):
+        """Mark a request as done with a tenant, enforcing the memory budget when a check is due."""
+        with self._lock:
+            tenant.active = max(0, tenant.active - 1)
+            # Estimating usage walks every loaded tenant's caches, so it is not
+            # done on every request; too many loaded tenants is cheap to see
+            now = time.monotonic()
+            over_count = self.max_tenants > 0 and len(self._tenants) > self.max_tenants
+            if not over_count and now - self._budget_checked < self.budget_interval:
+                return
+            self._budget_checked = now
+        self._enforce_budget()
+
+    def get_store(self, tenant_id: str) -> DomainStore:
+        """
+        Get a tenant's domain store, loading it on first use.
+
+        Args:
+            tenant_id: Validated tenant id
+
+        Returns:
+            Domain store
+        """
+        tenant = self._entry(tenant_id)
+        if tenant.store is None:
+            with tenant.lock:
+                if tenant.store is None:
+                    storage_dir = os.path.join(tenant.root, 'data')
+                    os.makedirs(storage_dir, exist_ok=True)
+                    tenant.store = DomainStore(storage_dir)
+                    logger.info(f"Loaded domain store of tenant {tenant_id}")
+        return tenant.store
+
+    def get_processor(self, tenant_id: str):
+        """
+        Get a tenant's semantic processor, creating it on first use.
+
+        Args:
+            tenant_id: Validated tenant id
+
+        Returns:
+            Semantic processor with the tenant's own embedding namespace
+        """
+        tenant = self._entry(tenant_id)
+        if tenant.processor is None:
+            with tenant.lock:
+                if tenant.processor is None:
+                    os.makedirs(tenant.root, exist_ok=True)
+                    tenant.processor = self._create_processor(tenant.root)
+        return tenant.processor
+
+    def get_service(self, tenant_id: str, name: str, factory: Callable[[Tenant], Any]):
+        """
+        Get a named per-tenant component, creating it on first use.
+    
+        Components are dropped with the tenant on eviction; those with a
+        memory_usage() method count towards the memory budget, and those with
+        a close() method are closed.
+    
+        Args:
+            tenant_id: Validated tenant id
+            name: Component name
+            factory: Creates the component from the tenant entry
+        
+        Returns:
+            The component
+        """
+        tenant = self._entry(tenant_id)
+        service = tenant.services.get(name)
+        if service is None:
+            with tenant.lock:
+                service = tenant.services.get(name)
+                if service is None:
+                    service = tenant.services[name] = factory(tenant)
+        return service
+
+    def evict(self, tenant_id: str, idle_only: bool = False) -> bool:
+        """
+        Drop a tenant's in-memory state, persisting what needs persisting.
+
+        Args:
+            tenant_id: Tenant id
+            idle_only: Leave the tenant loaded if a request is using it
+
+        Returns:
+            Whether the tenant was evicted
+        """
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None or (idle_only and tenant.active > 0):
+                return False
+            del self._tenants[tenant_id]
+        self._close(tenant)
+        TENANT_EVICTIONS.inc()
+        logger.info(f"Evicted tenant {tenant_id}")
+        return True
+
+    def close(self):
+        """Persist and drop every loaded tenant."""
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+        for tenant in tenants:
+            self._close(tenant)
+        if self._pdf_extractor is not None:
+            self._pdf_extractor.shutdown()
+
+    def stats(self) -> Dict[str, Any]:
+        """Describe the loaded tenants, least recently used first."""
+        with self._lock:
+            tenants = list(self._tenants.values())
+        entries = [{
+            "id": tenant.id,
+            "storeLoaded": tenant.store is not None,
+            "processorLoaded": tenant.processor is not None,
+            "activeRequests": tenant.active,
+            "memoryBytes": tenant.memory_usage()
+        } for tenant in tenants]
+        return {
+            "tenants": entries,
+            "memoryBytes": sum(entry["memoryBytes"] for entry in entries),
+            "memoryBudget": self.memory_budget
+        }
+
+    def _entry(self, tenant_id: str) -> Tenant:
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                tenant = self._tenants[tenant_id] = Tenant(tenant_id, self.root(tenant_id))
+            self._tenants.move_to_end(tenant_id)
+            return tenant
+
+    def _create_processor(self, root: str):
+        if self._processor_factory is not None:
+            return self._processor_factory(root)
+        # Deferred: pulls in numpy and the OpenAI client on first use
+        from app.core.semantic_processor import SemanticProcessor, create_pdf_extractor
+        with self._lock:
+            if self._pdf_extractor is None:
+                self._pdf_extractor = create_pdf_extractor()
+        return SemanticProcessor(root, pdf_extractor=self._pdf_extractor)
+
+    def _enforce_budget(self):
+        """Evict idle tenants, least recently used first, while over budget."""
+        with self._lock:
+            tenants = list(self._tenants.values())
+        usage = {tenant.id: tenant.memory_usage() for tenant in tenants}
+        total = sum(usage.values())
+        loaded = len(tenants)
+        TENANTS_LOADED.set(loaded)
+        TENANT_MEMORY.set(total)
+
+        for tenant in tenants:
+            if tenant.id == DEFAULT_TENANT:
+                continue
+            over_memory = total > self.memory_budget
+            over_count = self.max_tenants > 0 and loaded > self.max_tenants
+            if not (over_memory or over_count):
+                break
+            if loaded <= 1:
+                break
+            if self.evict(tenant.id, idle_only=True):
+                total -= usage[tenant.id]
+                loaded -= 1
+
+        TENANTS_LOADED.set(loaded)
+        TENANT_MEMORY.set(total)
+
+    def _close(self, tenant: Tenant):
+        try:
+            for service in tenant.services.values():
+                if hasattr(service, 'close'):
+                    service.close()
+            if tenant.store is not None:
+                tenant.store.close()
+            if tenant.processor is not None:
+                tenant.processor.close()
+        except Exception as e:
+            logger.error(f"Error closing tenant {tenant.id}: {str(e)}")
@@ -0,0 +1,866 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/text_index.py
+"""
+app/core/text_index.py
+Segmented on-disk inverted index of document passages with BM25 scoring.
+"""
+
+import os
+import re
+import json
+import time
+import fcntl
+import queue
+import threading
+import logging
+import numpy as np
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.core.domain_model import DomainStore
+from app.core import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Words, numbers and joined codes such as "ab-1234", "v2.1" or "iso/iec"
+TOKEN_PATTERN = re.compile(r"\w+(?:[./-]\w+)*")
+JOINERS = re.compile(r"[./-]")
+
+MANIFEST_FILE = 'manifest.json'
+# Held by the one process that writes an index directory
+LOCK_FILE = 'writer.lock'
+# Document changes seen by other processes, waiting for the writing process
+REQUESTS_DIR = 'requests'
+
+INDEXED_DOCUMENTS = metrics.registry.counter(
+    'text_index_documents_total', 'Documents added to text indexes')
+SEGMENT_MERGES = metrics.registry.counter(
+    'text_index_merges_total', 'Text index segment merges')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase index terms.
+
+    Joined codes are kept whole and also split into their parts, so
+    "AB-1234" matches queries for "ab-1234", "ab" and "1234".
+
+    Args:
+        text: Text to split
+
+    Returns:
+        Terms in order of occurrence
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        term = match.group()
+        terms.append(term)
+        if JOINERS.search(term):
+            terms.extend(part for part in JOINERS.split(term) if part)
+    return terms
+
+
+def split_passages(text: str, size: int = 800) -> List[Tuple[int, int]]:
+    """
+    Cut text into passages of about `size` characters, ending at whitespace.
+
+    Args:
+        text: Document text
+        size: Target passage length
+
+    Returns:
+        List of (start, end) character offsets
+    """
+    passages = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            cut = text.rfind(' ', start + size // 2, end)
+            cut = max(cut, text.rfind('\n', start + size // 2, end))
+            if cut > start:
+                end = cut
+        if text[start:end].strip():
+            passages.append((start, end))
+        start = end
+    return passages
+
+
+def hybrid_rank(lexical: Dict[str, float], semantic: Dict[str, float],
+                weight: float = 0.5) -> List[Tuple[str, float, float, float]]:
+    """
+    Combine BM25 and vector scores of the same items.
+
+    BM25 scores are divided by the best one so both lie in 0-1; an item
+    missing from one ranking scores 0 there.
+
+    Args:
+        lexical: BM25 score by item
+        semantic: Cosine similarity by item
+        weight: Share of the vector score in the combined score
+
+    Returns:
+        List of (item, combined, lexical, semantic), best first
+    """
+    best = max(lexical.values(), default=0.0)
+    ranked = []
+    for key in set(lexical) | set(semantic):
+        bm25 = lexical.get(key, 0.0) / best if best > 0 else 0.0
+        cosine = max(0.0, semantic.get(key, 0.0))
+        ranked.append((key, weight * cosine + (1 - weight) * bm25, lexical.get(key, 0.0), cosine))
+    ranked.sort(key=lambda item: -item[1])
+    return ranked
+
+
+def _open_texts(path: str, size: int) -> np.ndarray:
+    """Memory-map a segment's passage texts (an empty file cannot be mapped)."""
+    if size == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.load(path, mmap_mode='r')
+
+
+def _pack_terms(terms: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pack terms into one UTF-8 byte buffer and the offsets of each term.
+
+    A fixed-width string array would pad every term to the longest one.
+
+    Args:
+        terms: Terms, in the order kept
+
+    Returns:
+        Tuple of (bytes, offsets), with term i at offsets[i]:offsets[i + 1]
+    """
+    encoded = [term.encode() for term in terms]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(term) for term in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class Segment:
+    """
+    Immutable inverted index of a batch of passages.
+
+    Terms are kept sorted, packed as UTF-8 in term_data with term i at
+    term_offsets[i]:term_offsets[i + 1], and the postings of term i (passage
+    rows and term frequencies) at offsets[i]:offsets[i + 1]. Passage texts are kept
+    in a separate uncompressed file next to the segment, memory-mapped when
+    the segment is loaded, so reading them touches only the pages needed.
+    """
+
+    __slots__ = ('name', 'path', 'term_data', 'term_offsets', 'offsets', 'rows', 'freqs',
+                 'documents', 'starts', 'ends', 'lengths', 'live', 'text_data', 'text_offsets')
+
+    def __init__(self, name: str, path: str, arrays: Dict[str, np.ndarray],
+                 text_data: np.ndarray, text_offsets: np.ndarray):
+        self.name = name
+        self.path = path
+        self.text_data = text_data
+        self.text_offsets = text_offsets
+        self.term_data = arrays['term_data']
+        self.term_offsets = arrays['term_offsets']
+        self.offsets = arrays['offsets']
+        self.rows = arrays['rows']
+        self.freqs = arrays['freqs']
+        self.documents = arrays['documents']
+        self.starts = arrays['starts']
+        self.ends = arrays['ends']
+        self.lengths = arrays['lengths']
+        # Rows of documents not removed since the segment was written
+        self.live = np.ones(len(self.documents), dtype=bool)
+
+    @property
+    def size(self) -> int:
+        return len(self.documents)
+
+    @property
+    def term_count(self) -> int:
+        return len(self.term_offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.term_data, self.term_offsets, self.offsets, self.rows, self.freqs, self.documents,
+                  self.starts, self.ends, self.lengths, self.live, self.text_offsets)
+        # Memory-mapped texts are left to the page cache
+        text_bytes = 0 if isinstance(self.text_data, np.memmap) else self.text_data.nbytes
+        return sum(array.nbytes for array in arrays) + text_bytes
+
+    @staticmethod
+    def text_path(path: str) -> str:
+        """Get the file of a segment's passage texts."""
+        return path[:-len('.npz')] + '.text.npy'
+
+    @classmethod
+    def load(cls, name: str, path: str) -> 'Segment':
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files if key != 'text_data'}
+            # Segments written before texts had their own file
+            text_data = data['text_data'] if 'text_data' in data.files else None
+        text_offsets = arrays.pop('text_offsets')
+        if 'terms' in arrays:
+            # Segments written before terms were packed
+            arrays['term_data'], arrays['term_offsets'] = _pack_terms(arrays.pop('terms').tolist())
+        if text_data is None:
+            text_data = _open_texts(cls.text_path(path), int(text_offsets[-1]))
+        return cls(name, path, arrays, text_data, text_offsets)
+
+    @classmethod
+    def write(cls, name: str, path: str, terms: List[str], term_ids: np.ndarray, rows: np.ndarray,
+              freqs: np.ndarray, documents: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+              lengths: np.ndarray, texts: List[bytes]) -> 'Segment':
+        """
+        Sort postings by term, write them with the passages, and load the result.
+
+        Args:
+            name: Segment name
+            path: File to write
+            terms: Sorted vocabulary the term ids refer to
+            term_ids, rows, freqs: One entry per (term, passage) posting
+            documents, starts, ends, lengths: One entry per passage
+            texts: UTF-8 text of each passage
+
+        Returns:
+            The written segment
+        """
+        order = np.lexsort((rows, term_ids))
+        term_ids, rows, freqs = term_ids[order], rows[order], freqs[order]
+        used, counts = np.unique(term_ids, return_counts=True)
+        offsets = np.zeros(len(used) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        term_data, term_offsets = _pack_terms(terms[i] for i in used.tolist())
+        arrays = {
+            'term_data': term_data,
+            'term_offsets': term_offsets,
+            'offsets': offsets,
+            'rows': rows.astype(np.int32),
+            'freqs': freqs.astype(np.int32),
+            'documents': documents,
+            'starts': starts.astype(np.int64),
+            'ends': ends.astype(np.int64),
+            'lengths': lengths.astype(np.int32)
+        }
+        # Passage texts are packed into one byte buffer rather than a
+        # fixed-width string array, which would pad every passage
+        text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in texts], out=text_offsets[1:])
+        text_path = cls.text_path(path)
+        # The texts are in place before the segment file that refers to them
+        temp_path = f"{text_path}.{os.getpid()}.tmp.npy"
+        np.save(temp_path, np.frombuffer(b"".join(texts), dtype=np.uint8))
+        os.replace(temp_path, text_path)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temp_path, text_offsets=text_offsets, **arrays)
+        os.replace(temp_path, path)
+        return cls(name, path, arrays, _open_texts(text_path, int(text_offsets[-1])), text_offsets)
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the passage rows and term frequencies of a term."""
+        # UTF-8 byte order is code point order, the order terms were sorted in
+        key = term.encode()
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term_bytes(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.term_count or self._term_bytes(low) != key:
+            return self.rows[:0], self.freqs[:0]
+        i = low
+        return self.rows[self.offsets[i]:self.offsets[i + 1]], self.freqs[self.offsets[i]:self.offsets[i + 1]]
+
+    def terms(self) -> List[str]:
+        """Get the sorted vocabulary, for merging."""
+        data = self.term_data.tobytes()
+        bounds = self.term_offsets.tolist()
+        return [data[bounds[i]:bounds[i + 1]].decode() for i in range(self.term_count)]
+
+    def _term_bytes(self, i: int) -> bytes:
+        return self.term_data[self.term_offsets[i]:self.term_offsets[i + 1]].tobytes()
+
+    def texts(self, rows: Iterable[int]) -> List[bytes]:
+        """Read UTF-8 passage texts."""
+        return [self.text_data[self.text_offsets[row]:self.text_offsets[row + 1]].tobytes() for row in rows]
+
+    def remove(self):
+        """Delete the segment's files."""
+        for path in (self.path, self.text_path(self.path)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def expand(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the term index of every posting, for merging."""
+        return np.repeat(np.arange(self.term_count), np.diff(self.offsets)), self.rows
+
+
+class TextIndex:
+    """
+    BM25 index of the passages of a knowledge base's documents.
+
+    Documents are indexed in a background thread as they are attached to
+    domains (documents present before the index existed are queued when it
+    is opened). Each batch becomes a segment file; once there are more
+    than merge_factor segments the smallest ones are merged into one,
+    which also drops the postings of removed documents. Until then,
+    removed documents are only hidden from results, and still count
+    towards term statistics.
+
+    When several processes serve the same knowledge base (e.g. gunicorn
+    workers), the one holding the directory's lock file writes the index
+    and the others read it: they reload the manifest when it changes, and
+    leave the document changes they see as request files for the writer.
+    A reading process takes over if the writer's lock is released.
+    """
+
+    def __init__(self, directory: str, store: DomainStore, processor, merge_factor: int = 8,
+                 passage_size: int = 800, k1: float = 1.2, b: float = 0.75, refresh_interval: float = 2.0):
+        """
+        Open (or create) the index and start indexing.
+
+        Args:
+            directory: Directory of the segment files and manifest
+            store: Domain store whose documents are indexed
+            processor: Semantic processor extracting document text
+            merge_factor: Number of segments above which segments are merged
+            passage_size: Target passage length in characters
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            refresh_interval: Seconds between checks for other processes' changes
+        """
+        self.directory = directory
+        self.store = store
+        self.processor = processor
+        self.merge_factor = max(2, merge_factor)
+        self.passage_size = passage_size
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._segments: List[Segment] = []
+        # Indexed documents by id -> passage count, and removed ones still in segments
+        self._documents: Dict[str, int] = {}
+        self._deleted: set = set()
+        self._next_segment = 0
+        self._stats = (0, 1.0)
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self._worker: Optional[threading.Thread] = None
+        self._lock_file = None
+        self._manifest_mtime = None
+        self._last_refresh = time.monotonic()
+        self._refresh_lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        if self._acquire():
+            self._start_writing()
+        else:
+            logger.info(f"Text index {directory} is written by another process; reading it")
+            self._reload()
+        store.add_listener(self._on_change)
+
+    @property
+    def writer(self) -> bool:
+        """Whether this process writes the index."""
+        return self._lock_file is not None
+
+    def memory_usage(self) -> int:
+        """Memory held by the loaded segments, in bytes."""
+        return sum(segment.nbytes for segment in self._segments)
+
+    def status(self) -> Dict[str, Any]:
+        """Describe the index."""
+        self._refresh()
+        with self._lock:
+            return {
+                "writer": self.writer,
+                "documents": len(self._documents),
+                "passages": self._stats[0],
+                "segments": len(self._segments),
+                "pending": self._queue.qsize(),
+                "deleted": len(self._deleted)
+            }
+
+    def add_document(self, document_id: str, text: str):
+        """
+        Index a document's text as one new segment.
+
+        Args:
+            document_id: Document ID
+            text: Extracted document text
+        """
+        self.add_documents([(document_id, text)])
+
+    def add_documents(self, documents: List[Tuple[str, str]]):
+        """
+        Index a batch of documents as one new segment.
+
+        Args:
+            documents: List of (document_id, text) of documents not indexed yet
+        """
+        vocabulary: Dict[str, int] = {}
+        term_ids, rows, freqs = [], [], []
+        passages = []
+        counts = {}
+        for document_id, text in documents:
+            counts[document_id] = 0
+            for start, end in split_passages(text, self.passage_size):
+                terms = tokenize(text[start:end])
+                if not terms:
+                    continue
+                row = len(passages)
+                passages.append((document_id, start, end, len(terms), text[start:end].encode()))
+                for term, count in Counter(terms).items():
+                    term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                    rows.append(row)
+                    freqs.append(count)
+                counts[document_id] += 1
+
+        with self._lock:
+            segment = None
+            if passages:
+                terms = list(vocabulary)
+                # Term ids must follow the sorted vocabulary for binary search
+                order = sorted(range(len(terms)), key=terms.__getitem__)
+                rank = np.empty(len(terms), dtype=np.int64)
+                rank[order] = np.arange(len(terms))
+                name = self._new_segment_name()
+                segment = Segment.write(
+                    name, os.path.join(self.directory, name), [terms[i] for i in order],
+                    rank[np.array(term_ids, dtype=np.int64)], np.array(rows), np.array(freqs),
+                    np.array([passage[0] for passage in passages], dtype=str),
+                    np.array([passage[1] for passage in passages]),
+                    np.array([passage[2] for passage in passages]),
+                    np.array([passage[3] for passage in passages]),
+                    [passage[4] for passage in passages]
+                )
+                self._segments.append(segment)
+            self._documents.update(counts)
+            self._save_manifest()
+            self._update_stats()
+        INDEXED_DOCUMENTS.inc(len(documents))
+
+    def remove_document(self, document_id: str):
+        """Hide a document from results; its postings are dropped at the next merge."""
+        with self._lock:
+            if self._documents.pop(document_id, 0):
+                self._hide(document_id)
+                self._save_manifest()
+                self._update_stats()
+
+    def search(self, query: str, k: int = 10, documents: Optional[Iterable[str]] = None,
+               with_text: bool = False) -> List[Dict[str, Any]]:
+        """
+        Find the passages that best match a query.
+
+        Args:
+            query: Free-text query
+            k: Maximum number of passages
+            documents: Optional document IDs the results are restricted to
+            with_text: Whether to read the passage texts
+
+        Returns:
+            Passages with documentId, start, end, score (and text), best first
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        self._refresh()
+        with self._lock:
+            segments = list(self._segments)
+            passages, average_length = self._stats
+        if passages == 0:
+            return []
+        allowed = np.array(list(documents), dtype=str) if documents is not None else None
+
+        document_frequency = {term: 0 for term in terms}
+        for segment in segments:
+            for term in terms:
+                document_frequency[term] += len(segment.postings(term)[0])
+        idf = {term: float(np.log(1 + (passages - df + 0.5) / (df + 0.5)))
+               for term, df in document_frequency.items() if df}
+
+        candidates = []
+        for segment in segments:
+            scores = np.zeros(segment.size, dtype=np.float64)
+            norm = self.k1 * (1 - self.b + self.b * segment.lengths / average_length)
+            for term, weight in idf.items():
+                rows, freqs = segment.postings(term)
+                if len(rows):
+                    scores[rows] += weight * freqs * (self.k1 + 1) / (freqs + norm[rows])
+            mask = segment.live & (scores > 0)
+            if allowed is not None:
+                mask &= np.isin(segment.documents, allowed)
+            hits = np.flatnonzero(mask)
+            if len(hits) > k:
+                hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            candidates.extend((float(scores[row]), segment, int(row)) for row in hits)
+
+        candidates.sort(key=lambda candidate: -candidate[0])
+        results = []
+        for score, segment, row in candidates[:k]:
+            result = {"documentId": str(segment.documents[row]), "start": int(segment.starts[row]),
+                      "end": int(segment.ends[row]), "score": round(score, 4)}
+            if with_text:
+                result["text"] = segment.texts([row])[0].decode()
+            results.append(result)
+        return results
+
+    def score_documents(self, query: str, k: int = 50,
+                        documents: Optional[Iterable[str]] = None) -> Dict[str, Tuple[float, Dict[str, Any]]]:
+        """
+        Score documents by their best-matching passage.
+
+        Args:
+            query: Free-text query
+            k: Number of passages considered
+            documents: Optional document IDs the results are restricted to
+
+        Returns:
+            Dictionary of document_id -> (score, best passage)
+        """
+        scored: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        for passage in self.search(query, k, documents):
+            if passage["documentId"] not in scored:
+                scored[passage["documentId"]] = (passage["score"], passage)
+        return scored
+
+    def best_passages(self, document_id: str, query: str, max_chars: int) -> Optional[List[str]]:
+        """
+        Get the passages of a document that best match a query, in document order.
+
+        Args:
+            document_id: Document ID
+            query: Free-text query
+            max_chars: Total length of the passages returned
+
+        Returns:
+            Passage texts, or None if the document is not indexed or nothing matches
+        """
+        limit = max(1, max_chars // max(1, self.passage_size // 2))
+        passages = self.search(query, limit, [document_id], with_text=True)
+        if not passages:
+            return None
+        chosen = []
+        total = 0
+        for passage in passages:
+            if total + len(passage["text"]) > max_chars and chosen:
+                break
+            chosen.append(passage)
+            total += len(passage["text"])
+        chosen.sort(key=lambda passage: passage["start"])
+        return [passage["text"] for passage in chosen]
+
+    def merge(self, count: Optional[int] = None) -> bool:
+        """
+        Merge the smallest segments into one, dropping removed documents.
+
+        Args:
+            count: Number of segments merged (all of them when None)
+
+        Returns:
+            Whether segments were merged
+        """
+        with self._lock:
+            selected = sorted(self._segments, key=lambda segment: segment.size)
+            selected = selected[:count] if count else selected
+            if len(selected) < 2 and not (selected and not selected[0].live.all()):
+                return False
+
+        segment_terms = [segment.terms() for segment in selected]
+        vocabulary = sorted(set().union(*segment_terms))
+        term_index = {term: i for i, term in enumerate(vocabulary)}
+        term_ids, rows, freqs = [], [], []
+        passage_arrays: Dict[str, List[np.ndarray]] = {key: [] for key in ('documents', 'starts', 'ends', 'lengths')}
+        texts: List[bytes] = []
+        base = 0
+        with self._lock:
+            live = [segment.live.copy() for segment in selected]
+        for segment, terms, keep in zip(selected, segment_terms, live):
+            # New row of each live passage, -1 for removed ones
+            remap = np.full(segment.size, -1, dtype=np.int64)
+            remap[keep] = base + np.arange(int(keep.sum()))
+            posting_terms, posting_rows = segment.expand()
+            new_rows = remap[posting_rows]
+            valid = new_rows >= 0
+            inverse = np.array([term_index[term] for term in terms], dtype=np.int64)
+            term_ids.append(inverse[posting_terms[valid]])
+            rows.append(new_rows[valid])
+            freqs.append(segment.freqs[valid])
+            for key in ('documents', 'starts', 'ends', 'lengths'):
+                passage_arrays[key].append(getattr(segment, key)[keep])
+            texts.extend(segment.texts(np.flatnonzero(keep)))
+            base += int(keep.sum())
+
+        with self._lock:
+            name = self._new_segment_name()
+            merged = Segment.write(
+                name, os.path.join(self.directory, name), vocabulary,
+                np.concatenate(term_ids), np.concatenate(rows), np.concatenate(freqs),
+                *(np.concatenate(passage_arrays[key]) for key in ('documents', 'starts', 'ends', 'lengths')), texts
+            )
+            # Documents removed while merging
+            merged.live &= ~np.isin(merged.documents, list(self._deleted))
+            names = {segment.name for segment in selected}
+            self._segments = [segment for segment in self._segments if segment.name not in names] + [merged]
+            remaining = set()
+            for segment in self._segments:
+                remaining.update(segment.documents[~segment.live].tolist())
+            self._deleted &= remaining
+            self._save_manifest()
+            self._update_stats()
+        for segment in selected:
+            segment.remove()
+        SEGMENT_MERGES.inc()
+        logger.info(f"Merged {len(selected)} text index segments into {name} ({merged.size} passages)")
+        return True
+
+    def flush(self):
+        """Wait until queued documents are indexed (for tests and benchmarks)."""
+        self._queue.join()
+
+    def close(self):
+        """Stop indexing and release the index to other processes."""
+        self.store.remove_listener(self._on_change)
+        self._closed = True
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join(timeout=10)
+        self._release()
+
+    def _on_change(self, event: Dict[str, Any]):
+        """Follow document changes of the store."""
+        if event["type"] == "document.attached":
+            document = event["document"]
+            self._submit(document["id"], document["path"])
+        elif event["type"] == "document.detached":
+            self._submit(event["documentId"], None)
+        elif event["type"] == "domain.deleted":
+            # The documents of the deleted subtree are not listed in the event
+            if self.writer:
+                self._queue.put((None, None))
+            else:
+                self._refresh(force=True)
+                for stale in set(self._documents) - set(self.store.document_index):
+                    self._submit(stale, None)
+
+    def _submit(self, document_id: str, path: Optional[str]):
+        """Index or remove a document here, or ask the writing process to."""
+        if self.writer:
+            self._queue.put((document_id, path))
+            return
+        # The latest change of a document replaces any earlier request
+        requests_dir = os.path.join(self.directory, REQUESTS_DIR)
+        try:
+            os.makedirs(requests_dir, exist_ok=True)
+            request_path = os.path.join(requests_dir, f"{document_id}.json")
+            temp_path = f"{request_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({"id": document_id, "path": path}, f)
+            os.replace(temp_path, request_path)
+        except Exception as e:
+            logger.error(f"Error handing document {document_id} to the text index writer: {str(e)}")
+
+    def _collect_requests(self):
+        """Queue the document changes other processes left for the writer."""
+        requests_dir = os.path.join(self.directory, REQUESTS_DIR)
+        try:
+            filenames = [name for name in os.listdir(requests_dir) if name.endswith('.json')]
+        except FileNotFoundError:
+            return
+        for filename in filenames:
+            # Claimed by renaming, so a newer request for the document is kept for the next pass
+            request_path = os.path.join(requests_dir, filename)
+            claimed_path = f"{request_path}.{os.getpid()}.claimed"
+            try:
+                os.replace(request_path, claimed_path)
+                with open(claimed_path) as f:
+                    request = json.load(f)
+                os.remove(claimed_path)
+                if request["path"] is None:
+                    self._queue.put((request["id"], None))
+                elif request["id"] not in self._documents:
+                    self._queue.put((request["id"], request["path"]))
+            except Exception as e:
+                logger.error(f"Error reading text index request {filename}: {str(e)}")
+
+    def _acquire(self) -> bool:
+        """Take the writer lock file of the index directory."""
+        lock_file = open(os.path.join(self.directory, LOCK_FILE), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _release(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _start_writing(self):
+        """Load the index as its writer and start indexing missing documents."""
+        with self._lock:
+            self._load()
+        self._worker = threading.Thread(target=self._run, name="text-index", daemon=True)
+        self._worker.start()
+        for document in list(self.store.document_index.values()):
+            if document.id not in self._documents:
+                self._queue.put((document.id, document.path))
+        self._collect_requests()
+
+    def _refresh(self, force: bool = False):
+        """In a reading process, pick up the writer's changes, or take over if the writer stopped."""
+        if self.writer or self._closed:
+            return
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        if not self._refresh_lock.acquire(blocking=force):
+            return
+        try:
+            self._last_refresh = time.monotonic()
+            if self._acquire():
+                logger.info(f"Taking over writing text index {self.directory}")
+                self._start_writing()
+            else:
+                self._reload()
+        finally:
+            self._refresh_lock.release()
+
+    def _reload(self):
+        """Load the manifest written by another process, keeping the segments already loaded."""
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if mtime == self._manifest_mtime:
+                return
+            with open(path, 'r') as f:
+                manifest = json.load(f)
+            loaded = {segment.name: segment for segment in self._segments}
+            segments = [loaded.get(name) or Segment.load(name, os.path.join(self.directory, name))
+                        for name in manifest.get("segments", [])]
+        except FileNotFoundError:
+            # Nothing written yet, or a merge replaced segments since the manifest was read
+            return
+        except Exception as e:
+            logger.error(f"Error reloading text index manifest: {str(e)}")
+            return
+        deleted = set(manifest.get("deleted", []))
+        for segment in segments:
+            segment.live = ~np.isin(segment.documents, list(deleted))
+        with self._lock:
+            self._segments = segments
+            self._documents = manifest.get("documents", {})
+            self._deleted = deleted
+            self._next_segment = manifest.get("next", 0)
+            self._update_stats()
+        self._manifest_mtime = mtime
+
+    def _run(self):
+        """Index queued documents in batches."""
+        while True:
+            try:
+                item = self._queue.get(timeout=self.refresh_interval)
+            except queue.Empty:
+                self._collect_requests()
+                continue
+            batch = [item]
+            while item is not None and len(batch) < 64:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            try:
+                additions = []
+                for entry in batch:
+                    if entry is None:
+                        continue
+                    document_id, path = entry
+                    if document_id is None:
+                        for stale in set(self._documents) - set(self.store.document_index):
+                            self.remove_document(stale)
+                    elif path is None:
+                        self.remove_document(document_id)
+                    elif document_id not in self._documents and document_id not in dict(additions):
+                        additions.append((document_id, self.processor.get_document_text(path)))
+                if additions:
+                    self.add_documents(additions)
+                while len(self._segments) > self.merge_factor and not self._closed:
+                    self.merge(self.merge_factor)
+            except Exception as e:
+                logger.error(f"Error indexing documents: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if None in batch or self._closed:
+                return
+
+    def _hide(self, document_id: str):
+        for segment in self._segments:
+            segment.live &= segment.documents != document_id
+        self._deleted.add(document_id)
+
+    def _new_segment_name(self) -> str:
+        self._next_segment += 1
+        return f"segment-{self._next_segment:06d}.npz"
+
+    def _update_stats(self):
+        """Recompute the live passage count and average passage length."""
+        count = sum(int(segment.live.sum()) for segment in self._segments)
+        length = sum(int(segment.lengths[segment.live].sum()) for segment in self._segments)
+        self._stats = (count, length / count if count else 1.0)
+
+    def _save_manifest(self):
+        """Record the segments and documents, atomically replacing the manifest."""
+        manifest = {
+            "segments": [segment.name for segment in self._segments],
+            "next": self._next_segment,
+            "documents": self._documents,
+            "deleted": sorted(self._deleted)
+        }
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, path)
+
+    def _load(self):
+        """Load the segments listed in the manifest and remove any others."""
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(os.path.join(self.directory, MANIFEST_FILE), 'r') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        except Exception as e:
+            logger.error(f"Error reading text index manifest, rebuilding: {str(e)}")
+            manifest = {}
+
+        names = manifest.get("segments", [])
+        try:
+            self._segments = [Segment.load(name, os.path.join(self.directory, name)) for name in names]
+            self._documents = manifest.get("documents", {})
+            self._deleted = set(manifest.get("deleted", []))
+            self._next_segment = manifest.get("next", 0)
+        except Exception as e:
+            logger.error(f"Error loading text index segments, rebuilding: {str(e)}")
+            self._segments, self._documents, self._deleted = [], {}, set()
+            names = []
+        deleted = list(self._deleted)
+        for segment in self._segments:
+            segment.live &= ~np.isin(segment.documents, deleted)
+
+        # Segments left behind by an interrupted merge or write
+        keep = set(names) | {Segment.text_path(name) for name in names}
+        for filename in os.listdir(self.directory):
+            if filename.endswith(('.npz', '.npy')) and filename not in keep:
+                os.remove(os.path.join(self.directory, filename))
+        self._update_stats()
+        if self._segments:
+            logger.info(f"Loaded text index of {len(self._documents)} documents in {len(self._segments)} segments")
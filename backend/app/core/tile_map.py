@@ -0,0 +1,346 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/tile_map.py
+"""
+app/core/tile_map.py
+Whole-tree map: nested Voronoi tiles for every domain, indexed per level of detail.
+"""
+
+import math
+import time
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.domain_model import DomainStore
+from app.core.voronoi import DEFAULT_BBOX, Polygon, compute_cells
+from app.core import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Map coordinates: the 800 x 600 level canvas at 128x magnification, so
+# deeply nested tiles keep sub-unit detail at one decimal place
+WORLD_BBOX = (0.0, 0.0, 102400.0, 76800.0)
+
+# Largest spatial grid per level of detail (cells per side)
+MAX_GRID = 256
+
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+MAP_BUILD_LATENCY = metrics.registry.histogram(
+    'tile_map_build_duration_seconds', 'Time to lay out the whole-tree map')
+
+
+class Tile:
+    """One domain's cell in the whole-tree map."""
+
+    __slots__ = ('id', 'name', 'parent_id', 'depth', 'polygon', 'site', 'bbox', 'child_count', 'document_count')
+
+    def __init__(self, id: str, name: str, parent_id: Optional[str], depth: int, polygon: List[List[float]],
+                 site: Tuple[float, float], child_count: int, document_count: int):
+        self.id = id
+        self.name = name
+        self.parent_id = parent_id
+        self.depth = depth
+        self.polygon = polygon
+        self.site = site
+        xs = [x for x, _ in polygon] or [site[0]]
+        ys = [y for _, y in polygon] or [site[1]]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+        self.child_count = child_count
+        self.document_count = document_count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "parentId": self.parent_id,
+            "depth": self.depth,
+            "polygon": self.polygon,
+            "site": [round(self.site[0], 1), round(self.site[1], 1)],
+            "childCount": self.child_count,
+            "documentCount": self.document_count
+        }
+
+
+class Pyramid:
+    """Tiles of one build, with a uniform grid index per depth."""
+
+    def __init__(self, revision: int, tiles: List[Tile], world: Tuple[float, float, float, float]):
+        self.revision = revision
+        self.tiles = tiles
+        self.world = world
+        self.depth = max((tile.depth for tile in tiles), default=-1) + 1
+        # depth -> (grid size, (column, row) -> tile positions)
+        self.grids: List[Tuple[int, Dict[Tuple[int, int], List[int]]]] = []
+        counts = [0] * self.depth
+        for tile in tiles:
+            counts[tile.depth] += 1
+        for count in counts:
+            # About one tile per bucket when tiles are spread evenly
+            size = max(1, min(MAX_GRID, int(math.sqrt(count))))
+            self.grids.append((size, {}))
+        for position, tile in enumerate(tiles):
+            size, buckets = self.grids[tile.depth]
+            c0, r0, c1, r1 = self._cell_range(tile.bbox, size)
+            for column in range(c0, c1 + 1):
+                for row in range(r0, r1 + 1):
+                    buckets.setdefault((column, row), []).append(position)
+
+    def nbytes(self) -> int:
+        vertices = sum(len(tile.polygon) for tile in self.tiles)
+        return len(self.tiles) * 400 + vertices * 120
+
+    def query(self, bbox: Tuple[float, float, float, float], depth: int) -> List[Tile]:
+        """Tiles at a depth overlapping a box."""
+        if depth < 0 or depth >= self.depth:
+            return []
+        size, buckets = self.grids[depth]
+        c0, r0, c1, r1 = self._cell_range(bbox, size)
+        seen = set()
+        found = []
+        x0, y0, x1, y1 = bbox
+        for column in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                for position in buckets.get((column, row), ()):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    tile = self.tiles[position]
+                    tx0, ty0, tx1, ty1 = tile.bbox
+                    if tx0 <= x1 and tx1 >= x0 and ty0 <= y1 and ty1 >= y0:
+                        found.append(tile)
+        return found
+
+    def _cell_range(self, bbox: Tuple[float, float, float, float], size: int) -> Tuple[int, int, int, int]:
+        wx0, wy0, wx1, wy1 = self.world
+        width, height = (wx1 - wx0) / size, (wy1 - wy0) / size
+
+        def clamp(value):
+            return max(0, min(size - 1, int(value)))
+        return (clamp((bbox[0] - wx0) / width), clamp((bbox[1] - wy0) / height),
+                clamp((bbox[2] - wx0) / width), clamp((bbox[3] - wy0) / height))
+
+
+class TileMap:
+    """
+    Lays out the whole domain tree as nested Voronoi tiles in a background thread.
+
+    The top level fills the world box; each domain's children are tiled
+    inside the domain's own cell, placed from their stored level positions.
+    Each depth is one level of detail with its own grid index, so a viewport
+    query only touches the tiles around the view. When the store changes,
+    queries keep being served from the previous build while a new one runs.
+    """
+
+    def __init__(self, store: DomainStore, world: Tuple[float, float, float, float] = WORLD_BBOX,
+                 max_cells: int = 5000):
+        """
+        Initialize the map.
+
+        Args:
+            store: Domain store to lay out
+            world: Map coordinate box (x0, y0, x1, y1)
+            max_cells: Maximum tiles returned by one viewport query
+        """
+        self.store = store
+        self.world = world
+        self.max_cells = max_cells
+        self.pyramid: Optional[Pyramid] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._last_build: Dict[str, Any] = {}
+        self._error: Optional[str] = None
+
+    def memory_usage(self) -> int:
+        """Approximate memory held by the current build, in bytes."""
+        pyramid = self.pyramid
+        return pyramid.nbytes() if pyramid is not None else 0
+
+    @property
+    def building(self) -> bool:
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    @property
+    def stale(self) -> bool:
+        pyramid = self.pyramid
+        return pyramid is None or pyramid.revision != self.store.revision
+
+    def status(self) -> Dict[str, Any]:
+        """Describe the current build and any build in progress."""
+        pyramid = self.pyramid
+        return {
+            "ready": pyramid is not None,
+            "building": self.building,
+            "stale": self.stale,
+            "revision": pyramid.revision if pyramid is not None else None,
+            "storeRevision": self.store.revision,
+            "tiles": len(pyramid.tiles) if pyramid is not None else 0,
+            "levels": pyramid.depth if pyramid is not None else 0,
+            "world": list(self.world),
+            "lastBuild": self._last_build,
+            "error": self._error
+        }
+
+    def rebuild(self, wait: bool = False) -> bool:
+        """
+        Start a background build unless one is already running.
+
+        Args:
+            wait: Block until the build has finished
+
+        Returns:
+            Whether a new build was started
+        """
+        with self._lock:
+            started = not self.building
+            if started:
+                self._thread = threading.Thread(target=self._run_build, name="tile-map-build", daemon=True)
+                self._thread.start()
+            thread = self._thread
+        if wait:
+            thread.join()
+        return started
+
+    def ensure_current(self):
+        """Start a rebuild if the store changed since the last build."""
+        if self.stale and not self.building:
+            self.rebuild()
+
+    def viewport(self, bbox: Tuple[float, float, float, float], zoom: int,
+                 limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the tiles visible in a viewport.
+
+        The view shows the tiles at depth `zoom`, plus the leaf tiles of
+        shallower depths, so it is covered without gaps.
+
+        Args:
+            bbox: Visible box in map coordinates (x0, y0, x1, y1)
+            zoom: Level of detail, i.e. tree depth (0 is the top level)
+            limit: Maximum number of tiles (defaults to max_cells)
+
+        Returns:
+            Viewport tiles, or None if no build has finished yet
+        """
+        self.ensure_current()
+        pyramid = self.pyramid
+        if pyramid is None:
+            return None
+        limit = min(limit or self.max_cells, self.max_cells)
+        zoom = max(0, min(zoom, pyramid.depth - 1))
+
+        tiles = []
+        for depth in range(zoom + 1):
+            tiles.extend(tile for tile in pyramid.query(bbox, depth)
+                         if depth == zoom or tile.child_count == 0)
+        truncated = len(tiles) > limit
+        if truncated:
+            # Keep the biggest tiles; they matter most for the picture
+            tiles.sort(key=lambda tile: (tile.bbox[2] - tile.bbox[0]) * (tile.bbox[3] - tile.bbox[1]), reverse=True)
+            tiles = tiles[:limit]
+        return {
+            "revision": pyramid.revision,
+            "stale": pyramid.revision != self.store.revision,
+            "zoom": zoom,
+            "levels": pyramid.depth,
+            "bbox": list(bbox),
+            "cells": [tile.to_dict() for tile in tiles],
+            "truncated": truncated
+        }
+
+    def build(self) -> Pyramid:
+        """
+        Lay out the whole tree.
+
+        Returns:
+            The new pyramid (also installed as the current one)
+        """
+        start = time.perf_counter()
+        with MAP_BUILD_LATENCY.time():
+            revision, root_ids, records = self.store.hierarchy_snapshot()
+            x0, y0, x1, y1 = self.world
+            tiles: List[Tile] = []
+            world = [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+            stack: List[Tuple[Optional[str], List[str], Polygon, int]] = [(None, root_ids, world, 0)]
+            while stack:
+                parent_id, child_ids, boundary, depth = stack.pop()
+                child_ids = [child_id for child_id in child_ids if child_id in records]
+                if not child_ids or len(boundary) < 3:
+                    continue
+                sites = self._place(child_ids, records, boundary)
+                polygons = compute_cells(sites, boundary=boundary)
+                for child_id, site, polygon in zip(child_ids, sites, polygons):
+                    name, _, grandchildren, _, _, document_count = records[child_id]
+                    tiles.append(Tile(child_id, name, parent_id, depth, polygon, site,
+                                      len(grandchildren), document_count))
+                    if grandchildren and polygon:
+                        stack.append((child_id, list(grandchildren), [tuple(v) for v in polygon], depth + 1))
+            pyramid = Pyramid(revision, tiles, self.world)
+        self.pyramid = pyramid
+        self._last_build = {
+            "revision": revision,
+            "tiles": len(tiles),
+            "durationMs": round((time.perf_counter() - start) * 1000, 1),
+            "finishedAt": time.time()
+        }
+        logger.info(f"Built tile map of {len(tiles)} tiles in {pyramid.depth} levels "
+                    f"in {self._last_build['durationMs']} ms")
+        return pyramid
+
+    def _run_build(self):
+        try:
+            self.build()
+            self._error = None
+        except Exception as e:
+            logger.error(f"Error building tile map: {str(e)}")
+            self._error = str(e)
+
+    def _place(self, child_ids: List[str], records: Dict[str, Tuple], boundary: Polygon) -> List[Tuple[float, float]]:
+        """
+        Place a level's domains inside their parent's cell.
+
+        Stored level positions (on the 800 x 600 canvas) are scaled into the
+        cell's bounding box and pulled towards its centroid until inside;
+        domains without a position are spread on a sunflower spiral.
+        """
+        xs = [x for x, _ in boundary]
+        ys = [y for _, y in boundary]
+        bx0, by0, bx1, by1 = min(xs), min(ys), max(xs), max(ys)
+        cx, cy = sum(xs) / len(xs), sum(ys) / len(ys)
+        canvas_x0, canvas_y0, canvas_x1, canvas_y1 = DEFAULT_BBOX
+        radius = min(bx1 - bx0, by1 - by0) / 2
+
+        sites = []
+        for index, child_id in enumerate(child_ids):
+            _, _, _, x, y, _ = records[child_id]
+            if isinstance(x, (int, float)) and isinstance(y, (int, float)) and x and y:
+                px = bx0 + (x - canvas_x0) / (canvas_x1 - canvas_x0) * (bx1 - bx0)
+                py = by0 + (y - canvas_y0) / (canvas_y1 - canvas_y0) * (by1 - by0)
+            else:
+                distance = radius * 0.9 * math.sqrt((index + 0.5) / len(child_ids))
+                px = cx + distance * math.cos(index * GOLDEN_ANGLE)
+                py = cy + distance * math.sin(index * GOLDEN_ANGLE)
+            for _ in range(30):
+                if _contains(boundary, px, py):
+                    break
+                px, py = (px + cx) / 2, (py + cy) / 2
+            sites.append((px, py))
+        return sites
+
+
+def _contains(polygon: Polygon, x: float, y: float) -> bool:
+    """Whether a point lies inside a convex polygon of either orientation."""
+    sign = 0
+    count = len(polygon)
+    for i in range(count):
+        ax, ay = polygon[i]
+        bx, by = polygon[(i + 1) % count]
+        cross = (bx - ax) * (y - ay) - (by - ay) * (x - ax)
+        if cross == 0:
+            continue
+        if sign == 0:
+            sign = 1 if cross > 0 else -1
+        elif (cross > 0) != (sign > 0):
+            return False
+    return True
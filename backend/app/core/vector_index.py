@@ -0,0 +1,312 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/vector_index.py
+"""
+app/core/vector_index.py
+Cosine-similarity vector index: exact search while small, inverted-file (IVF) search once large.
+"""
+
+import math
+import threading
+import logging
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from app.core.clustering import kmeans
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """
+    Stores unit-length vectors by key and finds the most similar ones.
+
+    Below train_threshold vectors every search is an exact matrix-vector
+    product. Above it the vectors are partitioned with k-means into about
+    sqrt(n) lists, and a search only scores the lists whose centroids are
+    closest to the query (nprobe of them). The partition is retrained when
+    the index has grown fourfold since the last training.
+    """
+
+    def __init__(self, dimension: int, nprobe: int = 8, train_threshold: int = 4096,
+                 exact_limit: int = 4096, initial_capacity: int = 256):
+        """
+        Initialize the index.
+
+        Args:
+            dimension: Vector length
+            nprobe: Number of lists scored per search once partitioned
+            train_threshold: Vector count at which the index is partitioned
+            exact_limit: Candidate-set size up to which filtered searches are exact
+            initial_capacity: Number of rows allocated up front
+        """
+        self.dimension = dimension
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.exact_limit = exact_limit
+        self.index: Dict[str, int] = {}
+        self._keys: List[Optional[str]] = []
+        self._free_rows: List[int] = []
+        self._vectors = np.zeros((max(1, initial_capacity), dimension), dtype=np.float32)
+        self._lock = threading.RLock()
+
+        # IVF state: centroids and the rows assigned to each list
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[Set[int]] = []
+        self._row_list: Dict[int, int] = {}
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the vector and centroid arrays, in bytes."""
+        centroids = self._centroids.nbytes if self._centroids is not None else 0
+        return self._vectors.nbytes + centroids
+
+    @property
+    def partitioned(self) -> bool:
+        """Whether searches use the inverted lists."""
+        return self._centroids is not None
+
+    def add(self, key: str, vector: np.ndarray):
+        """
+        Add or replace the vector of a key.
+
+        Args:
+            key: Item key
+            vector: Item vector; it is normalized to unit length
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            row = self.index.get(key)
+            if row is None:
+                row = self._allocate_row()
+                self.index[key] = row
+                self._keys[row] = key
+            else:
+                self._unassign(row)
+            self._vectors[row] = vector
+            if self._centroids is not None:
+                self._assign(row)
+            self._maybe_train()
+
+    def add_many(self, keys: List[str], vectors: np.ndarray):
+        """
+        Add or replace the vectors of many keys, partitioning at most once.
+
+        Args:
+            keys: Item keys
+            vectors: One vector per key, as rows; they are normalized to unit length
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), -1)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected vectors of length {self.dimension}, got shape {vectors.shape}")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+        with self._lock:
+            rows = []
+            for key in keys:
+                row = self.index.get(key)
+                if row is None:
+                    row = self._allocate_row()
+                    self.index[key] = row
+                    self._keys[row] = key
+                else:
+                    self._unassign(row)
+                rows.append(row)
+            self._vectors[rows] = vectors
+            if self._centroids is not None:
+                for row in rows:
+                    self._assign(row)
+            self._maybe_train()
+
+    def remove(self, key: str) -> bool:
+        """
+        Remove a key.
+
+        Args:
+            key: Item key
+
+        Returns:
+            Whether the key was indexed
+        """
+        with self._lock:
+            row = self.index.pop(key, None)
+            if row is None:
+                return False
+            self._unassign(row)
+            self._vectors[row] = 0
+            self._keys[row] = None
+            self._free_rows.append(row)
+            return True
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Get a copy of the unit-length vector of a key, or None if it is not indexed."""
+        with self._lock:
+            row = self.index.get(key)
+            return self._vectors[row].copy() if row is not None else None
+
+    def nearest_neighbors(self, k: int, nprobe: Optional[int] = None,
+                          block: int = 1024) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        Find the k most similar other vectors of every indexed vector at once.
+
+        Queries are batched into matrix products: in blocks against every
+        vector while the index is exact, and one inverted list at a time
+        against the lists nearest to its centroid once partitioned.
+
+        Args:
+            k: Number of neighbours per vector
+            nprobe: Number of lists each list is compared with once
+                partitioned (defaults to the index's nprobe)
+            block: Number of query vectors per matrix product
+
+        Returns:
+            Tuple of (keys, neighbours, similarities): neighbours[i] holds the
+            positions in keys of the neighbours of keys[i], most similar first,
+            padded with -1 (and similarity -inf) when there are fewer candidates
+        """
+        with self._lock:
+            rows = np.array(list(self.index.values()), dtype=np.int64)
+            keys = [self._keys[row] for row in rows]
+            vectors = self._vectors[rows]
+            position = {int(row): i for i, row in enumerate(rows)}
+            groups: List[Tuple[np.ndarray, np.ndarray]] = []
+            if self._centroids is None:
+                everything = np.arange(len(rows))
+                groups = [(everything[start:start + block], everything)
+                          for start in range(0, len(rows), block)]
+            else:
+                for label, members in enumerate(self._lists):
+                    if not members:
+                        continue
+                    closest = np.argsort(-(self._centroids @ self._centroids[label]))[:nprobe or self.nprobe]
+                    candidates = np.array([position[row] for other in closest for row in self._lists[other]],
+                                          dtype=np.int64)
+                    members = np.array([position[row] for row in members], dtype=np.int64)
+                    for start in range(0, len(members), block):
+                        groups.append((members[start:start + block], candidates))
+
+        neighbors = np.full((len(rows), k), -1, dtype=np.int32)
+        scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+        for queries, candidates in groups:
+            similarities = vectors[queries] @ vectors[candidates].T
+            # A vector is not its own neighbour
+            similarities[queries[:, None] == candidates[None, :]] = -np.inf
+            count = min(k, len(candidates))
+            if count == 0:
+                continue
+            top = np.argpartition(-similarities, count - 1, axis=1)[:, :count]
+            top_scores = np.take_along_axis(similarities, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            neighbors[queries, :count] = np.where(np.isfinite(top_scores), candidates[top], -1)
+            scores[queries, :count] = top_scores
+        return keys, neighbors, scores
+
+    def search(self, vector: np.ndarray, k: int = 10, allowed: Optional[Iterable[str]] = None,
+               min_score: float = -1.0, accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """
+        Find the most similar indexed vectors.
+
+        Args:
+            vector: Query vector
+            k: Maximum number of results
+            allowed: Optional keys the results are restricted to
+            min_score: Minimum cosine similarity of a result
+            accept: Optional predicate a key must satisfy, checked only for
+                candidates above min_score
+
+        Returns:
+            List of (key, similarity), most similar first
+        """
+        query = self._normalize(vector)
+        allowed_set = set(allowed) if allowed is not None else None
+        with self._lock:
+            if allowed_set is not None and len(allowed_set) <= self.exact_limit:
+                # Few candidates: score exactly those
+                rows = np.array([self.index[key] for key in allowed_set if key in self.index], dtype=np.int64)
+            elif self._centroids is not None:
+                rows = self._probe_rows(query)
+            else:
+                rows = np.array(list(self.index.values()), dtype=np.int64)
+
+            if len(rows) == 0:
+                return []
+            scores = self._vectors[rows] @ query
+            order = np.argsort(-scores)
+            results = []
+            for position in order:
+                score = float(scores[position])
+                if score < min_score or len(results) >= k:
+                    break
+                key = self._keys[rows[position]]
+                if (allowed_set is None or key in allowed_set) and (accept is None or accept(key)):
+                    results.append((key, score))
+            return results
+
+    def _normalize(self, vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if vector.shape != (self.dimension,):
+            raise ValueError(f"Expected a vector of length {self.dimension}, got shape {vector.shape}")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _allocate_row(self) -> int:
+        """Get a free row, growing the array geometrically when full."""
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = len(self._keys)
+        if row == len(self._vectors):
+            vectors = np.zeros((len(self._vectors) * 2, self.dimension), dtype=np.float32)
+            vectors[:row] = self._vectors[:row]
+            self._vectors = vectors
+        self._keys.append(None)
+        return row
+
+    def _maybe_train(self):
+        size = len(self.index)
+        if size < self.train_threshold:
+            return
+        if self._centroids is not None and size < self._trained_size * 4:
+            return
+        self._train()
+
+    def _train(self):
+        """Partition the stored vectors into about sqrt(n) inverted lists."""
+        rows = np.array(list(self.index.values()), dtype=np.int64)
+        nlist = max(1, int(math.sqrt(len(rows))))
+        # Training on a sample keeps retraining cheap for large indexes
+        sample = rows if len(rows) <= nlist * 64 else np.random.default_rng(0).choice(rows, nlist * 64, replace=False)
+        _, centroids = kmeans(self._vectors[sample], nlist, iterations=20)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self._centroids = np.divide(centroids, norms, out=np.zeros_like(centroids), where=norms > 0)
+
+        labels = np.argmax(self._vectors[rows] @ self._centroids.T, axis=1)
+        self._lists = [set() for _ in range(len(self._centroids))]
+        self._row_list = {}
+        for row, label in zip(rows.tolist(), labels.tolist()):
+            self._lists[label].add(row)
+            self._row_list[row] = label
+        self._trained_size = len(rows)
+        logger.info(f"Partitioned vector index of {len(rows)} vectors into {len(self._lists)} lists")
+
+    def _assign(self, row: int):
+        label = int(np.argmax(self._centroids @ self._vectors[row]))
+        self._lists[label].add(row)
+        self._row_list[row] = label
+
+    def _unassign(self, row: int):
+        label = self._row_list.pop(row, None)
+        if label is not None:
+            self._lists[label].discard(row)
+
+    def _probe_rows(self, query: np.ndarray) -> np.ndarray:
+        closest = np.argsort(-(self._centroids @ query))[:self.nprobe]
+        rows = [row for label in closest for row in self._lists[label]]
+        return np.array(rows, dtype=np.int64)
@@ -0,0 +1,275 @@
+# /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/backend/app/core/voronoi.py
+"""
+app/core/voronoi.py
+Voronoi cells of a level's domain positions, clipped to the diagram area.
+"""
+
+import threading
+import logging
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Diagram area (x0, y0, x1, y1); the frontend draws levels on an 800 x 600 canvas
+DEFAULT_BBOX = (0.0, 0.0, 800.0, 600.0)
+
+Polygon = List[Tuple[float, float]]
+
+
+def _circumcircles(points: np.ndarray, triangles: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Circumcenters and squared radii of triangles (degenerate ones get radius 0)."""
+    a, b, c = points[triangles[:, 0]], points[triangles[:, 1]], points[triangles[:, 2]]
+    d = 2 * (a[:, 0] * (b[:, 1] - c[:, 1]) + b[:, 0] * (c[:, 1] - a[:, 1]) + c[:, 0] * (a[:, 1] - b[:, 1]))
+    a2, b2, c2 = (a ** 2).sum(axis=1), (b ** 2).sum(axis=1), (c ** 2).sum(axis=1)
+    degenerate = np.abs(d) < 1e-12
+    d = np.where(degenerate, 1.0, d)
+    ux = (a2 * (b[:, 1] - c[:, 1]) + b2 * (c[:, 1] - a[:, 1]) + c2 * (a[:, 1] - b[:, 1])) / d
+    uy = (a2 * (c[:, 0] - b[:, 0]) + b2 * (a[:, 0] - c[:, 0]) + c2 * (b[:, 0] - a[:, 0])) / d
+    centers = np.stack([ux, uy], axis=1)
+    radii = np.where(degenerate, 0.0, ((a - centers) ** 2).sum(axis=1))
+    return centers, radii
+
+
+def triangulate(points: np.ndarray) -> np.ndarray:
+    """
+    Delaunay-triangulate points with the Bowyer-Watson algorithm.
+
+    Points are inserted one at a time; the triangles whose circumcircle
+    contains the new point are removed and the cavity is re-triangulated
+    from the point. The circumcircle test runs over all triangles at once.
+
+    Args:
+        points: n x 2 array of distinct points
+
+    Returns:
+        m x 3 array of point indices. Triangles touching the enclosing
+        super-triangle (vertices n, n+1 and n+2) are kept, so hull edges
+        appear too.
+    """
+    n = len(points)
+    low, high = points.min(axis=0), points.max(axis=0)
+    center = (low + high) / 2
+    span = max(float((high - low).max()), 1.0) * 100
+    super_vertices = np.array([
+        [center[0] - 2 * span, center[1] - span],
+        [center[0] + 2 * span, center[1] - span],
+        [center[0], center[1] + 2 * span]
+    ])
+    vertices = np.vstack([points, super_vertices])
+
+    triangles = np.array([[n, n + 1, n + 2]], dtype=np.int64)
+    centers, radii = _circumcircles(vertices, triangles)
+    for index in range(n):
+        point = vertices[index]
+        bad = ((centers - point) ** 2).sum(axis=1) < radii
+        cavity = triangles[bad]
+
+        # Edges used by exactly one removed triangle bound the cavity
+        edges: Dict[Tuple[int, int], int] = {}
+        for a, b, c in cavity.tolist():
+            for edge in ((a, b), (b, c), (c, a)):
+                key = (edge[0], edge[1]) if edge[0] < edge[1] else (edge[1], edge[0])
+                edges[key] = edges.get(key, 0) + 1
+        boundary = [edge for edge, count in edges.items() if count == 1]
+
+        new = np.array([[a, b, index] for a, b in boundary], dtype=np.int64).reshape(-1, 3)
+        new_centers, new_radii = _circumcircles(vertices, new)
+        keep = ~bad
+        triangles = np.vstack([triangles[keep], new])
+        centers = np.vstack([centers[keep], new_centers])
+        radii = np.concatenate([radii[keep], new_radii])
+    return triangles
+
+
+def delaunay_neighbors(points: np.ndarray) -> List[Set[int]]:
+    """Get each point's neighbors in the Delaunay triangulation."""
+    n = len(points)
+    neighbors: List[Set[int]] = [set() for _ in range(n)]
+    if n < 2:
+        return neighbors
+    if n == 2:
+        neighbors[0].add(1)
+        neighbors[1].add(0)
+        return neighbors
+    for triangle in triangulate(points).tolist():
+        for i in triangle:
+            if i < n:
+                neighbors[i].update(j for j in triangle if j < n and j != i)
+    return neighbors
+
+
+def clip_half_plane(polygon: Polygon, normal: Tuple[float, float], offset: float) -> Polygon:
+    """
+    Clip a convex polygon to the half-plane normal . p <= offset (Sutherland-Hodgman).
+
+    Args:
+        polygon: Vertices in order
+        normal: Half-plane normal
+        offset: Half-plane offset
+
+    Returns:
+        Clipped polygon (empty when nothing remains)
+    """
+    nx, ny = normal
+    clipped = []
+    count = len(polygon)
+    for i in range(count):
+        current, following = polygon[i], polygon[(i + 1) % count]
+        current_side = nx * current[0] + ny * current[1] - offset
+        following_side = nx * following[0] + ny * following[1] - offset
+        if current_side <= 0:
+            clipped.append(current)
+        if (current_side < 0 < following_side) or (following_side < 0 < current_side):
+            t = current_side / (current_side - following_side)
+            clipped.append((current[0] + t * (following[0] - current[0]),
+                            current[1] + t * (following[1] - current[1])))
+    return clipped
+
+
+def simplify(polygon: Polygon, tolerance: float = 0.05, precision: int = 1) -> List[List[float]]:
+    """
+    Drop repeated and collinear vertices and round the coordinates.
+
+    Args:
+        polygon: Vertices in order
+        tolerance: Distance below which vertices are merged or treated as collinear
+        precision: Decimal places kept
+
+    Returns:
+        Polygon as a list of [x, y] pairs
+    """
+    points = []
+    for x, y in polygon:
+        if not points or abs(points[-1][0] - x) > tolerance or abs(points[-1][1] - y) > tolerance:
+            points.append((x, y))
+    if len(points) > 1 and abs(points[0][0] - points[-1][0]) <= tolerance and abs(points[0][1] - points[-1][1]) <= tolerance:
+        points.pop()
+
+    simplified = []
+    count = len(points)
+    for i in range(count):
+        (px, py), (x, y), (nx, ny) = points[i - 1], points[i], points[(i + 1) % count]
+        # Twice the triangle area over the base length is the vertex's distance from the chord
+        cross = (x - px) * (ny - py) - (y - py) * (nx - px)
+        base = max(((nx - px) ** 2 + (ny - py) ** 2) ** 0.5, 1e-12)
+        if count <= 3 or abs(cross) / base > tolerance:
+            simplified.append([round(x, precision), round(y, precision)])
+    return simplified if len(simplified) >= 3 else []
+
+
+def compute_cells(points: Sequence[Tuple[float, float]],
+                  bbox: Tuple[float, float, float, float] = DEFAULT_BBOX,
+                  boundary: Optional[Polygon] = None, precision: int = 1) -> List[List[List[float]]]:
+    """
+    Compute the Voronoi cell of each point, clipped to a bounding box.
+
+    A cell is the box cut by the perpendicular bisectors between the point
+    and each of its Delaunay neighbors. Points sharing a position share a cell.
+
+    Args:
+        points: Sites as (x, y)
+        bbox: Clipping box (x0, y0, x1, y1)
+        boundary: Optional convex polygon clipping the cells instead of the box
+        precision: Decimal places kept in the polygons
+
+    Returns:
+        Simplified polygon per point, in the order given (empty when the cell
+        lies outside the box)
+    """
+    if not points:
+        return []
+    x0, y0, x1, y1 = bbox
+    box = [tuple(vertex) for vertex in boundary] if boundary else [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+
+    coordinates = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    sites, inverse = np.unique(coordinates, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    # A deterministic sub-pixel jitter keeps exactly collinear or cocircular
+    # layouts (grids, circles) from producing degenerate triangles
+    scale = max(float(np.ptp(sites, axis=0).max()) if len(sites) > 1 else 1.0, 1.0)
+    jittered = sites + np.random.default_rng(0).uniform(-1e-7, 1e-7, sites.shape) * scale
+    neighbors = delaunay_neighbors(jittered)
+
+    cells = []
+    for i, (sx, sy) in enumerate(sites.tolist()):
+        polygon = box
+        for j in neighbors[i]:
+            nx, ny = sites[j]
+            normal = (nx - sx, ny - sy)
+            offset = (normal[0] * (sx + nx) + normal[1] * (sy + ny)) / 2
+            polygon = clip_half_plane(polygon, normal, offset)
+            if not polygon:
+                break
+        cells.append(simplify(polygon, tolerance=0.5 * 10 ** -precision, precision=precision))
+    return [cells[site] for site in inverse.tolist()]
+
+
+class VoronoiCache:
+    """
+    Voronoi cells per level, recomputed only when the level's layout changes.
+
+    A level's layout revision is the ordered list of its domain ids and
+    positions, so adding, removing, moving or repositioning a domain
+    invalidates exactly the levels it touches.
+    """
+
+    def __init__(self, max_levels: int = 256):
+        """
+        Initialize the cache.
+
+        Args:
+            max_levels: Number of levels kept, least recently used dropped first
+        """
+        self.max_levels = max_levels
+        self._levels: 'OrderedDict[Any, Tuple[Tuple, Dict[str, List[List[float]]]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def memory_usage(self) -> int:
+        """Approximate memory held by the cached polygons, in bytes."""
+        with self._lock:
+            vertices = sum(len(polygon) for _, cells in self._levels.values() for polygon in cells.values())
+        return vertices * 120
+
+    def get_cells(self, parent_id: Optional[str], domains: List[Dict[str, Any]],
+                  bbox: Tuple[float, float, float, float] = DEFAULT_BBOX) -> Optional[Dict[str, List[List[float]]]]:
+        """
+        Get the cells of a level's domains.
+
+        Args:
+            parent_id: Parent domain ID or None for root level
+            domains: The level's domains, with x and y
+            bbox: Clipping box (x0, y0, x1, y1)
+
+        Returns:
+            Dictionary of domain_id -> polygon, or None when some domain has
+            no position yet (the client lays such levels out itself)
+        """
+        if not all(_positioned(domain) for domain in domains):
+            return None
+        revision = (tuple(bbox),) + tuple((domain["id"], domain["x"], domain["y"]) for domain in domains)
+        key = parent_id
+        with self._lock:
+            cached = self._levels.get(key)
+            if cached is not None and cached[0] == revision:
+                self._levels.move_to_end(key)
+                return cached[1]
+
+        polygons = compute_cells([(domain["x"], domain["y"]) for domain in domains], bbox)
+        cells = {domain["id"]: polygon for domain, polygon in zip(domains, polygons)}
+        with self._lock:
+            self._levels[key] = (revision, cells)
+            self._levels.move_to_end(key)
+            while len(self._levels) > self.max_levels:
+                self._levels.popitem(last=False)
+        return cells
+
+
+def _positioned(domain: Dict[str, Any]) -> bool:
+    # Same rule as the frontend: a 0 coordinate means "not laid out yet"
+    x, y = domain.get("x"), domain.get("y")
+    return (isinstance(x, (int, float)) and isinstance(y, (int, float))
+            and not isinstance(x, bool) and not isinstance(y, bool) and x != 0 and y != 0)
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the Semantic Tiles backend hot paths.
+Run with: python -m benchmarks.run_benchmarks (from the backend directory)
+"""
@@ -0,0 +1,146 @@
+"""
+benchmarks/fixtures.py
+Synthetic domain trees, PDFs and an offline embedding stub for benchmarks.
+"""
+
+import json
+import os
+import random
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.fallback_embedding import hashed_ngram_embedding
+from app.core.semantic_processor import SemanticProcessor
+
+WORDS = (
+    "semantic knowledge domain vector graph network theory quantum biology "
+    "chemistry history language model physics economics algebra topology "
+    "learning memory signal control energy matter culture design systems"
+).split()
+
+
+class OfflineSemanticProcessor(SemanticProcessor):
+    """
+    SemanticProcessor whose provider is a deterministic local stub.
+    Embeddings are cached like real provider responses, so warm and cold
+    runs behave as they would in production, without any network calls.
+    """
+
+    def _request_embedding(self, text: str, model: Optional[str] = None,
+                           dimension: Optional[int] = None) -> Optional[np.ndarray]:
+        return hashed_ngram_embedding(text, dimension or self.embedding_dimension)
+
+
+def random_name(rng: random.Random, words: int = 3) -> str:
+    """Build a random multi-word domain name."""
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(words))
+
+
+def build_tree(shape: str, size: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    Build a synthetic domain tree in the DomainStore JSON format.
+
+    Args:
+        shape: 'wide' (one large level), 'deep' (long chains) or 'mixed'
+            (a branching factor of 10)
+        size: Total number of domains
+        seed: Random seed
+
+    Returns:
+        Domain data structure as stored in domains.json
+    """
+    rng = random.Random(seed)
+    data = {"domains": {}, "rootDomains": []}
+    ids: List[str] = []
+
+    for i in range(size):
+        if shape == 'wide' or not ids:
+            parent_id = None
+        elif shape == 'deep':
+            # Chains of up to 50 levels
+            parent_id = ids[-1] if i % 50 else None
+        elif shape == 'mixed':
+            parent_id = ids[(i - 1) // 10] if i >= 10 else None
+        else:
+            raise ValueError(f"Unknown tree shape '{shape}'")
+
+        domain_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        data["domains"][domain_id] = {
+            "id": domain_id,
+            "name": f"{random_name(rng)} {i}",
+            "description": random_name(rng, 8),
+            "parentId": parent_id,
+            "children": [],
+            "documents": [],
+            "x": rng.uniform(50, 750),
+            "y": rng.uniform(50, 550)
+        }
+        if parent_id is None:
+            data["rootDomains"].append(domain_id)
+        else:
+            data["domains"][parent_id]["children"].append(domain_id)
+        ids.append(domain_id)
+
+    return data
+
+
+def write_tree(storage_dir: str, data: Dict[str, Any]) -> str:
+    """Write a domain tree to domains.json in a storage directory."""
+    os.makedirs(storage_dir, exist_ok=True)
+    data_file = os.path.join(storage_dir, 'domains.json')
+    with open(data_file, 'w') as f:
+        json.dump(data, f)
+    return data_file
+
+
+def write_pdf(path: str, pages: int, lines_per_page: int = 40, seed: int = 0) -> str:
+    """
+    Write a synthetic text PDF.
+
+    Args:
+        path: Output path
+        pages: Number of pages
+        lines_per_page: Lines of text on each page
+        seed: Random seed
+
+    Returns:
+        The output path
+    """
+    rng = random.Random(seed)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{3 + 2 * i} 0 R" for i in range(pages)), pages
+        ),
+    ]
+    font_ref = 3 + 2 * pages
+    for i in range(pages):
+        lines = " ".join(
+            f"({' '.join(rng.choice(WORDS) for _ in range(10))}) Tj T*"
+            for _ in range(lines_per_page)
+        )
+        stream = f"BT /F1 10 Tf 12 TL 50 750 Td {lines} ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_ref} 0 R >> >> >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode('latin-1')
+    output += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+               f"startxref\n{xref}\n%%EOF\n").encode('latin-1')
+
+    with open(path, 'wb') as f:
+        f.write(output)
+    return path
@@ -0,0 +1,510 @@
+"""
+benchmarks/load_test.py
+Load generator replaying a mix of user actions against the backend API.
+
+Each worker thread loops over actions drawn from the traffic mix, keeping
+the configured number of requests in flight, and the run reports
+throughput and latency percentiles per action.
+
+Usage (from the backend directory):
+    # In-process app with the stub provider, fully offline
+    python -m benchmarks.load_test --concurrency 16 --duration 60
+
+    # A running server (start it with OPENAI_BASE_URL pointing at
+    # python -m benchmarks.stub_provider to avoid API costs)
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --concurrency 32 \
+        --mix navigate=60,drag=15,upload=5,summarize=10,query=10
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode, urlsplit
+
+from benchmarks.fixtures import WORDS, random_name
+from benchmarks.stub_provider import add_stub_arguments, start_stub_server, stub_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIX = "navigate=60,drag=15,upload=5,summarize=10,query=10"
+
+# Questions are drawn from a small pool, so repeats hit the answer cache as FAQs would
+QUESTIONS = [
+    "What is this document about?",
+    "Summarize the main argument.",
+    "Which methods are described?",
+    "What are the key findings?",
+    "Who is the intended audience?",
+    "What terms are defined in this document?",
+    "How does this relate to {topic}?",
+    "What does the document say about {topic}?",
+]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """
+    Parse a traffic mix such as "navigate=60,query=10".
+
+    Args:
+        spec: Comma-separated action=weight pairs
+
+    Returns:
+        Dictionary of action -> weight
+
+    Raises:
+        ValueError: If an action is unknown or a weight is invalid
+    """
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.strip().partition('=')
+        if name not in ACTIONS:
+            raise ValueError(f"Unknown action '{name}' (expected one of {', '.join(ACTIONS)})")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid weight for '{name}': {weight!r}")
+        if mix[name] < 0:
+            raise ValueError(f"Invalid weight for '{name}': {weight!r}")
+    if not any(mix.values()):
+        raise ValueError("The traffic mix has no positive weight")
+    return mix
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, max(0, math.ceil(fraction * len(samples)) - 1))]
+
+
+class ApiClient:
+    """A keep-alive HTTP connection to the API, one per worker thread."""
+
+    def __init__(self, base_url: str, tenant: Optional[str], timeout: float = 120.0):
+        """
+        Initialize the client.
+
+        Args:
+            base_url: Server URL, e.g. http://127.0.0.1:5000
+            tenant: Knowledge base used through the /api/t/<tenant> prefix, or None for the default one
+            timeout: Socket timeout in seconds
+        """
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.prefix = f"{parts.path.rstrip('/')}/api" + (f"/t/{tenant}" if tenant else "")
+        self.timeout = timeout
+        self._connection = None
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        """
+        Send a request, reconnecting once if the kept-alive connection was closed.
+
+        Args:
+            method: HTTP method
+            path: Path below the API prefix, e.g. /domains
+            body: Optional request body
+            headers: Optional request headers
+
+        Returns:
+            Tuple of (status code, response body)
+        """
+        for attempt in range(2):
+            if self._connection is None:
+                connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+                self._connection = connection_class(self.host, self.port, timeout=self.timeout)
+            try:
+                self._connection.request(method, self.prefix + path, body=body, headers=headers or {})
+                response = self._connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                self.close()
+                if attempt:
+                    raise
+        raise ConnectionError("unreachable")
+
+    def json(self, method: str, path: str, payload: Any = None) -> Tuple[int, Any]:
+        """Send a request with an optional JSON body and decode the JSON response."""
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        status, data = self.request(method, path, body, headers)
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    def upload(self, domain_id: str, filename: str, content: bytes) -> Tuple[int, Any]:
+        """Upload a document to a domain as multipart form data."""
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: text/plain\r\n\r\n"
+        ).encode('utf-8') + content + f"\r\n--{boundary}--\r\n".encode('utf-8')
+        status, data = self.request("POST", f"/domains/{domain_id}/documents", body,
+                                    {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class Workload:
+    """Domains and documents the actions operate on, grown by uploads."""
+
+    def __init__(self, seed: int):
+        self.lock = threading.Lock()
+        self.seed = seed
+        self.domain_ids: List[str] = []
+        self.parent_ids: List[Optional[str]] = [None]
+        self.document_paths: List[str] = []
+
+    def pick(self, rng: random.Random, items: List[Any]) -> Any:
+        with self.lock:
+            return rng.choice(items) if items else None
+
+    def add_document(self, path: str):
+        with self.lock:
+            self.document_paths.append(path)
+
+
+def document_text(rng: random.Random, paragraphs: int = 20) -> bytes:
+    """Generate a plain text document of random sentences."""
+    lines = []
+    for _ in range(paragraphs):
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+                     for _ in range(rng.randint(3, 6))]
+        lines.append(" ".join(sentences))
+    return "\n\n".join(lines).encode('utf-8')
+
+
+def seed_workload(client: ApiClient, workload: Workload, domains: int, documents: int):
+    """
+    Create the domains and documents the actions use.
+
+    Domains are spread over a root level and one level of children; the
+    documents are uploaded to random domains.
+
+    Raises:
+        RuntimeError: If the API rejects a seed request
+    """
+    rng = random.Random(workload.seed)
+    roots = max(1, domains // 5)
+    for index in range(domains):
+        parent_id = None if index < roots else rng.choice(workload.domain_ids[:roots])
+        status, domain = client.json("POST", "/domains", {
+            "name": f"{random_name(rng)} {index}",
+            "parentId": parent_id,
+            "description": " ".join(rng.choice(WORDS) for _ in range(12)),
+            "force": True,
+        })
+        if status != 200:
+            raise RuntimeError(f"Creating a domain failed with status {status}: {domain}")
+        workload.domain_ids.append(domain["id"])
+        if index < roots:
+            workload.parent_ids.append(domain["id"])
+
+    for index in range(documents):
+        status, document = client.upload(rng.choice(workload.domain_ids), f"seed-{index}.txt", document_text(rng))
+        if status != 200:
+            raise RuntimeError(f"Uploading a document failed with status {status}: {document}")
+        workload.add_document(document["path"])
+
+
+def action_navigate(client: ApiClient, workload: Workload, rng: random.Random) -> int:
+    """Open a level, as clicking into a domain does."""
+    parent_id = workload.pick(rng, workload.parent_ids)
+    query = urlencode({"parentId": parent_id, "width": 1200, "height": 800} if parent_id else
+                      {"width": 1200, "height": 800})
+    return client.request("GET", f"/domains?{query}")[0]
+
+
+def action_drag(client: ApiClient, workload: Workload, rng: random.Random) -> int:
+    """Move a few domains, as dragging tiles does."""
+    positions = {}
+    for _ in range(rng.randint(1, 5)):
+        domain_id = workload.pick(rng, workload.domain_ids)
+        positions[domain_id] = {"x": rng.uniform(0, 1200), "y": rng.uniform(0, 800)}
+    return client.json("POST", "/domains/positions", {"positions": positions})[0]
+
+
+def action_upload(client: ApiClient, workload: Workload, rng: random.Random) -> int:
+    """Upload a new document to a domain."""
+    domain_id = workload.pick(rng, workload.domain_ids)
+    status, document = client.upload(domain_id, f"load-{uuid.uuid4().hex[:8]}.txt", document_text(rng))
+    if status == 200 and document:
+        workload.add_document(document["path"])
+    return status
+
+
+def action_summarize(client: ApiClient, workload: Workload, rng: random.Random) -> int:
+    """Open a document's summary."""
+    path = workload.pick(rng, workload.document_paths)
+    return client.request("GET", f"/documents/{quote(path)}/summary")[0]
+
+
+def action_query(client: ApiClient, workload: Workload, rng: random.Random) -> int:
+    """Ask a question about a document."""
+    path = workload.pick(rng, workload.document_paths)
+    question = rng.choice(QUESTIONS).format(topic=rng.choice(WORDS))
+    return client.json("POST", f"/documents/{quote(path)}/query", {"query": question})[0]
+
+
+ACTIONS: Dict[str, Callable[[ApiClient, Workload, random.Random], int]] = {
+    "navigate": action_navigate,
+    "drag": action_drag,
+    "upload": action_upload,
+    "summarize": action_summarize,
+    "query": action_query,
+}
+
+
+class Recorder:
+    """Latency samples and failures per action, kept from the end of the warm-up."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {name: [] for name in ACTIONS}
+        self.errors: Dict[str, Dict[str, int]] = {name: {} for name in ACTIONS}
+
+    def record(self, action: str, elapsed: float, outcome: Optional[str]):
+        with self._lock:
+            self.samples[action].append(elapsed * 1000)
+            if outcome is not None:
+                self.errors[action][outcome] = self.errors[action].get(outcome, 0) + 1
+
+    def report(self, seconds: float) -> Dict[str, Any]:
+        """Summarize the samples of a measured period of a number of seconds."""
+        with self._lock:
+            groups = {name: sorted(samples) for name, samples in self.samples.items() if samples}
+            groups["all"] = sorted(sample for samples in self.samples.values() for sample in samples)
+            errors = {name: dict(counts) for name, counts in self.errors.items()}
+        totals: Dict[str, int] = {}
+        for counts in errors.values():
+            for outcome, count in counts.items():
+                totals[outcome] = totals.get(outcome, 0) + count
+        errors["all"] = totals
+
+        report = {}
+        for name, samples in groups.items():
+            if not samples:
+                continue
+            report[name] = {
+                "requests": len(samples),
+                "errors": sum(errors.get(name, {}).values()),
+                "error_outcomes": errors.get(name, {}),
+                "throughput_rps": len(samples) / seconds if seconds > 0 else 0.0,
+                "p50_ms": percentile(samples, 0.50),
+                "p95_ms": percentile(samples, 0.95),
+                "p99_ms": percentile(samples, 0.99),
+                "max_ms": samples[-1],
+            }
+        return report
+
+
+def run_load(client_factory: Callable[[], ApiClient], workload: Workload, mix: Dict[str, float],
+             concurrency: int, duration: float, warmup: float, think: float = 0.0) -> Dict[str, Any]:
+    """
+    Run worker threads over the traffic mix and measure the actions.
+
+    Args:
+        client_factory: Creates one API client per worker
+        workload: Domains and documents to act on
+        mix: Action -> weight
+        concurrency: Number of worker threads, each with one request in flight
+        duration: Seconds measured, after the warm-up
+        warmup: Seconds run before measuring
+        think: Mean pause between a worker's requests, in seconds (exponential)
+
+    Returns:
+        Per-action statistics
+    """
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+    recorder = Recorder()
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(index: int):
+        rng = random.Random(workload.seed * 1000 + index)
+        client = client_factory()
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= stop_at:
+                    break
+                action = rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                try:
+                    status = ACTIONS[action](client, workload, rng)
+                    outcome = None if status < 400 else str(status)
+                except Exception as e:
+                    client.close()
+                    outcome = type(e).__name__
+                elapsed = time.perf_counter() - start
+                if now >= measure_from:
+                    recorder.record(action, elapsed, outcome)
+                if think > 0:
+                    time.sleep(rng.expovariate(1.0 / think))
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(index,), name=f"load-{index}", daemon=True)
+               for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(duration)
+
+
+def print_report(results: Dict[str, Any]):
+    """Print per-action throughput and latency percentiles."""
+    print(f"{'action':12} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9}")
+    for name, stats in results.items():
+        print(f"{name:12} {stats['requests']:9d} {stats['errors']:7d} {stats['throughput_rps']:9.1f} "
+              f"{stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f} {stats['max_ms']:9.1f}")
+
+
+def start_local_app(workdir: str, stub_url: str) -> Tuple[Any, str]:
+    """
+    Serve the app in-process on a free port, using the stub provider.
+
+    Args:
+        workdir: Upload folder of the app
+        stub_url: Base URL of the stub provider
+
+    Returns:
+        Tuple of (server, base URL)
+    """
+    from werkzeug.serving import make_server
+
+    # The processor's OpenAI client reads these when it is created
+    os.environ['OPENAI_BASE_URL'] = stub_url
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+    from app import create_app
+    from app.api import routes
+
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = workdir
+    # The test's tenant is created on first use
+    app.config['TENANTS_OPEN'] = True
+    routes.tenant_registry = None
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    # Access logs would drown the report
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    threading.Thread(target=server.serve_forever, name='load-app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the Semantic Tiles backend")
+    parser.add_argument('--url', help="Server to test; without it the app runs in-process against the stub provider")
+    parser.add_argument('--tenant', default='loadtest',
+                        help="Knowledge base used for the test (empty for the default one); "
+                             "with --url it must be accepted by the server (TENANTS_ALLOWED or TENANTS_OPEN)")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Traffic mix as action=weight pairs")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent requests")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds measured")
+    parser.add_argument('--warmup', type=float, default=5.0, help="Seconds run before measuring")
+    parser.add_argument('--think-ms', type=float, default=0.0, help="Mean pause between a worker's requests")
+    parser.add_argument('--domains', type=int, default=50, help="Domains created before the run")
+    parser.add_argument('--documents', type=int, default=20, help="Documents uploaded before the run")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the workload")
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'results'),
+                        help="Directory for JSON results")
+    stub = parser.add_argument_group("stub provider (in-process runs)")
+    add_stub_arguments(stub)
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.concurrency < 1 or args.duration <= 0:
+        parser.error("--concurrency and --duration must be positive")
+
+    # App modules configure INFO logging on import; keep the report readable
+    logging.getLogger().setLevel(logging.WARNING)
+    workdir = None
+    stub_server = app_server = None
+    try:
+        base_url = args.url
+        if not base_url:
+            try:
+                stub_server = start_stub_server(**stub_settings(args))
+            except ValueError as e:
+                parser.error(str(e))
+            workdir = tempfile.mkdtemp(prefix="load_")
+            app_server, base_url = start_local_app(workdir, f"http://127.0.0.1:{stub_server.server_port}/v1")
+
+        tenant = args.tenant or None
+        workload = Workload(args.seed)
+        print(f"Seeding {args.domains} domains and {args.documents} documents on {base_url}...", flush=True)
+        seed_client = ApiClient(base_url, tenant)
+        seed_workload(seed_client, workload, args.domains, args.documents)
+        seed_client.close()
+
+        print(f"Running {args.concurrency} workers for {args.warmup:g}s warm-up + {args.duration:g}s...", flush=True)
+        results = run_load(lambda: ApiClient(base_url, tenant), workload, mix, args.concurrency,
+                           args.duration, args.warmup, args.think_ms / 1000.0)
+        print_report(results)
+
+        report = {
+            "timestamp": datetime.now().isoformat(),
+            "target": args.url or "in-process",
+            "mix": mix,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "think_ms": args.think_ms,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "results": results,
+        }
+        if stub_server is not None:
+            report["stub"] = stub_server.RequestHandlerClass.provider.stats()
+        os.makedirs(args.output, exist_ok=True)
+        output_file = os.path.join(args.output, f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output_file}")
+        return 0
+    finally:
+        if app_server is not None:
+            app_server.shutdown()
+        if stub_server is not None:
+            stub_server.shutdown()
+        if workdir is not None:
+            from app.api import routes
+            if routes.tenant_registry is not None:
+                routes.tenant_registry.close()
+                routes.tenant_registry = None
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+benchmarks/run_benchmarks.py
+Reproducible benchmarks for DomainStore, SemanticProcessor and the API.
+
+Usage (from the backend directory):
+    python -m benchmarks.run_benchmarks [--quick] [--output DIR] [--compare FILE]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.domain_model import DomainStore
+from app.core.tenancy import DEFAULT_TENANT, TenantRegistry
+from benchmarks.fixtures import OfflineSemanticProcessor, build_tree, random_name, write_pdf, write_tree
+
+logger = logging.getLogger(__name__)
+
+FULL_SIZES = {
+    "distances": [10, 100, 1000],
+    "store": [1000, 10000, 100000],
+    "mutations": [1000, 10000],
+    "pdf_pages": [10, 100],
+    "api_level": [10, 100],
+}
+
+QUICK_SIZES = {
+    "distances": [10, 100],
+    "store": [1000, 10000],
+    "mutations": [1000],
+    "pdf_pages": [10],
+    "api_level": [10],
+}
+
+TREE_SHAPES = ['wide', 'deep', 'mixed']
+
+
+def measure(fn: Callable[[], Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    """
+    Time a function several times.
+
+    Args:
+        fn: Function to time
+        repeat: Number of timed runs
+        setup: Optional untimed function run before each timed run
+
+    Returns:
+        Timing statistics in milliseconds
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "runs": repeat,
+        "min_ms": samples[0],
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max_ms": samples[-1],
+    }
+
+
+def bench_compute_distances(workdir: str, sizes: List[int]) -> Dict[str, Any]:
+    """Time compute_distances on a single level, with cold and warm caches."""
+    results = {}
+    processor = OfflineSemanticProcessor(workdir)
+    rng = random.Random(1)
+    for n in sizes:
+        items = [{"id": str(i), "name": f"{random_name(rng)} {i}", "description": random_name(rng, 6)}
+                 for i in range(n)]
+        repeat = 3 if n >= 1000 else 10
+        results[f"cold_n{n}"] = measure(lambda: processor.compute_distances(items), repeat,
+                                        setup=processor.clear_cache)
+        results[f"warm_n{n}"] = measure(lambda: processor.compute_distances(items), repeat)
+    return results
+
+
+def bench_store_io(workdir: str, sizes: List[int]) -> Dict[str, Any]:
+    """Time DomainStore._save_data and _load_data on synthetic trees."""
+    results = {}
+    for shape in TREE_SHAPES:
+        for n in sizes:
+            storage_dir = os.path.join(workdir, f"store_{shape}_{n}")
+            data_file = write_tree(storage_dir, build_tree(shape, n))
+            store = DomainStore(storage_dir)
+            repeat = 3 if n >= 100000 else 5
+            stats = measure(store._save_data, repeat)
+            stats["file_bytes"] = os.path.getsize(data_file)
+            results[f"save_{shape}_n{n}"] = stats
+            results[f"load_{shape}_n{n}"] = measure(store._load_data, repeat)
+            shutil.rmtree(storage_dir)
+    return results
+
+
+def bench_mutations(workdir: str, sizes: List[int], operations: int = 100) -> Dict[str, Any]:
+    """Time add_domain, delete_domain and position update throughput on a populated store."""
+    results = {}
+    for n in sizes:
+        storage_dir = os.path.join(workdir, f"mutations_{n}")
+        write_tree(storage_dir, build_tree('mixed', n))
+        store = DomainStore(storage_dir)
+        parent_id = store.get_domains(None)[0]["id"]
+
+        added = []
+        start = time.perf_counter()
+        for i in range(operations):
+            domain = store.add_domain(f"Benchmark domain {i}", parent_id)
+            added.append(domain["id"])
+        elapsed = time.perf_counter() - start
+        results[f"add_domain_n{n}"] = {"ops": operations, "ops_per_s": operations / elapsed,
+                                       "mean_ms": elapsed * 1000 / operations}
+
+        start = time.perf_counter()
+        for domain_id in added:
+            store.delete_domain(domain_id)
+        elapsed = time.perf_counter() - start
+        results[f"delete_domain_n{n}"] = {"ops": operations, "ops_per_s": operations / elapsed,
+                                          "mean_ms": elapsed * 1000 / operations}
+
+        # A drag: a stream of single-domain position updates, then the flush
+        start = time.perf_counter()
+        for i in range(operations):
+            store.update_domain_positions({parent_id: {"x": i, "y": i}})
+        store.flush_positions()
+        elapsed = time.perf_counter() - start
+        results[f"update_positions_n{n}"] = {"ops": operations, "ops_per_s": operations / elapsed,
+                                             "mean_ms": elapsed * 1000 / operations}
+        store.close()
+        shutil.rmtree(storage_dir)
+    return results
+
+
+def bench_pdf_extraction(workdir: str, sizes: List[int]) -> Dict[str, Any]:
+    """Time full-text PDF extraction, serial and through the process pool."""
+    results = {}
+    processor = OfflineSemanticProcessor(workdir)
+    for pages in sizes:
+        path = write_pdf(os.path.join(workdir, f"synthetic_{pages}.pdf"), pages)
+        stats = measure(lambda: processor._extract_text(path), 3, setup=processor.clear_cache)
+        stats["mode"] = "parallel" if processor.pdf_extractor.enabled and pages >= processor.pdf_extractor.min_pages else "serial"
+        results[f"extract_pages{pages}"] = stats
+        results[f"extract_prefix_pages{pages}"] = measure(
+            lambda: processor._extract_text(path, max_chars=5000), 3, setup=processor.clear_cache
+        )
+    processor.pdf_extractor.shutdown()
+    return results
+
+
+def bench_api(workdir: str, sizes: List[int]) -> Dict[str, Any]:
+    """Time GET /api/domains end to end through the Flask test client."""
+    from app import create_app
+    from app.api import routes
+
+    results = {}
+    app = create_app('testing')
+    app.config['UPLOAD_FOLDER'] = workdir
+    client = app.test_client()
+
+    for n in sizes:
+        routes.tenant_registry = TenantRegistry(workdir, processor_factory=OfflineSemanticProcessor)
+        storage_dir = os.path.join(routes.tenant_registry.root(DEFAULT_TENANT), 'data')
+        data = build_tree('wide', n)
+        write_tree(storage_dir, data)
+        processor = routes.tenant_registry.get_processor(DEFAULT_TENANT)
+
+        def get_level():
+            response = client.get('/api/domains')
+            assert response.status_code == 200, response.status_code
+
+        results[f"get_domains_cold_n{n}"] = measure(get_level, 5, setup=processor.clear_cache)
+        results[f"get_domains_warm_n{n}"] = measure(get_level, 20)
+        routes.tenant_registry.close()
+
+    routes.tenant_registry = None
+    return results
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]):
+    """Print the ratio of mean times between two result files."""
+    print(f"{'benchmark':60} {'previous':>12} {'current':>12} {'ratio':>8}")
+    for group, entries in current["results"].items():
+        for name, stats in entries.items():
+            before = previous.get("results", {}).get(group, {}).get(name)
+            if not before or "mean_ms" not in before or "mean_ms" not in stats:
+                continue
+            ratio = stats["mean_ms"] / before["mean_ms"] if before["mean_ms"] else float('inf')
+            print(f"{group + '.' + name:60} {before['mean_ms']:12.2f} {stats['mean_ms']:12.2f} {ratio:8.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Semantic Tiles backend")
+    parser.add_argument('--quick', action='store_true', help="Run reduced sizes")
+    parser.add_argument('--only', nargs='*', help="Benchmark groups to run")
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'results'),
+                        help="Directory for JSON results")
+    parser.add_argument('--compare', help="Previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    # App modules configure INFO logging on import; keep benchmark output readable
+    logging.getLogger().setLevel(logging.WARNING)
+    sizes = QUICK_SIZES if args.quick else FULL_SIZES
+    groups = {
+        "compute_distances": lambda d: bench_compute_distances(d, sizes["distances"]),
+        "store_io": lambda d: bench_store_io(d, sizes["store"]),
+        "mutations": lambda d: bench_mutations(d, sizes["mutations"]),
+        "pdf_extraction": lambda d: bench_pdf_extraction(d, sizes["pdf_pages"]),
+        "api": lambda d: bench_api(d, sizes["api_level"]),
+    }
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "quick": args.quick,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": {},
+    }
+
+    for name, run in groups.items():
+        if args.only and name not in args.only:
+            continue
+        workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+        try:
+            print(f"Running {name}...", flush=True)
+            report["results"][name] = run(workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(args.output, exist_ok=True)
+    output_file = os.path.join(args.output, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output_file}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
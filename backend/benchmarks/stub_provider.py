@@ -0,0 +1,355 @@
+"""
+benchmarks/stub_provider.py
+Local stand-in for the OpenAI embeddings and chat completions endpoints.
+
+Responses are deterministic (embeddings come from the local fallback
+embedder) and delayed by configurable latency distributions, with optional
+rate limiting and server errors, so load tests exercise the backend's
+provider paths without API costs or rate limits.
+
+Usage (from the backend directory):
+    python -m benchmarks.stub_provider [--port 8081] [--embedding-latency lognormal:80:0.5]
+        [--completion-latency lognormal:1500:0.4] [--error-rate 0.01] [--throttle-rate 0.02]
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:8081/v1 and any
+OPENAI_API_KEY.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.fallback_embedding import hashed_ngram_embedding
+
+logger = logging.getLogger(__name__)
+
+# Output sizes of the embedding models, used when a request sets no dimensions
+MODEL_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+
+class Latency:
+    """
+    A latency distribution, parsed from a spec such as:
+
+    - fixed:MS
+    - uniform:LOW_MS:HIGH_MS
+    - lognormal:MEDIAN_MS:SIGMA (long-tailed, like real provider latency)
+    """
+
+    def __init__(self, spec: str):
+        """
+        Parse a latency spec.
+
+        Args:
+            spec: Distribution and its parameters, separated by colons
+
+        Raises:
+            ValueError: If the spec is malformed
+        """
+        kind, *params = spec.split(':')
+        try:
+            values = [float(param) for param in params]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind] or any(value < 0 for value in values):
+            raise ValueError(f"Invalid latency spec: {spec}")
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw a latency, in seconds."""
+        if self.kind == "fixed":
+            ms = self.values[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(*self.values)
+        else:
+            ms = self.values[0] * math.exp(rng.gauss(0.0, self.values[1]))
+        return ms / 1000.0
+
+
+class StubProvider:
+    """Counters and settings shared by the stub server's request handlers."""
+
+    def __init__(self, embedding_latency: str = "lognormal:80:0.5",
+                 completion_latency: str = "lognormal:1500:0.4",
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        Initialize the stub.
+
+        Args:
+            embedding_latency: Latency spec of embedding requests
+            completion_latency: Latency spec of chat completion requests
+            error_rate: Share of requests answered with a 500 error
+            throttle_rate: Share of requests answered with a 429 rate limit error
+            seed: Random seed of the latency and error draws
+        """
+        self.latency = {
+            "embeddings": Latency(embedding_latency),
+            "completions": Latency(completion_latency),
+        }
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def draw(self, endpoint: str) -> Dict[str, Any]:
+        """
+        Decide how a request is answered.
+
+        Args:
+            endpoint: 'embeddings' or 'completions'
+
+        Returns:
+            Dictionary with the delay in seconds and the status code
+        """
+        with self._lock:
+            delay = self.latency[endpoint].sample(self._rng)
+            roll = self._rng.random()
+        if roll < self.throttle_rate:
+            status = 429
+        elif roll < self.throttle_rate + self.error_rate:
+            status = 500
+        else:
+            status = 200
+        self.count(f"{endpoint}_{status}")
+        return {"delay": delay, "status": status}
+
+    def count(self, name: str):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counts": dict(self.counts),
+                "embeddingLatency": self.latency["embeddings"].spec,
+                "completionLatency": self.latency["completions"].spec,
+                "errorRate": self.error_rate,
+                "throttleRate": self.throttle_rate,
+            }
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for usage reports."""
+    return max(1, len(text) // 4)
+
+
+def embedding_response(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build an embeddings response.
+
+    Args:
+        body: Request body with input, model and optional dimensions and encoding_format
+
+    Returns:
+        Response in the provider's format
+
+    Raises:
+        ValueError: If the input is missing or not text
+    """
+    inputs = body.get("input")
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    if not inputs or not all(isinstance(text, str) for text in inputs):
+        raise ValueError("input must be a string or a list of strings")
+    model = body.get("model", "text-embedding-ada-002")
+    dimension = int(body.get("dimensions") or MODEL_DIMENSIONS.get(model, 1536))
+
+    data = []
+    for index, text in enumerate(inputs):
+        vector = hashed_ngram_embedding(text, dimension).astype(np.float32)
+        if body.get("encoding_format") == "base64":
+            embedding: Any = base64.b64encode(vector.tobytes()).decode('ascii')
+        else:
+            embedding = vector.tolist()
+        data.append({"object": "embedding", "index": index, "embedding": embedding})
+    tokens = sum(estimate_tokens(text) for text in inputs)
+    return {
+        "object": "list",
+        "data": data,
+        "model": model,
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+def completion_response(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a chat completion response.
+
+    The answer is a canned text naming a digest of the prompt, so identical
+    prompts get identical answers.
+
+    Args:
+        body: Request body with model, messages and optional max_tokens
+
+    Returns:
+        Response in the provider's format
+
+    Raises:
+        ValueError: If the messages are missing
+    """
+    messages = body.get("messages")
+    if not messages or not isinstance(messages, list):
+        raise ValueError("messages must be a non-empty list")
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    digest = hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]
+    words = max(1, min(int(body.get("max_tokens") or 200), 200) * 3 // 4)
+    content = f"Stub answer {digest}. " + " ".join(["lorem"] * (words - 3))
+    prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-stub-{digest}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves POST .../embeddings, POST .../chat/completions and GET /stats."""
+
+    protocol_version = "HTTP/1.1"
+    provider: StubProvider = None
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self._send(200, self.provider.stats())
+        else:
+            self._send(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+
+        path = self.path.split('?')[0].rstrip('/')
+        if path.endswith('/embeddings'):
+            endpoint, build = "embeddings", embedding_response
+        elif path.endswith('/chat/completions'):
+            endpoint, build = "completions", completion_response
+        else:
+            self._send(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+
+        outcome = self.provider.draw(endpoint)
+        time.sleep(outcome["delay"])
+        if outcome["status"] == 429:
+            self._send(429, {"error": {"message": "Rate limit reached (stub)", "type": "requests"}},
+                       {"Retry-After": "1"})
+            return
+        if outcome["status"] == 500:
+            self._send(500, {"error": {"message": "Internal server error (stub)", "type": "server_error"}})
+            return
+        try:
+            self._send(200, build(body))
+        except ValueError as e:
+            self._send(400, {"error": {"message": str(e), "type": "invalid_request_error"}})
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub_server(port: int = 0, host: str = '127.0.0.1', **settings) -> ThreadingHTTPServer:
+    """
+    Start the stub server in a background thread.
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+        host: Interface to listen on
+        settings: StubProvider settings
+
+    Returns:
+        Running server; its base URL is http://host:server.server_port/v1
+    """
+    handler = type('BoundStubHandler', (StubHandler,), {"provider": StubProvider(**settings)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='stub-provider', daemon=True).start()
+    return server
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """Add the stub's latency and error options to a command line parser."""
+    parser.add_argument('--embedding-latency', default="lognormal:80:0.5",
+                        help="Embedding latency: fixed:MS, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--completion-latency', default="lognormal:1500:0.4",
+                        help="Chat completion latency, in the same format")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests failing with 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Share of requests failing with 429")
+    parser.add_argument('--stub-seed', type=int, help="Random seed of latencies and errors")
+
+
+def stub_settings(args: argparse.Namespace) -> Dict[str, Any]:
+    """Get StubProvider settings from parsed add_stub_arguments options."""
+    return {
+        "embedding_latency": args.embedding_latency,
+        "completion_latency": args.completion_latency,
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "seed": args.stub_seed,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve a local stub of the OpenAI API")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on")
+    parser.add_argument('--port', type=int, default=8081, help="Port to listen on")
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        server = start_stub_server(args.port, args.host, **stub_settings(args))
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Stub provider listening on http://{args.host}:{server.server_port}/v1", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,16 +22,23 @@ def reset_application_data():
     try:
         # Get the backend directory (the directory this script is in)
         backend_dir = Path(__file__).parent.absolute()
-        uploads_dir = backend_dir / 'uploads'
+        tenant_dir = backend_dir / 'uploads' / 'tenants' / 'default'
         
-        # Check if uploads directory exists
-        if not uploads_dir.exists():
-            logger.warning(f"Uploads directory not found at {uploads_dir}")
-            logger.info("Creating uploads directory structure")
-            os.makedirs(uploads_dir, exist_ok=True)
+        # Remove a default knowledge base left in the layout before tenants/default
+        for legacy in ('documents', 'data'):
+            legacy_dir = backend_dir / 'uploads' / legacy
+            if legacy_dir.exists():
+                logger.info(f"Removing {legacy_dir}")
+                shutil.rmtree(legacy_dir)
+        
+        # Check if the default knowledge base directory exists
+        if not tenant_dir.exists():
+            logger.warning(f"Default knowledge base directory not found at {tenant_dir}")
+            logger.info("Creating the default knowledge base directory")
+            os.makedirs(tenant_dir, exist_ok=True)
         
         # Clear documents directory
-        documents_dir = uploads_dir / 'documents'
+        documents_dir = tenant_dir / 'documents'
         if documents_dir.exists():
             logger.info(f"Removing all documents from {documents_dir}")
             shutil.rmtree(documents_dir)
@@ -40,7 +47,7 @@ def reset_application_data():
         os.makedirs(documents_dir, exist_ok=True)
         
         # Create/reset data directory
-        data_dir = uploads_dir / 'data'
+        data_dir = tenant_dir / 'data'
         os.makedirs(data_dir, exist_ok=True)
         
         # Create empty domains.json
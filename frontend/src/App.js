@@ -1,12 +1,12 @@
 // /Users/paolopignatelli/VerbumTechnologies/Verbum7-Claude/frontend/src/App.js
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import BreadcrumbNav from './components/BreadcrumbNav';
 import VoronoiDiagram from './components/VoronoiDiagram';
 import DomainForm from './components/DomainForm';
 import DocumentPanel from './components/DocumentPanel';
 import DocumentUpload from './components/DocumentUpload';
 import ErrorBoundary from './components/ErrorBoundary';
-import { fetchDomains, addDomain, deleteDomain, fetchDomainPath } from './services/apiService';
+import { fetchDomains, addDomain, deleteDomain, fetchDomainPath, subscribeToChanges } from './services/apiService';
 import './styles/App.css';
 
 function App() {
@@ -15,6 +15,7 @@ function App() {
   
   // State for semantic distances
   const [semanticDistances, setSemanticDistances] = useState({});
+  const [cells, setCells] = useState(null);
   
   // Current parent ID (null for root level)
   const [currentParentId, setCurrentParentId] = useState(null);
@@ -38,15 +39,21 @@ function App() {
   const diagramWidth = 800;
   const diagramHeight = 600;
   
+  // Whether the change feed is connected; without it levels are refetched after changes
+  const feedConnected = useRef(false);
+  const domainsRef = useRef(domains);
+  domainsRef.current = domains;
+  
   // Load domains from API (memoized to prevent unnecessary rerenders)
   const loadDomains = useCallback(async () => {
     setLoading(true);
     setError(null);
     
     try {
-      const data = await fetchDomains(currentParentId);
+      const data = await fetchDomains(currentParentId, { width: diagramWidth, height: diagramHeight });
       setDomains(data.domains || []);
       setSemanticDistances(data.semanticDistances || {});
+      setCells(data.cells || null);
       
       // If we have domain data, cache it in sessionStorage for resilience
       if (data.domains && data.domains.length > 0) {
@@ -62,6 +69,7 @@ function App() {
       
       if (cachedDomains) {
         setDomains(JSON.parse(cachedDomains));
+        setCells(null);
         setSemanticDistances(cachedDistances ? JSON.parse(cachedDistances) : {});
         setError('Using cached data due to connection error. Some information may be outdated.');
       } else {
@@ -125,13 +133,87 @@ function App() {
     }
   }, [currentParentId, loadDomainPath]);
   
+  // Apply a change event to the current level instead of refetching it
+  const applyChange = useCallback((event) => {
+    const inLevel = (parentId) => (parentId || null) === currentParentId;
+    const inPath = (domainId) => breadcrumbPath.some(item => item.id === domainId);
+    switch (event.type) {
+      case 'reset':
+        // Events were missed; reload what is shown
+        loadDomains();
+        break;
+      case 'domain.created':
+        if (inLevel(event.domain.parentId)) {
+          setDomains(prev => prev.some(d => d.id === event.domain.id) ? prev : [...prev, event.domain]);
+          setCells(null);
+        }
+        break;
+      case 'domain.updated':
+        setDomains(prev => prev.map(d => d.id === event.id ? { ...d, ...event.changes } : d));
+        if ('x' in event.changes || 'y' in event.changes) setCells(null);
+        break;
+      case 'domain.moved':
+        if (inLevel(event.fromParentId) || inLevel(event.toParentId)) {
+          setDomains(prev => {
+            const rest = prev.filter(d => d.id !== event.id);
+            return inLevel(event.toParentId) ? [...rest, event.domain] : rest;
+          });
+          setCells(null);
+        }
+        break;
+      case 'domain.deleted':
+        if (event.id === currentParentId || inPath(event.id)) {
+          setCurrentParentId(event.parentId || null);
+        } else if (inLevel(event.parentId)) {
+          setDomains(prev => prev.filter(d => d.id !== event.id));
+          setCells(null);
+        }
+        break;
+      case 'domain.merged':
+        if (event.sourceId === currentParentId || inPath(event.sourceId)) {
+          setCurrentParentId(event.targetId);
+        } else if (inLevel(event.sourceParentId) || domainsRef.current.some(d => d.id === event.targetId)) {
+          loadDomains();
+        }
+        break;
+      case 'domain.positions':
+        if (domainsRef.current.some(d => event.positions[d.id])) {
+          setDomains(prev => prev.map(d => event.positions[d.id] ? { ...d, ...event.positions[d.id] } : d));
+          setCells(null);
+        }
+        break;
+      case 'document.attached':
+        setDomains(prev => prev.map(d => d.id === event.domainId
+          ? { ...d, documents: [...(d.documents || []).filter(doc => doc.id !== event.document.id), event.document] }
+          : d));
+        break;
+      case 'document.detached':
+        setDomains(prev => prev.map(d => d.id === event.domainId
+          ? { ...d, documents: (d.documents || []).filter(doc => doc.id !== event.documentId) }
+          : d));
+        break;
+      default:
+        break;
+    }
+  }, [currentParentId, breadcrumbPath, loadDomains]);
+  
+  // Subscribe once; events go to the latest handler
+  const applyChangeRef = useRef(applyChange);
+  applyChangeRef.current = applyChange;
+  useEffect(() => {
+    return subscribeToChanges(
+      (event) => applyChangeRef.current(event),
+      (connected) => { feedConnected.current = connected; }
+    );
+  }, []);
+  
   // Handle adding a new domain
   const handleAddDomain = async (name, description = '') => {
     try {
       await addDomain(name, currentParentId, description);
       
-      // Refresh domains
-      loadDomains();
+      // The change feed delivers the new domain; refresh only without it
+      if (!feedConnected.current) loadDomains();
     } catch (err) {
       console.error('Error adding domain:', err);
       setError('Failed to add domain. Please try again.');
@@ -143,8 +225,8 @@ function App() {
     try {
       await deleteDomain(domainId);
       
-      // Refresh domains
-      loadDomains();
+      // The change feed delivers the deletion; refresh only without it
+      if (!feedConnected.current) loadDomains();
     } catch (err) {
       console.error('Error deleting domain:', err);
       setError('Failed to delete domain. Please try again.');
@@ -173,7 +255,7 @@ function App() {
   
   // Handle document upload completion
   const handleDocumentUpload = () => {
-    loadDomains();
+    if (!feedConnected.current) loadDomains();
   };
   
   return (
@@ -238,6 +320,7 @@ function App() {
                   <VoronoiDiagram
                     domains={domains}
                     semanticDistances={semanticDistances}
+                    cells={cells}
                     width={diagramWidth}
                     height={diagramHeight}
                     onDomainClick={handleDomainClick}
@@ -4,9 +4,16 @@ import * as d3 from 'd3';
 import { updateDomainPositions } from '../services/apiService';
 import '../styles/VoronoiDiagram.css';
 
+// Whether every domain already has a stored position
+const hasStoredPositions = (domains) => domains.every(domain => 
+  typeof domain.x === 'number' && typeof domain.y === 'number' &&
+  domain.x !== 0 && domain.y !== 0
+);
+
 const VoronoiDiagram = ({ 
   domains, 
   semanticDistances, 
+  cells,
   width, 
   height, 
   onDomainClick, 
@@ -102,11 +109,7 @@ const VoronoiDiagram = ({
   // Compute positions for domains based on existing positions or force layout.
   const positionDomains = useCallback((domains, semanticDistances, width, height) => {
     const positionedDomains = [...domains];
-    const hasPositions = positionedDomains.every(domain => 
-      typeof domain.x === 'number' && typeof domain.y === 'number' &&
-      domain.x !== 0 && domain.y !== 0
-    );
-    if (hasPositions) {
+    if (hasStoredPositions(positionedDomains)) {
       return positionedDomains;
     }
     if (Object.keys(semanticDistances).length > 0) {
@@ -115,11 +118,21 @@ const VoronoiDiagram = ({
     return arrangeInCircle(positionedDomains, width, height);
   }, [positionWithForces, arrangeInCircle]);
 
-  const createVoronoiDiagram = useCallback((domains) => {
+  const createVoronoiDiagram = useCallback((domains, serverCells) => {
     d3.select(svgRef.current).selectAll('*').remove();
     const svg = d3.select(svgRef.current);
-    const delaunay = d3.Delaunay.from(domains, d => d.x, d => d.y);
-    const voronoi = delaunay.voronoi([0, 0, width, height]);
+    // Use the cells computed by the backend; triangulate locally only for
+    // layouts the backend has not seen yet
+    let renderCell;
+    if (serverCells && domains.every(domain => serverCells[domain.id])) {
+      renderCell = (d) => {
+        const polygon = serverCells[d.id];
+        return polygon.length ? `M${polygon.join('L')}Z` : null;
+      };
+    } else {
+      const voronoi = d3.Delaunay.from(domains, d => d.x, d => d.y).voronoi([0, 0, width, height]);
+      renderCell = (d, i) => voronoi.renderCell(i);
+    }
     
     const cells = svg.selectAll('g.cell')
       .data(domains)
@@ -129,7 +142,7 @@ const VoronoiDiagram = ({
       .style('cursor', 'pointer');
     
     cells.append('path')
-      .attr('d', (d, i) => voronoi.renderCell(i))
+      .attr('d', renderCell)
       .attr('fill', (d, i) => d3.interpolateRainbow(i / domains.length))
       .attr('fill-opacity', 0.7)
       .attr('stroke', '#fff')
@@ -234,9 +247,12 @@ const VoronoiDiagram = ({
 
   useEffect(() => {
     if (!svgRef.current || !domains || domains.length === 0) return;
+    const laidOut = hasStoredPositions(domains);
     const positionedDomains = positionDomains(domains, semanticDistances, width, height);
-    createVoronoiDiagram(positionedDomains);
+    createVoronoiDiagram(positionedDomains, laidOut ? cells : null);
     diagramRef.current = positionedDomains;
+    // Stored positions are already known to the backend
+    if (laidOut) return;
     const positions = {};
     positionedDomains.forEach(domain => {
       positions[domain.id] = { x: domain.x, y: domain.y };
@@ -244,7 +260,7 @@ const VoronoiDiagram = ({
     updateDomainPositions(positions).catch(err => {
       console.error('Error updating domain positions:', err);
     });
-  }, [domains, semanticDistances, width, height, positionDomains, createVoronoiDiagram]);
+  }, [domains, semanticDistances, cells, width, height, positionDomains, createVoronoiDiagram]);
   
   return (
     <div className="voronoi-container">
@@ -15,14 +15,18 @@ const api = axios.create({
 /**
  * Fetch domains at a specific level
  * @param {string|null} parentId - Parent domain ID or null for root level
- * @returns {Promise<Object>} - Domains and semantic distances
+ * @param {Object} canvas - Optional {width, height} the server clips Voronoi cells to
+ * @returns {Promise<Object>} - Domains, semantic distances and Voronoi cells
  */
-export const fetchDomains = async (parentId = null) => {
+export const fetchDomains = async (parentId = null, canvas = {}) => {
   try {
-    const url = parentId 
-      ? `/domains?parentId=${parentId}`
-      : `/domains`;
-    const response = await api.get(url);
+    const params = {};
+    if (parentId) params.parentId = parentId;
+    if (canvas.width && canvas.height) {
+      params.width = canvas.width;
+      params.height = canvas.height;
+    }
+    const response = await api.get(`/domains`, { params });
     return response.data;
   } catch (error) {
     console.error('Error fetching domains:', error);
@@ -177,6 +181,32 @@ export const removeDocument = async (domainId, documentId) => {
   }
 };
 
+// Completions run as background jobs on the server; ask for a job to poll
+// instead of holding a connection open for the whole completion
+const RESPOND_ASYNC = { Prefer: 'respond-async' };
+const JOB_POLL_INTERVAL_MS = 500;
+const JOB_TIMEOUT_MS = 120000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+/**
+ * Get the result of a response that may be a 202 with a job to poll
+ * @param {Object} response - Axios response
+ * @returns {Promise<Object>} - Response data, or the job's result once done
+ */
+const jobResult = async (response) => {
+  if (response.status !== 202) return response.data;
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+  let job = response.data;
+  while (job.status === 'queued' || job.status === 'running') {
+    if (Date.now() > deadline) throw new Error('Timed out waiting for the server');
+    await sleep(JOB_POLL_INTERVAL_MS);
+    job = (await api.get(`/jobs/${job.id}`)).data;
+  }
+  if (job.status !== 'done') throw new Error(job.error || 'Job failed');
+  return job.result;
+};
+
 /**
  * Get a document summary
  * @param {string} documentPath - Document path
@@ -185,9 +215,10 @@ export const removeDocument = async (domainId, documentId) => {
 export const getDocumentSummary = async (documentPath) => {
   try {
     const response = await api.get(
-      `/documents/${encodeURIComponent(documentPath)}/summary`
+      `/documents/${encodeURIComponent(documentPath)}/summary`,
+      { headers: RESPOND_ASYNC }
     );
-    return response.data;
+    return await jobResult(response);
   } catch (error) {
     console.error('Error getting document summary:', error);
     throw error;
@@ -204,9 +235,10 @@ export const queryDocument = async (documentPath, query) => {
   try {
     const response = await api.post(
       `/documents/${encodeURIComponent(documentPath)}/query`,
-      { query }
+      { query },
+      { headers: RESPOND_ASYNC }
     );
-    return response.data;
+    return await jobResult(response);
   } catch (error) {
     console.error('Error querying document:', error);
     throw error;
@@ -221,3 +253,34 @@ export const queryDocument = async (documentPath, query) => {
 export const getDocumentUrl = (documentPath) => {
   return `/api/documents/${encodeURIComponent(documentPath)}`;
 };
+
+/**
+ * Subscribe to domain and document change events
+ * @param {Function} onEvent - Called with each event ({type, revision, ...})
+ * @param {Function} onStatus - Called with true when connected and false when disconnected
+ * @returns {Function} - Unsubscribe function
+ */
+export const subscribeToChanges = (onEvent, onStatus = () => {}) => {
+  if (typeof EventSource === 'undefined') {
+    onStatus(false);
+    return () => {};
+  }
+  // The browser reconnects on its own and resumes from the last event id
+  const source = new EventSource(`${baseURL}/changes/stream`);
+  const eventTypes = [
+    'hello', 'reset', 'domain.created', 'domain.updated', 'domain.moved', 'domain.merged',
+    'domain.deleted', 'domain.positions', 'document.attached', 'document.detached'
+  ];
+  eventTypes.forEach(type => {
+    source.addEventListener(type, (message) => {
+      try {
+        onEvent(JSON.parse(message.data));
+      } catch (error) {
+        console.error('Error handling change event:', error);
+      }
+    });
+  });
+  source.onopen = () => onStatus(true);
+  source.onerror = () => onStatus(false);
+  return () => source.close();
+};